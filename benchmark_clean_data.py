@@ -0,0 +1,333 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+try:
+    import resource  # Unix only; used for the process-wide peak RSS
+except ImportError:
+    resource = None
+
+from clean_data import (cleanse_data, parse_date_column, enrich_date_duration, insert_data_to_sql, DATE_COLUMNS)
+from stage_metrics import reset_peak_rss, peak_rss_mb
+from csv_ingest import read_csv_chunks
+
+# Values used to build synthetic rows shaped like the bundled library exports
+BOOK_TITLES = ['Catcher in the Rye ', 'Lord of the rings the two towers', 'The hobbit', 'Dune ', 'Little Women',
+               'IT', 'Misery ', 'Catch 22', 'Animal Farm ', '1984', 'East of Eden', 'America Is in the Heart',
+               'Wuthering Heights', 'Dark Tales', 'The Bloody Chamber', 'Les Miserables', 'Dracula', 'Frankenstein']
+FIRST_NAMES = ['Jane', 'John', 'Dan', 'William', 'Jaztyn', 'Jackie', 'Matthew', 'Emory', 'Ada', 'Grace']
+LAST_NAMES = ['Doe', 'Smith', 'Reeves', 'Holden', 'Forest', 'Irving', 'Stirling', 'Ted', 'Lovelace', 'Hopper']
+BORROW_PERIODS = ['2 weeks', '2 weeks', '2 weeks', '1 week', '3 weeks', '10 days']
+FIRST_CHECKOUT = np.datetime64('2023-01-01')
+
+def _systembook_rows(ids):
+    """
+    Build Systembook rows for the given ids. Every value is a function of the id,
+    so generating an earlier id again produces an exact duplicate row.
+    """
+    checkout = FIRST_CHECKOUT + (ids * 7919 % 365).astype('timedelta64[D]')
+    returned = checkout + (ids * 104729 % 40 - 5).astype('timedelta64[D]')  # A few returns before checkout
+    return pd.DataFrame({
+        'Id': ids,
+        'Books': np.array(BOOK_TITLES, dtype=object)[ids % len(BOOK_TITLES)],
+        # The exports wrap the checkout date in quotes, which to_csv writes as """dd/mm/yyyy"""
+        'Book checkout': '"' + pd.to_datetime(checkout).strftime('%d/%m/%Y') + '"',
+        'Book Returned': pd.to_datetime(returned).strftime('%d/%m/%Y'),
+        'Days allowed to borrow': np.array(BORROW_PERIODS, dtype=object)[ids % len(BORROW_PERIODS)],
+        'Customer ID': ids % 5000 + 1,
+    })
+
+def _customer_rows(ids):
+    return pd.DataFrame({
+        'Customer ID': ids,
+        'Customer Name': (pd.Series(np.array(FIRST_NAMES, dtype=object)[ids % len(FIRST_NAMES)]) + ' ' +
+                          pd.Series(np.array(LAST_NAMES, dtype=object)[ids // len(FIRST_NAMES) % len(LAST_NAMES)])),
+    })
+
+def generate_library_csv(path, rows, kind='systembook', null_rate=0.01, duplicate_rate=0.01, bad_date_rate=0.01,
+                         chunksize=1_000_000, seed=0):
+    """
+    Write a synthetic Systembook or Customers CSV with roughly the given rates of
+    rows containing a null, rows duplicating an earlier row (possibly from an
+    earlier chunk) and unparseable checkout dates. Rows are generated and written
+    chunksize at a time, so 50M-row files need no more memory than one chunk.
+    """
+    rng = np.random.default_rng(seed)
+    build_rows = _systembook_rows if kind == 'systembook' else _customer_rows
+    next_id = 1
+    written = 0
+    while written < rows:
+        size = min(chunksize, rows - written)
+        ids = np.arange(next_id, next_id + size, dtype=np.int64)
+        next_id += size
+
+        # Re-use an earlier id to make an exact duplicate of that row
+        duplicates = rng.random(size) < duplicate_rate
+        ids[duplicates] = rng.integers(1, np.maximum(ids[duplicates], 2))
+        df = build_rows(ids)
+
+        if kind == 'systembook':
+            bad_dates = rng.random(size) < bad_date_rate
+            df.loc[bad_dates, 'Book checkout'] = '"32/13/2023"'
+
+        nulls = rng.random(size) < null_rate
+        df.loc[nulls, df.columns[-1]] = np.nan
+
+        df.to_csv(path, index=False, mode='w' if written == 0 else 'a', header=written == 0)
+        written += size
+    return path
+
+def measure(stage, func, rows_in=None):
+    """
+    Run func() and return its result plus the stage's wall time, throughput and
+    peak resident memory. rows_in defaults to the number of rows func returns.
+    """
+    reset_peak_rss()
+    start_time = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start_time
+    peak_rss = peak_rss_mb()
+
+    rows_out = len(result) if isinstance(result, pd.DataFrame) else rows_in
+    rows_in = rows_out if rows_in is None else rows_in
+    record = {
+        'stage': stage,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows_in / seconds, 1) if rows_in and seconds > 0 else None,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+    }
+    print(f"  {stage:<12} {seconds:9.3f}s {record['rows_per_second'] or 0:14,.0f} rows/s "
+          f"{record['peak_rss_mb'] or 0:10.1f} MB peak RSS")
+    return result, record
+
+def benchmark_stages(input_file, work_dir):
+    """
+    Time each stage of the cleaning pipeline separately on one file and return the records.
+    """
+    records = []
+    df, record = measure('read', lambda: pd.read_csv(input_file))
+    records.append(record)
+    df.columns = df.columns.str.strip().str.lower()
+
+    df, record = measure('null_drop', df.dropna, len(df))
+    records.append(record)
+
+    df, record = measure('dedup', df.drop_duplicates, len(df))
+    records.append(record)
+
+    def parse_dates():
+        date_formats = {}
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col], _ = parse_date_column(df[col], col, date_formats)
+        return df
+    df, record = measure('date_parse', parse_dates, len(df))
+    records.append(record)
+
+    df, record = measure('enrich', lambda: enrich_date_duration(df, 'book returned', 'book checkout'), len(df))
+    records.append(record)
+
+    output_file = os.path.join(work_dir, 'benchmark_cleaned.csv')
+    _, record = measure('csv_write', lambda: df.to_csv(output_file, index=False), len(df))
+    records.append(record)
+
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}")
+    _, record = measure('sql_load', lambda: insert_data_to_sql(df, 'benchmark', engine), len(df))
+    records.append(record)
+    engine.dispose()
+    return records
+
+def _compressed_copy(input_file, codec):
+    """
+    Write input_file compressed with codec ('gzip' or 'zstd'), block by block; None if the codec is not installed.
+    """
+    if codec == 'gzip':
+        path, opener = input_file + '.gz', lambda f: gzip.open(f, 'wb', compresslevel=6)
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            return None
+        path, opener = input_file + '.zst', lambda f: zstandard.ZstdCompressor().stream_writer(f)
+    with open(input_file, 'rb') as source, open(path, 'wb') as raw, opener(raw) as target:
+        shutil.copyfileobj(source, target, 4 * 1024 * 1024)
+    return path
+
+def benchmark_input_reads(input_file, rows, chunksize=None):
+    """
+    Time reading the file with buffered I/O, memory-mapped, and decompressing
+    gzip and zstd copies as they stream. MB/s is of the uncompressed CSV.
+    """
+    size_mb = os.path.getsize(input_file) / (1024 * 1024)
+    variants = [('read_buffered', input_file, False), ('read_mmap', input_file, True)]
+    copies = [path for path in (_compressed_copy(input_file, codec) for codec in ('gzip', 'zstd')) if path]
+    variants += [('read_' + os.path.splitext(path)[1][1:], path, True) for path in copies]
+
+    records = []
+    try:
+        for stage, path, memory_map in variants:
+            rows_read, record = measure(stage, lambda: sum(len(df) for df in read_csv_chunks(
+                path, chunksize=chunksize, memory_map=memory_map)), rows)
+            record['rows_out'] = rows_read
+            record['file_size_mb'] = round(os.path.getsize(path) / (1024 * 1024), 2)
+            record['mb_per_second'] = round(size_mb / record['seconds'], 1) if record['seconds'] > 0 else None
+            print(f"  {'':<12} {record['file_size_mb']:9.1f} MB on disk {record['mb_per_second'] or 0:10.1f} MB/s")
+            records.append(record)
+    finally:
+        for path in copies:
+            os.remove(path)
+    return records
+
+def benchmark_end_to_end(input_file, work_dir, chunksize=None):
+    """
+    Time a full cleanse_data run (optionally chunked) against a local SQLite database.
+    """
+    engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'end_to_end.db')}")
+    with open(input_file) as f:
+        rows_in = sum(1 for _ in f) - 1  # Data rows, excluding the header
+    current_dir = os.getcwd()
+    os.chdir(work_dir)  # cleanse_data writes to ./Cleaned_Data
+    try:
+        metrics, record = measure('end_to_end', lambda: cleanse_data(os.path.abspath(input_file), engine,
+                                                                     chunksize=chunksize), rows_in)
+    finally:
+        os.chdir(current_dir)
+        engine.dispose()
+    record['rows_out'] = int(metrics['rows_processed'] - metrics['rows_removed'])
+    return record
+
+def compare_results(current, previous):
+    """
+    Print the change in seconds per stage against a previous results file.
+    """
+    previous_seconds = {(run['rows'], record['stage']): record['seconds']
+                        for run in previous['runs'] for record in run['stages']}
+    print("\nComparison with previous run (positive = slower):")
+    for run in current['runs']:
+        for record in run['stages']:
+            before = previous_seconds.get((run['rows'], record['stage']))
+            if before:
+                change = (record['seconds'] - before) / before * 100
+                print(f"  {run['rows']:>12,} rows {record['stage']:<12} {before:9.3f}s -> {record['seconds']:9.3f}s ({change:+.1f}%)")
+
+# Modules clean_data.py must not import before it has files to clean, and the startup time allowed for that path
+HEAVY_MODULES = ('pandas', 'numpy', 'sqlalchemy', 'pyarrow')
+STARTUP_BUDGET_SECONDS = 0.5
+
+def benchmark_startup(args=('--help',), repeats=5, cwd=None):
+    """
+    Time `python clean_data.py <args>` in fresh interpreters, e.g. --help or a
+    run in a directory without CSV files. Returns the best wall time of repeats
+    runs and the heavy modules the last one imported (from python -X importtime).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clean_data.py')
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', script, *args], cwd=cwd,
+                                capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+    imported = {line.rsplit('|', 1)[-1].strip().split('.')[0]
+                for line in result.stderr.splitlines() if line.startswith('import time:')}
+    return {
+        'command': ' '.join(['clean_data.py', *args]),
+        'seconds': round(min(timings), 4),
+        'heavy_modules': sorted(imported.intersection(HEAVY_MODULES)),
+        'returncode': result.returncode,
+    }
+
+def run_benchmark(sizes, kind='systembook', null_rate=0.01, duplicate_rate=0.01, bad_date_rate=0.01,
+                  chunksize=None, results_dir='benchmark_results', seed=0, input_reads=False):
+    """
+    Generate a file per size, benchmark each pipeline stage on it and save the results as JSON.
+    With input_reads=True the buffered, memory-mapped and compressed reads are compared too.
+    """
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'kind': kind,
+        'rates': {'null': null_rate, 'duplicate': duplicate_rate, 'bad_date': bad_date_rate},
+        'chunksize': chunksize,
+        'runs': [],
+    }
+    work_dir = tempfile.mkdtemp(prefix='benchmark_clean_data_')
+    try:
+        for rows in sizes:
+            input_file = os.path.join(work_dir, f"{kind}_{rows}.csv")
+            generate_library_csv(input_file, rows, kind=kind, null_rate=null_rate, duplicate_rate=duplicate_rate,
+                                 bad_date_rate=bad_date_rate, seed=seed)
+            print(f"\n{rows:,} {kind} rows ({os.path.getsize(input_file) / (1024 * 1024):.1f} MB)")
+            # Loading the whole file per stage is only practical for moderate sizes
+            stages = benchmark_stages(input_file, work_dir) if chunksize is None else []
+            stages.append(benchmark_end_to_end(input_file, work_dir, chunksize=chunksize))
+            run = {'rows': rows, 'file_size_bytes': os.path.getsize(input_file), 'stages': stages}
+            if input_reads:
+                run['input_reads'] = benchmark_input_reads(input_file, rows, chunksize=chunksize)
+            results['runs'].append(run)
+            os.remove(input_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Process-wide peak; each stage's own peak is in its record
+    if resource is not None:
+        results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    if results_dir:
+        if not os.path.exists(results_dir):
+            os.makedirs(results_dir)
+        results_file = os.path.join(results_dir, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(results_file, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {results_file}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CSV cleaning pipeline on synthetic library data.")
+    parser.add_argument("--rows", type=int, nargs='+', default=[10_000, 100_000],
+                        help="File sizes to generate, in rows (e.g. 10000 1000000 50000000)")
+    parser.add_argument("--kind", choices=['systembook', 'customers'], default='systembook',
+                        help="Shape of the generated file")
+    parser.add_argument("--null-rate", type=float, default=0.01, help="Fraction of rows with a null value")
+    parser.add_argument("--duplicate-rate", type=float, default=0.01, help="Fraction of rows duplicating an earlier row")
+    parser.add_argument("--bad-date-rate", type=float, default=0.01, help="Fraction of unparseable checkout dates")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Only run cleanse_data end to end with this chunksize (for files too big to load)")
+    parser.add_argument("--results-dir", default='benchmark_results', help="Directory for the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--input-reads", action="store_true",
+                        help="Also compare buffered, memory-mapped, gzip and zstd (if installed) reads of each file")
+    parser.add_argument("--startup", action="store_true",
+                        help="Only time clean_data.py's startup (--help, and a run without CSV files)")
+    args = parser.parse_args()
+
+    if args.startup:
+        empty_dir = tempfile.mkdtemp(prefix='benchmark_startup_')
+        try:
+            for record in (benchmark_startup(), benchmark_startup(('server', 'database'), cwd=empty_dir)):
+                print(f"{record['command']:<36} {record['seconds']:.3f}s (budget {STARTUP_BUDGET_SECONDS}s), "
+                      f"heavy modules imported: {', '.join(record['heavy_modules']) or 'none'}")
+        finally:
+            shutil.rmtree(empty_dir, ignore_errors=True)
+        return
+
+    results = run_benchmark(args.rows, kind=args.kind, null_rate=args.null_rate, duplicate_rate=args.duplicate_rate,
+                            bad_date_rate=args.bad_date_rate, chunksize=args.chunksize, results_dir=args.results_dir,
+                            input_reads=args.input_reads)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
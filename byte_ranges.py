@@ -0,0 +1,113 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+# Bytes scanned at a time when looking for row boundaries
+SCAN_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def split_byte_ranges(path, range_bytes=64 * 1024 * 1024, start=None, hasher=None):
+    """
+    Yield (start, end) byte offsets covering the rows of a CSV file after its
+    header, each about range_bytes long and starting at the beginning of a row.
+
+    A newline only ends a row when it is outside a quoted field, so the quote
+    parity is tracked from the start of the file: the triple-quoted dates of the
+    library exports hold six quotes and leave it unchanged, while a quoted field
+    spanning lines keeps its row together. Ranges are yielded as the scan
+    reaches them, so their cleaning can start before the whole file is scanned.
+    start, if given, is where a range ended before (e.g. in a resumed run) and
+    the split carries on from there. The bytes scanned are passed on to hasher
+    (a ContentHasher), if given.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if start is None:
+            header = f.readline()
+            start = len(header)
+            if hasher is not None:
+                hasher.update(0, header)
+        target = start + range_bytes
+        position = start
+        parity = 0  # Quotes seen since the start, mod 2 (a range always ends outside quotes)
+        while target < size:
+            f.seek(position)
+            data = f.read(SCAN_BLOCK_BYTES)
+            if hasher is not None:
+                hasher.update(position, data)
+            block = np.frombuffer(data, dtype=np.uint8)
+            if not len(block):
+                break
+            # Quote parity after each byte (uint8 wraps, which keeps the parity)
+            inside = (np.cumsum(block == QUOTE, dtype=np.uint8) + parity) & 1
+            row_ends = np.flatnonzero((block == NEWLINE) & (inside == 0)) + position + 1
+            while target < size:
+                found = np.searchsorted(row_ends, target)
+                if found == len(row_ends):
+                    break
+                end = int(row_ends[found])
+                if end >= size:
+                    break
+                yield start, end
+                start, target = end, end + range_bytes
+            parity = int(inside[-1])
+            position += len(block)
+    if start < size:
+        yield start, size
+
+def read_byte_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def put_handoff(obj):
+    """
+    Pickle obj into a new temporary file and return a handle for take_handoff.
+
+    Pickle protocol 5 hands numpy buffers (numeric and date columns, hash arrays)
+    over out of band, so they are written once, straight after the pickle,
+    instead of being copied through the pool's pipe. A file works the same way
+    on every platform, unlike shared memory, which Windows frees as soon as the
+    process that created it lets go.
+    """
+    buffers = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    offsets = np.cumsum([len(payload)] + [raw.nbytes for raw in raws]).tolist()
+    descriptor, path = tempfile.mkstemp(prefix='range_', suffix='.pickle')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(payload)
+            for raw in raws:
+                f.write(raw)
+    except BaseException:
+        os.remove(path)
+        raise
+    return {'path': path, 'payload': len(payload), 'buffers': list(zip(offsets, offsets[1:]))}
+
+def take_handoff(handle, use):
+    """
+    Unpickle the object behind a put_handoff handle, return use(obj) and remove the file.
+
+    The file is read into one block of memory that the object's arrays point
+    into, so use can keep views of them; the block is freed with the last one.
+    """
+    try:
+        data = bytearray(handle['buffers'][-1][1] if handle['buffers'] else handle['payload'])
+        with open(handle['path'], 'rb') as f:
+            f.readinto(data)
+        view = memoryview(data)
+        buffers = [view[begin:finish] for begin, finish in handle['buffers']]
+        return use(pickle.loads(view[:handle['payload']], buffers=buffers))
+    finally:
+        os.remove(handle['path'])
+
+def discard_handoff(handle):
+    """
+    Remove a put_handoff file that will not be read.
+    """
+    os.remove(handle['path'])
@@ -1,35 +1,187 @@
 import argparse
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+# numpy and pandas are only imported by the batch mode, so a single calculation starts as quickly as before
+
+# Operand pairs computed at a time in batch mode, so memory stays bounded whatever the size of the input
+DEFAULT_CHUNK_ROWS = 1_000_000
+# The results computed for every pair, in the order they are written
+BATCH_OPERATIONS = ('sum', 'difference', 'product', 'quotient')
 
 class Calculator:
     def __init__(self, a, b):
         self.a = a
         self.b = b
-    
+
     def get_sum(self):
         return self.a + self.b
-    
+
     def get_difference(self):
         return self.a - self.b
-    
+
     def get_product(self):
         return self.a * self.b
-    
+
     def get_quotient(self):
         if self.b != 0:
             return self.a / self.b
         else:
             return "Cannot divide by zero"
 
+    @staticmethod
+    def compute_batch(a, b):
+        """
+        The four operations over arrays of operands at once, as float64 arrays.
+
+        Returns a dict of operation -> results and the number of pairs whose b
+        is zero. Their quotient is NaN rather than the "Cannot divide by zero"
+        of get_quotient, so the quotients stay a numeric column.
+        """
+        import numpy as np
+        a = np.asarray(a, dtype='float64')
+        b = np.asarray(b, dtype='float64')
+        zero = b == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quotient = a / b
+        quotient[zero] = np.nan
+        results = {'sum': a + b, 'difference': a - b, 'product': a * b, 'quotient': quotient}
+        return results, int(np.count_nonzero(zero))
+
+def read_operand_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield (a, b) float64 arrays of up to chunk_rows operand pairs read from path.
+
+    A CSV file (possibly compressed, e.g. .csv.gz) gives its first two columns
+    and must have a header row. A .npy file holds an array of shape (n, 2). Any
+    other file, or '-' for standard input, is read as raw little-endian float64
+    pairs (a0, b0, a1, b1, ...). Files are memory-mapped, not read whole.
+    """
+    import numpy as np
+    if path == '-':
+        while True:
+            data = sys.stdin.buffer.read(chunk_rows * 16)
+            if not data:
+                return
+            yield _split_pairs(np.frombuffer(data, dtype='<f8'), path)
+    elif '.csv' in os.path.basename(path).lower():
+        import pandas as pd
+        for chunk in pd.read_csv(path, usecols=[0, 1], chunksize=chunk_rows):
+            values = chunk.to_numpy(dtype='float64')
+            yield values[:, 0], values[:, 1]
+    else:
+        if path.endswith('.npy'):
+            pairs = np.load(path, mmap_mode='r')
+        elif os.path.getsize(path):
+            pairs = _pairs(np.memmap(path, dtype='<f8', mode='r'), path)
+        else:
+            return
+        for start in range(0, len(pairs), chunk_rows):
+            yield _split_pairs(np.asarray(pairs[start:start + chunk_rows], dtype='float64'), path)
+
+def _pairs(values, path):
+    # Raw float64 values as rows of (a, b)
+    if len(values) % 2:
+        raise ValueError(f"{path} does not hold whole (a, b) pairs of float64 values")
+    return values.reshape(-1, 2)
+
+def _split_pairs(values, path):
+    if values.ndim == 1:
+        values = _pairs(values, path)
+    if values.ndim != 2 or values.shape[1] != 2:
+        raise ValueError(f"{path} must hold an array of (a, b) pairs, not one of shape {values.shape}")
+    return values[:, 0], values[:, 1]
+
+def calculate_file(path, chunk_rows=DEFAULT_CHUNK_ROWS, output=None):
+    """
+    Compute every operand pair of path (see read_operand_chunks) in chunks of chunk_rows.
+
+    The results are written to output, if given, as they are computed: a CSV
+    with a column per operation (an empty quotient where b is zero), or raw
+    float64 rows of the four results for any other file name. Returns the
+    pairs computed, the divisions by zero, the seconds taken in all and in the
+    arithmetic alone, and the pairs per second.
+    """
+    import numpy as np
+    summary = {'rows': 0, 'zero_divisions': 0, 'seconds': 0.0, 'compute_seconds': 0.0}
+    start_time = time.perf_counter()
+    with open(output, 'wb') if output else nullcontext() as f:
+        for a, b in read_operand_chunks(path, chunk_rows):
+            compute_start = time.perf_counter()
+            results, zero_divisions = Calculator.compute_batch(a, b)
+            summary['compute_seconds'] += time.perf_counter() - compute_start
+            if output and output.endswith('.csv'):
+                import pandas as pd
+                pd.DataFrame(results).to_csv(f, header=summary['rows'] == 0, index=False)
+            elif output:
+                np.column_stack([results[operation] for operation in BATCH_OPERATIONS]).astype('<f8').tofile(f)
+            summary['rows'] += len(a)
+            summary['zero_divisions'] += zero_divisions
+    summary['seconds'] = time.perf_counter() - start_time
+    summary['rows_per_second'] = summary['rows'] / summary['seconds'] if summary['seconds'] > 0 else 0.0
+    return summary
+
+def compare_with_scalar(a, b):
+    """
+    Time the scalar Calculator and compute_batch on the same operand pairs and
+    check that they agree (NaN standing for "Cannot divide by zero").
+
+    Returns the pairs per second of each path, the speed-up of the batch path
+    and the number of pairs whose results differ.
+    """
+    import numpy as np
+    start = time.perf_counter()
+    scalar = []
+    for x, y in zip(np.asarray(a, dtype='float64').tolist(), np.asarray(b, dtype='float64').tolist()):
+        calc = Calculator(x, y)
+        scalar.append((calc.get_sum(), calc.get_difference(), calc.get_product(), calc.get_quotient()))
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results, _ = Calculator.compute_batch(a, b)
+    batch_seconds = time.perf_counter() - start
+
+    expected = np.array([row[:3] + (np.nan if isinstance(row[3], str) else row[3],) for row in scalar],
+                        dtype='float64').reshape(-1, len(BATCH_OPERATIONS))
+    computed = np.column_stack([results[operation] for operation in BATCH_OPERATIONS])
+    differ = ~np.isclose(computed, expected, rtol=0, atol=0, equal_nan=True)
+    rows = len(scalar)
+    return {
+        'rows': rows,
+        'scalar_rows_per_second': rows / scalar_seconds if scalar_seconds > 0 else 0.0,
+        'batch_rows_per_second': rows / batch_seconds if batch_seconds > 0 else 0.0,
+        'speedup': scalar_seconds / batch_seconds if batch_seconds > 0 else float('inf'),
+        'mismatches': int(differ.any(axis=1).sum()),
+    }
+
 # Set up command-line arguments
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description="Perform basic arithmetic operations")
-    parser.add_argument('a', type=int, help="The first number")
-    parser.add_argument('b', type=int, help="The second number")
-    return parser.parse_args()
+    parser.add_argument('a', type=int, nargs='?', help="The first number")
+    parser.add_argument('b', type=int, nargs='?', help="The second number")
+    parser.add_argument('--input', metavar='PATH',
+                        help="Compute every operand pair in this CSV, .npy or raw float64 file ('-' for stdin) "
+                             "instead of a and b")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Operand pairs computed at a time with --input")
+    parser.add_argument('--output', metavar='PATH',
+                        help="Write the --input results to this CSV, or raw float64 file for other names")
+    parser.add_argument('--compare-scalar', type=int, default=0, metavar='N',
+                        help="Also time the scalar Calculator on the first N --input pairs against the batch path")
+    args = parser.parse_args(argv)
+    if args.input is None and (args.a is None or args.b is None):
+        parser.error("a and b are required unless --input is given")
+    return args
 
-def main():
+def main(argv=None):
     # Parse arguments
-    args = parse_arguments()
+    args = parse_arguments(argv)
+
+    if args.input is not None:
+        run_batch(args)
+        return
 
     # Create a Calculator instance with the passed arguments
     calc = Calculator(args.a, args.b)
@@ -40,7 +192,25 @@ def main():
     print(f"Product: {calc.get_product()}")
     print(f"Quotient: {calc.get_quotient()}")
 
-if __name__ == "__main__":
-    main()
+def run_batch(args):
+    """
+    Compute the --input file, then compare with the scalar path on its first --compare-scalar pairs.
+    """
+    summary = calculate_file(args.input, chunk_rows=args.chunk_rows, output=args.output)
+    print(f"Pairs computed: {summary['rows']}")
+    print(f"Divisions by zero (quotient NaN): {summary['zero_divisions']}")
+    print(f"Time: {summary['seconds']:.3f}s ({summary['compute_seconds']:.3f}s computing), "
+          f"{summary['rows_per_second']:.0f} pairs/sec")
+    if args.output:
+        print(f"Results saved to {args.output}")
 
+    if args.compare_scalar > 0 and args.input != '-':  # Standard input cannot be read a second time
+        a, b = next(read_operand_chunks(args.input, chunk_rows=args.compare_scalar), ((), ()))
+        comparison = compare_with_scalar(a, b)
+        print(f"Scalar path: {comparison['scalar_rows_per_second']:.0f} pairs/sec; "
+              f"batch path: {comparison['batch_rows_per_second']:.0f} pairs/sec "
+              f"({comparison['speedup']:.1f}x faster on {comparison['rows']} pairs)")
+        print(f"Pairs whose results differ: {comparison['mismatches']}")
 
+if __name__ == "__main__":
+    main()
@@ -1,169 +1,1157 @@
+# Running this file as a script goes straight to the lightweight CLI, which parses the arguments and looks
+# for CSV files before anything below (pandas, numpy, SQLAlchemy) is imported
+if __name__ == "__main__":
+    from clean_data_cli import main
+    raise SystemExit(main())
+
 import pandas as pd
-import argparse
 import os
-import glob
+import fnmatch
 import time
-from sqlalchemy import create_engine, text
+import cProfile
+import pickle
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from inspect import signature
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from sqlalchemy import create_engine, inspect, text, bindparam, MetaData, Table, Connection
+from sqlalchemy.pool import StaticPool
 import numpy as np  # Import numpy for type handling
+from dedup_index import RowHashIndex
+from file_manifest import (DEFAULT_MANIFEST_FILE, ContentHasher, load_manifest, save_manifest, file_stat,
+                           is_unchanged, options_digest, record_run)
+from stage_metrics import StageMetrics
+from output_writers import OUTPUT_EXTENSIONS, open_output_writers
+from csv_ingest import read_csv_chunks, read_csv_bytes, compact_dtypes, memory_mb
+from input_files import (check_unique_base_names, find_csv_files, input_base_name, input_compression,
+                         uncompressed_name)
+from byte_ranges import split_byte_ranges, read_byte_range, put_handoff, take_handoff, discard_handoff
+from cleaning_rules import (DATE_COLUMNS, CleaningPlan, detect_date_format, parse_date_column,
+                            rules_for_file)  # The date helpers are re-exported for existing callers
+from customer_join import CUSTOMER_KEY, DEFAULT_CUSTOMERS_PATTERN, CustomerIndex
+from clean_data_cli import main  # The command-line entry point, kept importable from here
+from pipelined_io import run_pipelined
+from metrics_store import CHECKPOINT_TABLE, MetricsBuffer, create_metrics_table
+from run_checkpoint import RunCheckpoint
+from file_watcher import watch
+from data_profile import DataProfile
+from loan_aggregates import AGGREGATE_TABLES, summarise_loans, merge_loan_aggregates
+
+# Size of the byte ranges a file is split into for range_workers, in MB
+DEFAULT_RANGE_MB = 64
+# Rows read from the start of a split file to detect its date formats (when not chunked)
+DATE_SAMPLE_ROWS = 10000
 
 # Function to cleanse data and track metrics
-def cleanse_data(input_file, engine):
+def cleanse_data(input_file, engine, chunksize=None, dedup_memory_mb=256, load_method='executemany', batch_size=10000,
+                 load_mode='replace', upsert_keys=None, date_format=None, output_formats=('csv',),
+                 compression='snappy', row_group_size=1_000_000, csv_engine='c', schema=None, compact=False,
+                 rules=None, customer_index=None, build_index=None, pipeline_depth=0,
+                 metrics_buffer=None, data_profile=False, partition_by_month=False,
+                 memory_map=True, range_workers=0, range_mb=DEFAULT_RANGE_MB, resumable=False,
+                 aggregate_loans=False, content_hasher=None):
+    """
+    Cleanse a CSV file, save it to Cleaned_Data and load it into SQL.
+
+    Returns the run metrics; the wall time, CPU time, rows and peak RSS of each
+    stage go to the data_cleaning_stage_metrics table.
+
+    Reading:
+      chunksize: stream the file in chunks of this many rows, holding one chunk
+        (plus the row hashes used for deduplication) in memory.
+      dedup_memory_mb: memory the row hashes may use before they spill to disk.
+      csv_engine, schema: parser ('c' or 'pyarrow') and column -> dtype.
+      compact: shrink IDs to the smallest integer type and low-cardinality text
+        to categoricals; input_memory_mb reports the largest chunk.
+      memory_map: memory-map a plain input_file. A compressed one (.gz, .bz2,
+        .xz, .zst) is decompressed as it streams instead.
+      content_hasher: a ContentHasher the input's bytes are passed to as they
+        are read, so the manifest's hash needs no second read of the file.
+    Cleaning:
+      rules: cleaning rules config (see cleaning_rules), optionally per file
+        name pattern; DEFAULT_RULES by default.
+      date_format: strptime format of the date columns, detected if not given.
+      data_profile: also profile every column into data_cleaning_column_profile.
+    Joining:
+      customer_index: a CustomerIndex each chunk with a customer id is joined
+        to; loans without a customer are flagged and counted in orphan_loans.
+      build_index: a CustomerIndex the cleaned chunks are added to, so the
+        customers file builds the index while it is cleaned.
+    Output:
+      output_formats: the cleaned files to write ('csv', 'parquet', 'arrow').
+      compression, row_group_size: apply to the Parquet/Arrow files.
+      partition_by_month: add the 'book checkout' month as checkout_month and
+        split the output on it; a rerun replaces only the months in the file
+        (see replace_partitions_in_sql).
+    SQL load (each chunk in one transaction):
+      load_method, batch_size: passed on to insert_data_to_sql.
+      load_mode: 'replace', or 'upsert' to merge on the first of upsert_keys
+        found in the file.
+      aggregate_loans: also merge per month, customer and book sums into the
+        <name>_loans_by_* tables in the same transaction (see
+        merge_loan_aggregates).
+      metrics_buffer: a MetricsBuffer to queue the metrics on, rather than
+        writing them straight away.
+    Parallelism:
+      pipeline_depth: read, clean and write/load on their own threads with up
+        to this many chunks queued between them.
+      range_workers, range_mb: clean byte ranges of about range_mb in this many
+        processes (see clean_byte_range). Ranges come back in file order and are
+        deduplicated across each other, so the results match a sequential run.
+        Compressed files are never split.
+      resumable: checkpoint a chunked or split run after every chunk it loads
+        (see RunCheckpoint), and resume after the last one on the next run.
+        Needs CSV output; skipped when building a customer index.
+    """
     metrics = {
         'rows_processed': 0,  # Total rows processed
         'rows_removed': 0,    # Rows removed due to null or duplicates
         'rows_modified': 0,   # Rows modified (e.g., lowercased, date converted)
-        'processing_time_seconds': 0  # Time taken for processing (in seconds)
+        'processing_time_seconds': 0,  # Time taken for processing (in seconds)
+        'dates_coerced': 0,   # Date values that could not be parsed and were set to NaT
+        'input_memory_mb': 0, # Largest in-memory size of the file (or of one chunk) after reading
+        'orphan_loans': 0,    # Rows whose customer id is not in the customers file (when joining)
+        'status': 'cleaned'   # 'cleaned', or 'skipped' when the file is unchanged since the last run
     }
 
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    base_name = input_base_name(input_file)
     output_dir = 'Cleaned_Data'  # Directory to save cleaned files
     
     # Ensure the directory exists
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    output_file = os.path.join(output_dir, f"{base_name}_cleaned.csv")
+    output_file = os.path.join(output_dir, f"{base_name}_cleaned")  # Extension added per output format
 
     # Track the start time for processing
     start_time = time.time()
+    run_started = datetime.now()
+    stages = StageMetrics(cpu_clock=time.thread_time if pipeline_depth else time.process_time)
+
+    # A compressed file cannot be split, as a range of it cannot be decompressed on its own
+    split = range_workers > 1 and input_compression(input_file) is None
+
+    # Chunked and split runs can resume; a customers file building the join index is small and always starts over
+    checkpoint = resumed = None
+    sql_chunks = 0  # Chunks of this file already committed to SQL by an earlier run
+    if resumable and (chunksize or split) and build_index is None:
+        if any(output_format != 'csv' for output_format in output_formats):
+            raise ValueError("Resumable runs need CSV output: Parquet and Arrow files cannot be reopened to append to")
+        checkpoint = RunCheckpoint(input_file, {
+            'chunksize': chunksize, 'split': split, 'range_mb': range_mb if split else None,
+            'csv_engine': csv_engine, 'schema': schema, 'compact': compact, 'rules': rules_for_file(rules, input_file),
+            'date_format': date_format, 'output_formats': list(output_formats), 'load_mode': load_mode,
+            'upsert_keys': upsert_keys, 'partition_by_month': partition_by_month, 'data_profile': data_profile,
+            'aggregate_loans': aggregate_loans, 'join_customers': customer_index is not None})
+        resumed = checkpoint.load()
+        CHECKPOINT_TABLE.create(engine, checkfirst=True)
+        if resumed is not None:
+            with engine.connect() as connection:
+                sql_chunks = checkpoint.loaded_chunks(connection)
+            if sql_chunks < resumed['chunks']:
+                print(f"Ignoring the checkpoint of {input_file}: its SQL table does not hold the chunks it covers.")
+                resumed = None
+        if resumed is None:
+            checkpoint.clear(engine)  # Including any record of chunks loaded by an earlier, abandoned run
+            sql_chunks = 0
+
+    if chunksize or split:
+        # Hashes of rows already written, to catch duplicates spanning chunks
+        dedup_index = RowHashIndex(memory_budget_bytes=dedup_memory_mb * 1024 * 1024, spill_dir=output_dir,
+                                   journal_file=checkpoint.hashes_file if checkpoint is not None else None,
+                                   journal_length=resumed['hashes'] if resumed is not None else 0)
+    else:
+        dedup_index = None
+
+    profile = DataProfile() if data_profile else None
+
+    # The cleaning rules compiled once per file; date formats detected on the first chunk stay on the plan
+    plan = CleaningPlan(rules_for_file(rules, input_file), date_format=date_format)
+
+    writers = []  # Opened with the first chunk, once it is known whether it can be partitioned
+    replaced_partitions = set()  # Months of the SQL table replaced so far in this run
+    chunks_loaded = 0
+    elapsed_before = 0.0  # Processing time of the runs this one resumes
+
+    def open_writers(partitioned):
+        writers.extend(open_output_writers(output_file, output_formats, compression=compression,
+                                           row_group_size=row_group_size,
+                                           partition_column=PARTITION_COLUMN if partitioned else None))
+
+    if resumed is not None:
+        # Pick up where the last committed chunk left off
+        metrics.update(resumed['metrics'])
+        plan.date_formats.update(resumed['date_formats'])
+        replaced_partitions.update(resumed['replaced_partitions'])
+        chunks_loaded = resumed['chunks']
+        elapsed_before = resumed['elapsed_seconds']
+        if profile is not None:
+            profile = checkpoint.load_profile()
+        open_writers(resumed['partitioned'])
+        for writer in writers:
+            writer.resume(resumed['outputs'])
+        print(f"Resuming {input_file} after {chunks_loaded} chunks ({resumed['rows_read']} rows).")
+
+    if split:
+        if resumed is None:
+            # Every range is cleaned with the date formats detected here, on the start of the file
+            with stages.stage('detect_formats'):
+                detect_date_formats(plan, input_file, chunksize or DATE_SAMPLE_ROWS, csv_engine, schema)
+        source = clean_ranges(input_file, plan, range_workers, int(range_mb * 1024 * 1024), stages,
+                              start=resumed['byte_offset'] if resumed is not None else None, hasher=content_hasher,
+                              csv_engine=csv_engine, schema=schema, compact=compact,
+                              count_nulls=profile is not None)
+    else:
+        # Load the CSV file into a DataFrame, or stream it chunk by chunk
+        source = stages.timed_iter('read', read_csv_chunks(input_file, chunksize=chunksize, csv_engine=csv_engine,
+                                                           schema=schema, memory_map=memory_map,
+                                                           skip_rows=resumed['rows_read'] if resumed else 0,
+                                                           hasher=content_hasher))
+
+    progress = deque()  # Checkpoint state as of each chunk cleaned but not yet loaded, oldest first
+
+    def note_progress(byte_offset=None):
+        if checkpoint is not None:
+            state = {'rows_read': metrics['rows_processed'], 'byte_offset': byte_offset,
+                     'metrics': {key: value.item() if hasattr(value, 'item') else value
+                                 for key, value in metrics.items()},
+                     'hashes': dedup_index.journal_length, 'date_formats': dict(plan.date_formats)}
+            progress.append((state, pickle.dumps(profile) if profile is not None else None))
+
+    def prepare(df):
+        metrics['rows_processed'] += len(df)  # Track the total rows processed
+
+        if compact:
+            with stages.stage('compact', len(df)):
+                df = compact_dtypes(df)
+        metrics['input_memory_mb'] = max(metrics['input_memory_mb'], memory_mb(df))
+
+        df = clean_chunk(df, metrics, dedup_index, plan, stages, profile)
+        df = join_and_partition(df)
+        note_progress()
+        return df
+
+    def prepare_range(handle):
+        range_end = None
+
+        with stages.stage('global_dedup') as counts:
+            def keep_new_rows(result):
+                # Runs on the arrays as read back from the range's file; only the rows kept are copied out
+                nonlocal range_end
+                new = dedup_index.filter_new(result['hashes'])
+                keep = new & ~result['invalid']
+                metrics['rows_processed'] += result['rows_read']
+                metrics['rows_removed'] += result['rows_removed'] + int(len(new) - keep.sum())
+                metrics['rows_modified'] += int(result['modified'][new].sum())
+                metrics['dates_coerced'] += int(result['coerced'][new].sum())
+                metrics['input_memory_mb'] = max(metrics['input_memory_mb'], result['memory_mb'])
+                stages.merge(result['stages'])
+                if profile is not None:
+                    profile.add_null_counts(result['rows_read'], result['null_counts'])
+                counts['rows_in'], counts['rows_out'] = len(new), int(keep.sum())
+                range_end = result['end']
+                return result['df'][keep]
+
+            df = take_handoff(handle, keep_new_rows)
+
+        if profile is not None:
+            with stages.stage('profile', len(df)):
+                profile.add(df)
+        df = join_and_partition(df)
+        note_progress(range_end)
+        return df
 
-    # Load the CSV file into a DataFrame
-    df = pd.read_csv(input_file)
-    metrics['rows_processed'] = len(df)  # Track the total rows processed
+    def join_and_partition(df):
+        if build_index is not None:
+            build_index.add(df)
+
+        # Add the customer details to each loan, flagging loans whose customer is unknown
+        if customer_index is not None and CUSTOMER_KEY in df.columns:
+            with stages.stage('customer_join', len(df)):
+                df = customer_index.join(df)
+                metrics['orphan_loans'] += int(df['customer_orphan'].sum())
+
+        if partition_by_month and 'book checkout' in df.columns:
+            df = add_checkout_month(df)
+        return df
+
+    def load(df):
+        nonlocal chunks_loaded
+        first_chunk = chunks_loaded == 0
+        partitioned = PARTITION_COLUMN in df.columns
+        if not writers:
+            open_writers(partitioned)
+
+        # Step 5: Save the cleaned data to the output files (overwrite on the first chunk, append after)
+        with stages.stage('output_write', len(df)):
+            for writer in writers:
+                writer.write(df)
+
+        summaries = None
+        if aggregate_loans and 'book checkout' in df.columns and chunks_loaded >= sql_chunks:
+            with stages.stage('aggregate', len(df)):
+                upsert_key = next((col for col in upsert_keys or DEFAULT_UPSERT_KEYS if col in df.columns), None)
+                if load_mode == 'upsert' and upsert_key is not None:
+                    summaries = loan_summaries(df.drop_duplicates(subset=[upsert_key], keep='last'))
+                else:
+                    summaries = loan_summaries(df)
+
+        # Insert the cleaned data into SQL with the same name as the cleaned CSV file, each chunk in one transaction
+        with stages.stage('sql_load', len(df)):
+            if chunks_loaded < sql_chunks:
+                # Committed just before the last run stopped, too late for its checkpoint
+                print(f"Chunk {chunks_loaded + 1} of {input_file} is already in SQL; not loading it again.")
+                if partitioned:
+                    replaced_partitions.update(df[PARTITION_COLUMN].unique())
+            else:
+                with engine.begin() as connection:
+                    if summaries is not None and (load_mode == 'upsert' or partitioned):
+                        # Rows kept from a table loaded before aggregate_loans was turned on must be counted first
+                        seed_loan_aggregates(base_name, connection)
+                    # The loans the load replaces, for the aggregates: all of them, some months, or single rows
+                    cleared, replaced_rows = first_chunk, None
+                    if load_mode == 'upsert':
+                        table_exists = inspect(connection).has_table(base_name + "_cleaned")
+                        if summaries is not None and table_exists and upsert_key is not None:
+                            replaced_rows = loan_summaries(existing_rows(df, base_name, connection, upsert_key))
+                        cleared = not table_exists
+                        upsert_data_to_sql(df, base_name, connection, upsert_keys or DEFAULT_UPSERT_KEYS,
+                                           batch_size=batch_size)
+                        if partitioned and first_chunk:
+                            create_partition_index(base_name + "_cleaned", connection)
+                    elif partitioned:
+                        stale = replace_partitions_in_sql(df, base_name, connection, replaced_partitions,
+                                                          load_method=load_method, batch_size=batch_size)
+                        cleared = True if stale is None else stale
+                    else:
+                        insert_data_to_sql(df, base_name, connection, if_exists='replace' if first_chunk else 'append',
+                                           load_method=load_method, batch_size=batch_size)
+                    if summaries is not None:
+                        merge_loan_aggregates(connection, base_name, summaries, replaced_rows, cleared)
+                    if checkpoint is not None:
+                        checkpoint.mark_loaded(connection, chunks_loaded + 1)
+        chunks_loaded += 1
+
+        if checkpoint is not None:
+            state, pickled_profile = progress.popleft()
+            outputs = {}
+            for writer in writers:
+                outputs.update(writer.committed())
+            checkpoint.save({**state, 'chunks': chunks_loaded, 'outputs': outputs, 'partitioned': partitioned,
+                             'replaced_partitions': sorted(replaced_partitions),
+                             'elapsed_seconds': elapsed_before + time.time() - start_time}, pickled_profile)
+
+    if split:
+        prepare = prepare_range
+
+    try:
+        if pipeline_depth:
+            # Read the next chunk and load the previous one while this one is cleaned
+            run_pipelined(source, prepare, load, depth=pipeline_depth)
+        else:
+            for item in source:
+                load(prepare(item))
+    finally:
+        source.close()  # Stops the range workers if the run failed part way
+        for writer in writers:
+            writer.close()
+        if dedup_index is not None:
+            print(f"Duplicates found across chunks: {dedup_index.hits}")
+            dedup_index.close()  # Remove any hash runs spilled to disk
+    if checkpoint is not None:
+        checkpoint.clear(engine)  # The run is complete; a rerun starts from the beginning
+
+    # Record the time taken for the process
+    processing_time = elapsed_before + time.time() - start_time
+    metrics['processing_time'] = processing_time  # Track time taken for processing
+    metrics['processing_time_seconds'] = processing_time  # The name used by the metrics table
     
+    # Insert the metrics into the SQL tables, now or with the next batch
+    buffer = metrics_buffer if metrics_buffer is not None else MetricsBuffer(engine)
+    buffer.add_metrics(metrics, input_file)
+    buffer.add_stages(stages.records(), input_file, run_started)
+    if profile is not None:
+        buffer.add_profile(profile.records(), input_file, run_started)
+    if metrics_buffer is None:
+        buffer.close()
+    
+    print(f"Data cleaning complete for {input_file}.")
+    print(f"Rows processed: {metrics['rows_processed']}")
+    print(f"Rows removed: {metrics['rows_removed']}")
+    print(f"Rows modified: {metrics['rows_modified']}")
+    print(f"Dates coerced to NaT: {metrics['dates_coerced']}")
+    print(f"Input memory (MB): {metrics['input_memory_mb']:.2f}")
+    if customer_index is not None:
+        print(f"Orphan loans (no matching customer): {metrics['orphan_loans']}")
+    print(f"Processing time: {metrics['processing_time']}")
+    stages.print_summary()
+    if profile is not None:
+        profile.print_summary()
+    
+    return metrics
+
+def clean_chunk(df, metrics, dedup_index=None, plan=None, stages=None, profile=None):
+    """
+    Apply the cleaning steps to one DataFrame (a whole file or a single chunk).
+
+    Counts are added to metrics so that chunked runs report the same totals as a
+    whole-file run. If dedup_index (a RowHashIndex) is given, rows already seen in
+    earlier chunks are dropped as duplicates and the new rows are recorded in it.
+    plan is the CleaningPlan for the file (DEFAULT_RULES if None); pass the same
+    plan for every chunk so date formats detected in the first one are reused.
+    Each step is timed into stages (a StageMetrics) when one is given. profile
+    (a DataProfile) counts the nulls of the chunk as read and profiles the
+    cleaned rows.
+    """
+    if plan is None:
+        plan = CleaningPlan()
+    if stages is None:
+        stages = StageMetrics()
+
     # Clean column names (stripping spaces and lowercasing)
     df.columns = df.columns.str.strip().str.lower()
 
+    if profile is not None:
+        with stages.stage('profile'):  # Rows are counted once, when the cleaned chunk is profiled
+            profile.count_nulls(df)
+
     # Track rows before null removal
     original_row_count = len(df)
     
-    # Step 1: Check for null values and remove rows
-    null_rows = df.isnull().sum()
-    df = df.dropna()
+    # Step 1: Handle null values as the rules' null policy says
+    with stages.stage('null_drop', original_row_count) as counts:
+        df = plan.drop_nulls(df)
+        counts['rows_out'] = len(df)
     rows_removed = original_row_count - len(df)
     metrics['rows_removed'] += rows_removed  # Track rows removed due to null values
 
     # Step 2: Check for duplicates and remove them
     original_row_count = len(df)
-    df = df.drop_duplicates()
+    with stages.stage('dedup', original_row_count) as counts:
+        df = df.drop_duplicates()
+        if dedup_index is not None:
+            df = df[dedup_index.filter_new(row_hashes(df))].copy()
+        counts['rows_out'] = len(df)
     rows_removed = original_row_count - len(df)
     metrics['rows_removed'] += rows_removed  # Track rows removed due to duplicates
 
-    # Step 3: Modify columns (e.g., lowercase strings, convert dates)
-    rows_modified = 0  # Count rows that are modified (e.g., converted to lowercase, etc.)
-    
-    # Convert 'book checkout' to datetime if present
-    if 'book checkout' in df.columns:
-        df['book checkout'] = df['book checkout'].str.replace('"', "", regex=True)
-        df['book checkout'] = pd.to_datetime(df['book checkout'], errors='coerce')
-        rows_modified += df['book checkout'].notna().sum()  # Count rows modified (non-NaT entries)
-
-    # Convert 'book returned' to datetime if present
-    if 'book returned' in df.columns:
-        df['book returned'] = pd.to_datetime(df['book returned'], errors='coerce')
-        rows_modified += df['book returned'].notna().sum()  # Count rows modified (non-NaT entries)
-    
-    # Example: Convert string columns to lowercase (if applicable)
-    if 'string_column' in df.columns:
-        df['string_column'] = df['string_column'].str.lower()
-        rows_modified += df['string_column'].notna().sum()  # Track rows modified
+    # Step 3: Modify columns (convert dates, lowercase strings, ...) and drop rows failing validation
+    with stages.stage('transform', len(df)) as counts:
+        df = plan.transform(df, metrics)
+        counts['rows_out'] = len(df)
 
-    metrics['rows_modified'] = rows_modified
+    # Step 4: Enrich loans with their duration, overdue days and a flag for returns before checkout
+    with stages.stage('enrich', len(df)):
+        df = enrich_date_duration(df, 'book returned', 'book checkout')
 
-    # Step 4: Save the cleaned data to a CSV file
-    df.to_csv(output_file, index=False, mode='w')  # Overwrite the file if exists
+    if profile is not None:
+        with stages.stage('profile', len(df)):
+            profile.add(df)
 
-    # Record the time taken for the process
-    processing_time = time.time() - start_time
-    metrics['processing_time'] = processing_time  # Track time taken for processing
+    return df
 
-    # Insert the cleaned data into SQL with the same name as the cleaned CSV file
-    insert_data_to_sql(df, base_name, engine)
-    
-    # Insert the metrics into the SQL table
-    insert_metrics_to_sql(metrics, input_file, engine)
-    
-    print(f"Data cleaning complete for {input_file}.")
-    print(f"Rows processed: {metrics['rows_processed']}")
-    print(f"Rows removed: {metrics['rows_removed']}")
-    print(f"Rows modified: {metrics['rows_modified']}")
-    print(f"Processing time: {metrics['processing_time']}")
-    
-    return metrics
+def detect_date_formats(plan, input_file, rows, csv_engine='c', schema=None):
+    """
+    Detect plan's missing date formats on the first rows of input_file, as a
+    sequential run does on its first chunk, so every range of a split file is
+    parsed with the same formats.
+    """
+    df = next(read_csv_chunks(input_file, chunksize=rows, csv_engine=csv_engine, schema=schema), None)
+    if df is None:
+        return
+    df.columns = df.columns.str.strip().str.lower()
+    plan.transform_rows(plan.drop_nulls(df).drop_duplicates())
+
+def clean_byte_range(input_file, header, start, end, plan, csv_engine='c', schema=None, compact=False,
+                     count_nulls=False):
+    """
+    Read and clean the rows between two byte offsets of input_file, in a worker
+    process, and return a put_handoff handle to the result.
+
+    The steps are those of clean_chunk up to the deduplication across the whole
+    file, which needs every range and is left to the parent: rows are dropped
+    for nulls and for duplicates within the range, hashed, transformed and
+    enriched. Rows failing validation are only flagged, and rows_modified and
+    dates_coerced are returned per row, so the parent counts just the rows it keeps.
+    """
+    stages = StageMetrics()
+    with stages.stage('read') as counts:
+        df = read_csv_bytes(header + read_byte_range(input_file, start, end), csv_engine=csv_engine, schema=schema)
+        counts['rows_in'] = counts['rows_out'] = rows_read = len(df)
+    if compact:
+        with stages.stage('compact', rows_read):
+            df = compact_dtypes(df)
+    input_memory_mb = memory_mb(df)
+
+    df.columns = df.columns.str.strip().str.lower()
+    null_counts = df.isna().sum().to_dict() if count_nulls else {}
+
+    with stages.stage('null_drop', rows_read) as counts:
+        df = plan.drop_nulls(df)
+        counts['rows_out'] = len(df)
+    with stages.stage('dedup', len(df)) as counts:
+        df = df.drop_duplicates()
+        hashes = row_hashes(df)
+        counts['rows_out'] = len(df)
+    rows_removed = rows_read - len(df)
+
+    with stages.stage('transform', len(df)) as counts:
+        df, invalid, modified, coerced = plan.transform_rows(df)
+        counts['rows_out'] = int(len(df) - invalid.sum())
+    with stages.stage('enrich', len(df)):
+        df = enrich_date_duration(df, 'book returned', 'book checkout')
+
+    return put_handoff({'df': df, 'hashes': hashes, 'invalid': invalid, 'modified': modified, 'coerced': coerced,
+                       'end': end, 'rows_read': rows_read, 'rows_removed': rows_removed, 'memory_mb': input_memory_mb,
+                       'null_counts': null_counts, 'stages': stages.records()})
+
+def clean_ranges(input_file, plan, workers, range_bytes, stages, start=None, hasher=None, **options):
+    """
+    Clean input_file's byte ranges in a pool of workers processes and yield the
+    put_handoff handles of their results in file order.
+
+    Ranges are handed out as the file is scanned for row boundaries, with at
+    most two per worker waiting, so a fast pool does not get far ahead of the
+    parent. Time spent waiting for the next range is timed as 'range_wait'.
+    start is the byte offset to carry on from, e.g. in a resumed run. The
+    scanned bytes are passed on to hasher, as by split_byte_ranges.
+    """
+    with open(input_file, 'rb') as f:
+        header = f.readline()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for range_start, range_end in split_byte_ranges(input_file, range_bytes, start, hasher):
+                pending.append(executor.submit(clean_byte_range, input_file, header, range_start, range_end, plan,
+                                               **options))
+                if len(pending) > 2 * workers:
+                    with stages.stage('range_wait'):
+                        handle = pending.popleft().result()
+                    yield handle
+            while pending:
+                with stages.stage('range_wait'):
+                    handle = pending.popleft().result()
+                yield handle
+        finally:
+            # Free the results of ranges that were cleaned but will not be read
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    discard_handoff(future.result())
+
+# Days per unit for the 'days allowed to borrow' column (e.g. "2 weeks")
+BORROW_PERIOD_UNITS = {'day': 1, 'week': 7, 'fortnight': 14, 'month': 30}
+
+def parse_borrow_period(series):
+    """
+    Convert loan periods like "2 weeks" or "10 days" to a float number of days.
+    Each distinct value is parsed once; anything unrecognised becomes NaN.
+    """
+    codes, uniques = pd.factorize(series)
+    parts = pd.Series(uniques, dtype=object).astype(str).str.lower().str.extract(
+        r'^\s*(\d+(?:\.\d+)?)?\s*(day|week|fortnight|month)s?\s*$')
+    amounts = pd.to_numeric(parts[0], errors='coerce').fillna(1.0)  # "1 week" may be written "week"
+    days = (amounts * parts[1].map(BORROW_PERIOD_UNITS)).to_numpy(dtype='float64')
+    return pd.Series(np.append(days, np.nan)[codes], index=series.index)  # code -1 (missing) picks the NaN
+
+def enrich_date_duration(df, colA, colB, allowed_col='days allowed to borrow'):
+    """
+    Takes the two input date columns and calculates the difference in days between them.
+    The result is added as a new column 'loan_duration'.
+
+    colA should be the later of the two date columns (e.g., 'book returned').
+    Rows where colA is before colB are flagged in 'loan_negative' and their
+    loan_duration is clamped to 0, so callers can drop them by the flag. If
+    allowed_col is present it is parsed into 'allowed_days' and the days past it
+    are added as 'overdue_days'. Everything is computed on whole columns.
+    """
+    if colA in df.columns and colB in df.columns:
+        # Calculate loan duration in days
+        duration = (df[colA] - df[colB]).dt.days
+
+        # Ensure loan duration is non-negative, flagging the rows that were not
+        df['loan_duration'] = duration.clip(lower=0)
+        df['loan_negative'] = duration < 0
+
+        if allowed_col in df.columns:
+            df['allowed_days'] = parse_borrow_period(df[allowed_col])
+            df['overdue_days'] = (df['loan_duration'] - df['allowed_days']).clip(lower=0)
+    return df
+
+# Column holding the 'book checkout' month (YYYY-MM) that partitioned output is split on
+PARTITION_COLUMN = 'checkout_month'
+# Partition of the loans whose checkout date is missing
+UNKNOWN_PARTITION = 'unknown'
+
+def add_checkout_month(df, date_col='book checkout'):
+    """
+    Add PARTITION_COLUMN, the month of date_col as 'YYYY-MM' ('unknown' where it is missing).
+    """
+    df[PARTITION_COLUMN] = checkout_months(df, date_col)
+    return df
+
+def checkout_months(df, date_col='book checkout'):
+    """
+    The month of date_col of each row as 'YYYY-MM' ('unknown' where it is missing).
+    """
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        raise ValueError(f"Splitting loans by month needs '{date_col}' parsed as a date by the cleaning rules")
+    return df[date_col].dt.strftime('%Y-%m').fillna(UNKNOWN_PARTITION)
+
+def loan_summaries(df):
+    """
+    summarise_loans of the cleaned loans in df, by their checkout month.
+    """
+    months = df[PARTITION_COLUMN] if PARTITION_COLUMN in df.columns else checkout_months(df)
+    return summarise_loans(df, months)
 
-def insert_data_to_sql(df, base_name, engine):
+def row_hashes(df):
+    """
+    Return a uint64 hash per row, ignoring the index.
+
+    Numeric columns are hashed as float64 so that a value read as int in one chunk
+    and as float in another (pandas upcasts when a chunk contains NaN) still matches.
+    """
+    hashable = df.copy()
+    for col in hashable.select_dtypes(include='number').columns:
+        hashable[col] = hashable[col].astype('float64')
+    return pd.util.hash_pandas_object(hashable, index=False).to_numpy()
+
+# SQL Server accepts at most 2100 parameters per statement; stay under it for multi-row inserts
+MAX_PARAMETERS_PER_STATEMENT = 2000
+# SQL Server also accepts at most 1000 rows in one INSERT ... VALUES list
+MAX_ROWS_PER_VALUES = 1000
+
+# Connection strings of an in-memory SQLite database, for test runs without SQL Server
+IN_MEMORY_SQLITE = ('sqlite://', 'sqlite:///:memory:')
+
+def create_sql_engine(connection_string, pool_size=5, max_overflow=10, pool_timeout=30):
+    """
+    Create the SQLAlchemy engine, turning on pyodbc's fast_executemany for SQL Server
+    so batched inserts are sent as one array-bound round-trip instead of row by row.
+
+    The engine keeps a pool of pool_size connections (plus up to max_overflow more
+    under load, waiting pool_timeout seconds for a free one), shared by the data
+    loads and the metrics writes, and checks a connection is alive before reusing
+    it. An in-memory SQLite database is held on a single connection shared by all
+    threads, as every new connection would otherwise open an empty database.
+    """
+    if connection_string in IN_MEMORY_SQLITE:
+        return create_engine(connection_string, poolclass=StaticPool, connect_args={'check_same_thread': False})
+    options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_timeout': pool_timeout,
+               'pool_pre_ping': True}
+    if connection_string.startswith('mssql+pyodbc'):
+        options['fast_executemany'] = True
+    return create_engine(connection_string, **options)
+
+@contextmanager
+def begin_transaction(bind):
+    """
+    A transaction on bind: a new one on an Engine, or the caller's on a Connection,
+    so the SQL load functions below can run inside a larger transaction.
+    """
+    if isinstance(bind, Connection):
+        yield bind
+    else:
+        with bind.begin() as connection:
+            yield connection
+
+def sql_ready(df):
+    """
+    Return df with numeric columns as float64 (so every chunk creates and matches
+    the same column types, whatever integer width it was read with) and
+    categoricals as plain values.
+    """
+    df = df.copy()
+    for col in df.select_dtypes(include=['number']).columns:
+        df[col] = df[col].astype('float64')  # Ensure numpy types are converted to Python types
+    for col in df.select_dtypes(include=['category']).columns:
+        df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+def insert_data_to_sql(df, base_name, engine, if_exists='replace', load_method='executemany', batch_size=10000):
     """
     Insert the cleaned data into a SQL table with the same name as the cleaned CSV file.
+    Pass if_exists='append' to add further chunks to a table created by the first one.
+    engine may also be a Connection, in which case its open transaction is used.
+
+    load_method picks the insert strategy:
+    - 'executemany': one parameterised INSERT bound to batch_size rows at a time (uses
+      fast_executemany on SQL Server, plain DBAPI executemany elsewhere)
+    - 'multi': multi-row INSERT ... VALUES statements via pandas
+    - 'to_sql': the plain pandas to_sql insert
+    Returns the load rate in rows per second.
     """
     table_name = base_name + "_cleaned"  # Use the base name for the table name
 
     # Ensure that all columns in the dataframe are of correct types
-    for col in df.select_dtypes(include=[np.int64, np.float64]).columns:
-        df[col] = df[col].astype('float64')  # Ensure numpy types are converted to Python types
+    df = sql_ready(df)
+
+    start_time = time.time()
 
     # Insert the DataFrame into the SQL table
-    df.to_sql(table_name, con=engine, if_exists='replace', index=False)
+    if load_method == 'executemany':
+        bulk_insert(df, table_name, engine, if_exists=if_exists, batch_size=batch_size)
+    elif load_method == 'multi':
+        rows_per_statement = max(1, min(batch_size, MAX_ROWS_PER_VALUES,
+                                        MAX_PARAMETERS_PER_STATEMENT // max(1, len(df.columns))))
+        df.to_sql(table_name, con=engine, if_exists=if_exists, index=False,
+                  method='multi', chunksize=rows_per_statement)
+    elif load_method == 'to_sql':
+        df.to_sql(table_name, con=engine, if_exists=if_exists, index=False)
+    else:
+        raise ValueError(f"Unknown load method: {load_method}")
 
-    print(f"Data saved to SQL table: {table_name}")
+    load_time = time.time() - start_time
+    rows_per_second = len(df) / load_time if load_time > 0 else 0.0
 
-import pandas as pd
+    print(f"Data saved to SQL table: {table_name} ({len(df)} rows, {rows_per_second:.0f} rows/sec via {load_method})")
+    return rows_per_second
 
-def insert_metrics_to_sql(metrics, file_name, engine):
+def bulk_insert(df, table_name, engine, if_exists='replace', batch_size=10000):
     """
-    Insert metrics into the SQL table using DataFrame and pandas `to_sql`.
+    Create (or reuse) table_name from the DataFrame's schema and insert its rows in
+    batches of batch_size with executemany, all inside one transaction.
     """
-    # Convert numpy types to native Python types to avoid issues
-    metrics = {key: int(value) if isinstance(value, (np.int64, np.float64, float, int)) else value
-               for key, value in metrics.items()}
-    
-    # Convert the metrics dictionary into a DataFrame
-    metrics_df = pd.DataFrame([metrics])  # Wrap the metrics dict in a list to create a single row DataFrame
-    metrics_df['file_name'] = file_name  # Add the file_name to the DataFrame
-    
-    # Ensure the DataFrame has the same column names as the table
-    # Here we're assuming the table has columns: file_name, rows_processed, rows_removed, rows_modified, processing_time_seconds
-    metrics_df = metrics_df[['file_name', 'rows_processed', 'rows_removed', 'rows_modified', 'processing_time_seconds']]
-    
-    # Insert the DataFrame into the SQL table
-    metrics_df.to_sql('data_cleaning_metrics', con=engine, if_exists='append', index=False)
-    
-    print(f"Metrics for {file_name} inserted into SQL.")
+    # Let pandas create the table with the right column types, without any rows
+    df.head(0).to_sql(table_name, con=engine, if_exists=if_exists, index=False)
 
+    table = Table(table_name, MetaData(), autoload_with=engine)
 
+    # Convert to plain Python values, with NaN/NaT sent as NULL
+    records = df.astype(object).where(df.notna(), None)
 
-def main():
-    parser = argparse.ArgumentParser(description="Cleanse CSV data and track metrics.")
-    parser.add_argument("server_name", help="SQL Server name or IP address")
-    parser.add_argument("database_name", help="SQL Server database name")
+    with begin_transaction(engine) as connection:
+        for start in range(0, len(records), batch_size):
+            batch = records.iloc[start:start + batch_size].to_dict('records')
+            connection.execute(table.insert(), batch)
 
-    # Parse the command-line arguments
-    args = parser.parse_args()
+def create_partition_index(table_name, engine, partition_column=PARTITION_COLUMN):
+    """
+    Index partition_column of table_name, unless it already is, so reports and
+    partition replacement filter on it without a full scan.
+    """
+    index_name = f"ix_{table_name}_{partition_column}"
+    if any(index['name'] == index_name for index in inspect(engine).get_indexes(table_name)):
+        return
+    quote = engine.dialect.identifier_preparer.quote
+    with begin_transaction(engine) as connection:
+        connection.execute(text(f"CREATE INDEX {quote(index_name)} ON {quote(table_name)} ({quote(partition_column)})"))
 
-    # Create the connection string to the database
-    connection_string = f'mssql+pyodbc://{args.server_name}/{args.database_name}?trusted_connection=yes&driver=ODBC+Driver+17+for+SQL+Server'
-    
-    # Create SQLAlchemy engine to interact with the SQL Server
-    engine = create_engine(connection_string)
+def replace_partitions_in_sql(df, base_name, engine, replaced, load_method='executemany', batch_size=10000,
+                              partition_column=PARTITION_COLUMN):
+    """
+    Load df into the <base_name>_cleaned table, replacing only the partitions
+    (values of partition_column) it holds and leaving the others as they are.
+
+    The rows of each partition not yet in replaced are deleted before df is
+    appended, and the partition is added to replaced so that later chunks of the
+    same run append to it. A table that does not exist yet, or was built without
+    partition_column, is rebuilt from df with an index on the column. Returns
+    the partitions whose earlier rows were deleted, or None if the table was rebuilt.
+    """
+    table_name = base_name + "_cleaned"
+    partitions = set(df[partition_column].unique())
+
+    if not replaced:
+        inspector = inspect(engine)
+        if (not inspector.has_table(table_name) or
+                partition_column not in [col['name'] for col in inspector.get_columns(table_name)]):
+            insert_data_to_sql(df, base_name, engine, if_exists='replace', load_method=load_method,
+                               batch_size=batch_size)
+            create_partition_index(table_name, engine, partition_column)
+            replaced.update(partitions)
+            return None
+
+    stale = sorted(partitions - replaced)
+    if stale:
+        quote = engine.dialect.identifier_preparer.quote
+        delete = text(f"DELETE FROM {quote(table_name)} WHERE {quote(partition_column)} IN :partitions")
+        with begin_transaction(engine) as connection:
+            connection.execute(delete.bindparams(bindparam('partitions', expanding=True)), {'partitions': stale})
+        replaced.update(stale)
+        print(f"Replacing partitions of {table_name}: {', '.join(stale)}")
+    insert_data_to_sql(df, base_name, engine, if_exists='append', load_method=load_method, batch_size=batch_size)
+    return stale
 
-    # Get the list of all CSV files in the current directory
-    csv_files = glob.glob("*.csv")
+# Key columns tried in order when upserting: 'id' in the Systembook file, 'customer id' in the Customers file
+DEFAULT_UPSERT_KEYS = ['id', 'customer id']
+
+def existing_rows(df, base_name, engine, key):
+    """
+    Read the rows of the <base_name>_cleaned table whose key is one of df's,
+    i.e. those an upsert of df will overwrite, with their dates parsed.
+    """
+    table_name = base_name + "_cleaned"
+    quote = engine.dialect.identifier_preparer.quote
+    keys = df[key].dropna().unique()
+    if pd.api.types.is_numeric_dtype(keys):
+        keys = keys.astype('float64')  # As sql_ready stored them
+    keys = keys.tolist()
+    query = text(f"SELECT * FROM {quote(table_name)} WHERE {quote(key)} IN :keys").bindparams(
+        bindparam('keys', expanding=True))
+    parts = [pd.read_sql(query, engine, params={'keys': keys[start:start + MAX_PARAMETERS_PER_STATEMENT]})
+             for start in range(0, len(keys), MAX_PARAMETERS_PER_STATEMENT)]
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.read_sql(query, engine, params={'keys': [None]})
+    for col in DATE_COLUMNS:
+        if col in rows.columns:
+            rows[col] = pd.to_datetime(rows[col])
+    return rows
 
-    # Check if any CSV files are found
-    if not csv_files:
-        print("No CSV files found in the current directory.")
+def seed_loan_aggregates(base_name, engine, chunksize=100_000):
+    """
+    Build the aggregate tables from the whole <base_name>_cleaned table when it
+    exists but they do not, i.e. it was loaded before aggregate_loans was used.
+    The table is read chunksize rows at a time and the sums merged once.
+    """
+    table_name = base_name + "_cleaned"
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name) or any(inspector.has_table(f"{base_name}_{suffix}")
+                                                  for suffix in AGGREGATE_TABLES):
+        return
+    if 'book checkout' not in {col['name'] for col in inspector.get_columns(table_name)}:
         return
+    quote = engine.dialect.identifier_preparer.quote
+    parts = {}
+    for rows in pd.read_sql(text(f"SELECT * FROM {quote(table_name)}"), engine, chunksize=chunksize):
+        for col in DATE_COLUMNS:
+            if col in rows.columns:
+                rows[col] = pd.to_datetime(rows[col])
+        for suffix, summary in loan_summaries(rows).items():
+            parts.setdefault(suffix, []).append(summary)
+    if parts:
+        merge_loan_aggregates(engine, base_name, {suffix: pd.concat(summaries, ignore_index=True)
+                                                  for suffix, summaries in parts.items()})
 
-    # Process each CSV file and track metrics
+def upsert_data_to_sql(df, base_name, engine, key_columns=DEFAULT_UPSERT_KEYS, batch_size=10000):
+    """
+    Merge the cleaned data into the existing SQL table instead of replacing it.
+
+    The rows are bulk loaded into a staging table, then rows whose key already
+    exists are updated only if a value differs, and rows with a new key are
+    inserted. The reporting table is never dropped, and only new or changed rows
+    are written to it. The first of key_columns present in df is used as the key.
+    Returns a dict with the number of rows inserted and updated.
+    """
+    table_name = base_name + "_cleaned"
+    key = next((col for col in key_columns if col in df.columns), None)
+    if key is None:
+        raise ValueError(f"None of the upsert keys {key_columns} are columns of {table_name}")
+
+    # The merge needs one row per key; keep the last occurrence
+    df = df.drop_duplicates(subset=[key], keep='last')
+
+    # Ensure that all columns in the dataframe are of correct types
+    df = sql_ready(df)
+
+    quote = engine.dialect.identifier_preparer.quote
+
+    # First load: create the table and a unique index on the key for later merges
+    if not inspect(engine).has_table(table_name):
+        bulk_insert(df, table_name, engine, if_exists='fail', batch_size=batch_size)
+        with begin_transaction(engine) as connection:
+            connection.execute(text(f"CREATE UNIQUE INDEX {quote('ux_' + table_name)} "
+                                    f"ON {quote(table_name)} ({quote(key)})"))
+        print(f"Data saved to SQL table: {table_name} ({len(df)} rows inserted)")
+        return {'rows_inserted': len(df), 'rows_updated': 0}
+
+    staging_name = table_name + "_staging"
+    bulk_insert(df, staging_name, engine, if_exists='replace', batch_size=batch_size)
+
+    target, staging, key_col = quote(table_name), quote(staging_name), quote(key)
+    value_cols = [quote(col) for col in df.columns if col != key]
+    all_cols = ', '.join(quote(col) for col in df.columns)
+    match = f"s.{key_col} = {target}.{key_col}"
+
+    # Null-safe "value differs" test, so unchanged rows are left alone
+    changed = ' OR '.join(f"(s.{col} <> {target}.{col} OR (s.{col} IS NULL AND {target}.{col} IS NOT NULL) "
+                          f"OR (s.{col} IS NOT NULL AND {target}.{col} IS NULL))"
+                          for col in value_cols) or '1 = 0'
+    assignments = ', '.join(f"{col} = (SELECT s.{col} FROM {staging} s WHERE {match})" for col in value_cols)
+
+    with begin_transaction(engine) as connection:
+        connection.execute(text(f"CREATE INDEX {quote('ix_' + staging_name)} ON {staging} ({key_col})"))
+        rows_updated = 0
+        if value_cols:
+            rows_updated = connection.execute(text(
+                f"UPDATE {target} SET {assignments} "
+                f"WHERE EXISTS (SELECT 1 FROM {staging} s WHERE {match} AND ({changed}))")).rowcount
+        rows_inserted = connection.execute(text(
+            f"INSERT INTO {target} ({all_cols}) SELECT {all_cols} FROM {staging} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {target} WHERE {match})")).rowcount
+        connection.execute(text(f"DROP TABLE {staging}"))
+
+    print(f"Data merged into SQL table: {table_name} ({rows_inserted} rows inserted, {rows_updated} rows updated)")
+    return {'rows_inserted': rows_inserted, 'rows_updated': rows_updated}
+
+
+# Engine owned by each worker process, created once by _init_worker
+_worker_engine = None
+
+def _init_worker(connection_string, pool_options):
+    global _worker_engine
+    _worker_engine = create_sql_engine(connection_string, **pool_options)
+
+def _cleanse_file(input_file, engine, cleanse_options, profile=False, metrics_buffer=None):
+    """
+    Cleanse one file and hash its contents for the manifest, from the bytes read
+    while cleaning it. With profile=True the run is profiled and the stats are
+    dumped to Cleaned_Data/<name>.prof.
+    """
+    hasher = ContentHasher(input_file)
+    cleanse_options = {**cleanse_options, 'metrics_buffer': metrics_buffer, 'content_hasher': hasher}
+    if profile:
+        profiler = cProfile.Profile()
+        metrics = profiler.runcall(cleanse_data, input_file, engine, **cleanse_options)
+        profile_file = os.path.join('Cleaned_Data', input_base_name(input_file) + '.prof')
+        profiler.dump_stats(profile_file)
+        print(f"Profile for {input_file} saved to {profile_file} (view with: python -m pstats {profile_file})")
+    else:
+        metrics = cleanse_data(input_file, engine, **cleanse_options)
+    return metrics, hasher.hexdigest()
+
+def _cleanse_in_worker(input_file, cleanse_options, profile=False):
+    # The metrics rows go back to the parent process, which writes them in its batches
+    metrics_buffer = MetricsBuffer()
+    metrics, file_hash = _cleanse_file(input_file, _worker_engine, cleanse_options, profile, metrics_buffer)
+    return metrics, file_hash, metrics_buffer.take()
+
+def record_skipped_file(input_file, metrics_buffer):
+    """
+    Queue a metrics row marking input_file as skipped because it has not changed.
+    """
+    metrics = {
+        'rows_processed': 0,
+        'rows_removed': 0,
+        'rows_modified': 0,
+        'processing_time_seconds': 0,
+        'dates_coerced': 0,
+        'input_memory_mb': 0,
+        'orphan_loans': 0,
+        'status': 'skipped'
+    }
+    metrics_buffer.add_metrics(metrics, input_file)
+    return metrics
+
+def cleaned_output_path(input_file, output_format='csv'):
+    """
+    Path of the cleaned file cleanse_data writes for input_file in output_format.
+    """
+    base_name = input_base_name(input_file)
+    return os.path.join('Cleaned_Data', f"{base_name}_cleaned" + OUTPUT_EXTENSIONS[output_format])
+
+def read_cleaned_output(input_file, output_format='csv'):
+    """
+    Read back the cleaned file written for input_file by an earlier run.
+    """
+    path = cleaned_output_path(input_file, output_format)
+    if output_format == 'parquet':
+        return pd.read_parquet(path)
+    if output_format == 'arrow':
+        return pd.read_feather(path)
+    return pd.read_csv(path)
+
+# cleanse_data options that change a file's outputs or tables; a file cleaned with others is cleaned again
+OUTPUT_OPTIONS = ('load_mode', 'upsert_keys', 'date_format', 'output_formats', 'compression', 'row_group_size',
+                  'csv_engine', 'schema', 'compact', 'rules', 'data_profile', 'partition_by_month', 'aggregate_loans')
+
+def output_options_digest(cleanse_options, join_customers=None):
+    """
+    options_digest of the OUTPUT_OPTIONS in cleanse_options (with cleanse_data's
+    defaults for those not given) and of the customers pattern files are joined to.
+    """
+    parameters = signature(cleanse_data).parameters
+    options = {name: cleanse_options.get(name, parameters[name].default) for name in OUTPUT_OPTIONS}
+    return options_digest({**options, 'join_customers': join_customers})
+
+def process_files(csv_files, connection_string, workers=1, force=False,
+                  manifest_file=DEFAULT_MANIFEST_FILE, profile_file=None, join_customers=None,
+                  pool_size=5, max_overflow=10, metrics_batch_size=500, engine=None, executor=None,
+                  metrics_buffer=None, **cleanse_options):
+    """
+    Cleanse every file in csv_files and return a dict of file name -> metrics.
+
+    Files whose size, mtime and content hash match the manifest from a previous
+    run, and that were cleaned with the same OUTPUT_OPTIONS, are skipped (and
+    recorded as such in data_cleaning_metrics) unless force is True. With
+    workers > 1 the remaining files are spread over a process pool,
+    each worker holding its own SQLAlchemy engine. Files are submitted largest
+    first so the big ones do not end up running alone at the end. A file that
+    fails is reported and mapped to None without stopping the others. The file
+    whose name matches profile_file is run under cProfile.
+
+    join_customers is a file name pattern (e.g. '*Customers*.csv', or True for
+    DEFAULT_CUSTOMERS_PATTERN). The matching customers files are cleaned first,
+    building a CustomerIndex as they go (or from their cleaned output when
+    unchanged), and every other file is joined to it while it streams. When the
+    customers change, the other files are cleaned again even if they are
+    unchanged, so their customer details stay current.
+
+    Each process uses one engine whose connection pool (pool_size and
+    max_overflow) is shared by the data loads and the metrics writes. The
+    metrics rows of all files, including those cleaned by workers, are buffered
+    and written metrics_batch_size rows per transaction, with whatever is left
+    written when the run ends, even if it fails. A long-running caller can pass
+    its own engine, executor (a pool started with _init_worker, used instead of
+    workers) and metrics_buffer to reuse them across calls. Files sharing a base
+    name (see check_unique_base_names) are rejected with ValueError before any
+    is cleaned.
+    """
+    check_unique_base_names(csv_files)
+    if join_customers is True:
+        join_customers = DEFAULT_CUSTOMERS_PATTERN
+    manifest = load_manifest(manifest_file)
+    pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow}
+    if engine is None:
+        engine = create_sql_engine(connection_string, **pool_options)
+    create_metrics_table(engine)
+    own_buffer = metrics_buffer is None
+    if own_buffer:
+        metrics_buffer = MetricsBuffer(engine, batch_size=metrics_batch_size)
+    results = {}
+
+    output_format = cleanse_options.get('output_formats', ('csv',))[0]
+    customer_files = [input_file for input_file in csv_files
+                      if join_customers and fnmatch.fnmatch(uncompressed_name(input_file), join_customers)]
+    customer_index = CustomerIndex() if join_customers else None
+
+    # Anything that has not changed since it was last cleaned the same way can be skipped,
+    # but an unchanged customers file is only useful if its cleaned output is still there
+    options = output_options_digest(cleanse_options, join_customers)
+
+    def needs_cleaning(input_file):
+        return force or not is_unchanged(manifest, input_file, options) or (
+            input_file in customer_files and not os.path.exists(cleaned_output_path(input_file, output_format)))
+
+    # Files whose mtime changed are hashed to check them, several at once with workers > 1
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as checks:
+        changed = dict(zip(csv_files, checks.map(needs_cleaning, csv_files)))
+    customers_changed = any(changed[input_file] for input_file in customer_files)
+
+    to_clean = []
     for input_file in csv_files:
-        cleanse_data(input_file, engine)
+        if changed[input_file] or (customers_changed and input_file not in customer_files):
+            to_clean.append(input_file)
+        else:
+            print(f"Skipping {input_file}: unchanged since the last run with these options.")
+            results[input_file] = record_skipped_file(input_file, metrics_buffer)
+            if input_file in customer_files:
+                customer_index.add(read_cleaned_output(input_file, output_format))
 
-if __name__ == "__main__":
-    main()
+    # Largest files first keeps every worker busy until the end of the run
+    stats = {input_file: file_stat(input_file) for input_file in to_clean}
+    to_clean.sort(key=lambda input_file: stats[input_file]['size'], reverse=True)
 
+    def should_profile(input_file):
+        return profile_file is not None and os.path.basename(input_file) == os.path.basename(profile_file)
 
+    def finish(input_file, run):
+        try:
+            metrics, file_hash = run()
+        except Exception as error:
+            print(f"Failed to clean {input_file}: {error}")
+            results[input_file] = None
+            return
+        record_run(manifest, input_file, stats[input_file], file_hash, metrics, options)
+        results[input_file] = metrics
 
+    def worker_result(future):
+        metrics, file_hash, metrics_rows = future.result()
+        metrics_buffer.add_rows(metrics_rows)
+        return metrics, file_hash
 
+    try:
+        # Customers first, in this process, so the index is complete before any loans are joined to it
+        customer_options = {**cleanse_options, 'build_index': customer_index}
+        for input_file in [input_file for input_file in to_clean if input_file in customer_files]:
+            finish(input_file, lambda: _cleanse_file(input_file, engine, customer_options,
+                                                     should_profile(input_file), metrics_buffer))
+        to_clean = [input_file for input_file in to_clean if input_file not in customer_files]
+        if customer_index is not None:
+            print(f"Joining loans to {len(customer_index)} customers.")
+            cleanse_options = {**cleanse_options, 'customer_index': customer_index}
 
+        if workers <= 1 and executor is None:
+            for input_file in to_clean:
+                finish(input_file, lambda: _cleanse_file(input_file, engine, cleanse_options,
+                                                         should_profile(input_file), metrics_buffer))
+        else:
+            pool = nullcontext(executor) if executor is not None else ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(connection_string, pool_options))
+            with pool as pool_executor:
+                futures = {pool_executor.submit(_cleanse_in_worker, input_file, cleanse_options,
+                                                should_profile(input_file)): input_file
+                           for input_file in to_clean}
+                for future in as_completed(futures):
+                    finish(futures[future], lambda: worker_result(future))
+    finally:
+        # Save whatever finished, even if the run is interrupted part way
+        try:
+            if own_buffer:
+                metrics_buffer.close()
+            else:
+                metrics_buffer.flush()
+        finally:
+            save_manifest(manifest, manifest_file)
+    return results
 
+def watch_files(connection_string, patterns=None, workers=1, poll_seconds=1.0, settle_seconds=2.0, queue_size=100,
+                stop=None, join_customers=None, pool_size=5, max_overflow=10, metrics_batch_size=500,
+                **process_options):
+    """
+    Clean input files as they land, in a long-running process, until stop (a
+    threading.Event) is set or the process is interrupted.
+
+    The patterns (files, directories or globs, as for find_csv_files) are
+    watched as file_watcher.watch describes: files still being written are left
+    until they settle, and at most queue_size files wait at once. Each batch
+    goes through process_files, so unchanged files are skipped as in a one-shot
+    run. The SQL engine, the metrics buffer and, with workers > 1, the worker
+    processes and their engines are created once and stay warm between files.
+    Every file gets a row in data_cleaning_queue_metrics: when it was detected,
+    started and finished, how long it waited and how many files were queued
+    behind it. With join_customers the customers files are added to every batch
+    (and skipped while unchanged) so the loans are joined to them; when they
+    change, every file matching the patterns is joined again.
+    """
+    if join_customers is True:
+        join_customers = DEFAULT_CUSTOMERS_PATTERN
+    pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow}
+    engine = create_sql_engine(connection_string, **pool_options)
+    create_metrics_table(engine)
+    metrics_buffer = MetricsBuffer(engine, batch_size=metrics_batch_size)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(connection_string, pool_options))
 
+    def clean_batch(batch):
+        files = [entry['path'] for entry in batch]
+        available = find_csv_files(patterns)
+        check_unique_base_names(files, available)  # Nor with a file cleaned earlier, whose outputs it would replace
+        if join_customers:
+            customers = [path for path in available if fnmatch.fnmatch(uncompressed_name(path), join_customers)]
+            if any(path in customers for path in files):
+                files = available  # New customer details: join every file to them again
+            files += [path for path in customers if path not in files]
+        started_at = datetime.now()
+        results = process_files(files, connection_string, workers=workers, join_customers=join_customers,
+                                engine=engine, executor=executor, metrics_buffer=metrics_buffer, **process_options)
+        finished_at = datetime.now()
+        metrics_buffer.add_queue_metrics([
+            {'file_name': entry['path'], 'detected_at': entry['detected_at'], 'started_at': started_at,
+             'finished_at': finished_at, 'wait_seconds': entry['wait_seconds'], 'queue_depth': entry['queue_depth'],
+             'status': results[entry['path']]['status'] if results.get(entry['path']) else 'failed'}
+            for entry in batch])
+        metrics_buffer.flush()
+        print(f"Processed {len(batch)} new file(s) in {(finished_at - started_at).total_seconds():.1f}s; "
+              f"{batch[0]['queue_depth']} waiting.")
 
+    print(f"Watching {', '.join(patterns or ['the current directory'])} for CSV files (Ctrl+C to stop).")
+    try:
+        watch(clean_batch, patterns, poll_seconds=poll_seconds, settle_seconds=settle_seconds,
+              queue_size=queue_size, batch_size=max(1, workers), stop=stop)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        metrics_buffer.close()
@@ -0,0 +1,166 @@
+import argparse
+from file_manifest import DEFAULT_MANIFEST_FILE
+from input_files import check_unique_base_names, find_csv_files
+
+# Nothing here imports pandas, numpy or SQLAlchemy; clean_data is only imported once there are files to clean
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Cleanse CSV data and track metrics.")
+    parser.add_argument("server_name", nargs='?', help="SQL Server name or IP address")
+    parser.add_argument("database_name", nargs='?', help="SQL Server database name")
+    parser.add_argument("--sqlite", default=None, metavar="PATH",
+                        help="Write to a local SQLite database file (or :memory:) instead of SQL Server, for testing")
+    parser.add_argument("--pool-size", type=int, default=5,
+                        help="Connections kept open in each process's pool, shared by data loads and metrics writes")
+    parser.add_argument("--max-overflow", type=int, default=10,
+                        help="Extra connections the pool may open under load")
+    parser.add_argument("--metrics-batch-size", type=int, default=500,
+                        help="Metrics rows written to SQL per transaction")
+    parser.add_argument("--input", nargs='+', dest="inputs", default=None, metavar="PATTERN",
+                        help="CSV files, directories (searched recursively) or globs such as exports/**/*.csv.gz "
+                        "(default: *.csv and compressed .csv.gz/.bz2/.xz/.zst files in the current directory)")
+    parser.add_argument("--no-memory-map", action="store_false", dest="memory_map",
+                        help="Read uncompressed files with buffered I/O instead of memory-mapping them")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and clean CSV files as they land in the --input directories or globs")
+    parser.add_argument("--poll-seconds", type=float, default=1.0,
+                        help="How often --watch looks for new files")
+    parser.add_argument("--settle-seconds", type=float, default=2.0,
+                        help="How long a file must stay unchanged before --watch treats it as fully written")
+    parser.add_argument("--queue-size", type=int, default=100,
+                        help="Most files --watch queues at once; further files wait until the queue drains")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream each CSV in chunks of this many rows instead of loading it whole")
+    parser.add_argument("--dedup-memory-mb", type=int, default=256,
+                        help="Memory for cross-chunk duplicate detection before row hashes spill to disk")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of files to clean in parallel, each in its own process")
+    parser.add_argument("--range-workers", type=int, default=0,
+                        help="Split each uncompressed file into byte ranges cleaned by this many processes")
+    parser.add_argument("--range-mb", type=float, default=64,
+                        help="Size of the byte ranges for --range-workers, in MB")
+    parser.add_argument("--load-method", choices=['executemany', 'multi', 'to_sql'], default='executemany',
+                        help="How cleaned rows are inserted into SQL")
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="Rows sent to SQL per batch")
+    parser.add_argument("--date-format", default=None,
+                        help="strptime format of the date columns, e.g. %%d/%%m/%%Y (detected from the data by default)")
+    parser.add_argument("--output-format", nargs='+', choices=['csv', 'parquet', 'arrow'], default=['csv'],
+                        dest="output_formats", help="Format(s) of the cleaned files written to Cleaned_Data")
+    parser.add_argument("--compression", default='snappy',
+                        help="Parquet codec (snappy, zstd, gzip, none) or Arrow codec (lz4, zstd)")
+    parser.add_argument("--row-group-size", type=int, default=1_000_000,
+                        help="Maximum rows per Parquet row group")
+    parser.add_argument("--csv-engine", choices=['c', 'pyarrow'], default='c',
+                        help="CSV parser: pandas' C engine or pyarrow's multithreaded reader")
+    parser.add_argument("--schema", default=None,
+                        help="JSON file mapping CSV columns to dtypes, instead of inferring them")
+    parser.add_argument("--compact-dtypes", action="store_true",
+                        help="Store IDs as the smallest integer type and low-cardinality text as categoricals")
+    parser.add_argument("--rules", default=None,
+                        help="JSON (or YAML, with PyYAML) file of cleaning rules, optionally per file name pattern")
+    parser.add_argument("--join-customers", nargs='?', const=True, default=None,
+                        metavar="PATTERN", help="Clean the customers file(s) matching PATTERN first (default "
+                        "*Customers*.csv) and join every loan to its customer, flagging orphans")
+    parser.add_argument("--load-mode", choices=['replace', 'upsert'], default='replace',
+                        help="Replace each cleaned table, or merge new and changed rows into it")
+    parser.add_argument("--upsert-key", action="append", dest="upsert_keys", default=None,
+                        help="Key column for --load-mode upsert; repeat to give fallbacks (default: id, then customer id)")
+    parser.add_argument("--data-profile", action="store_true",
+                        help="Profile every column while cleaning and store it in data_cleaning_column_profile")
+    parser.add_argument("--aggregate-loans", action="store_true",
+                        help="Keep loan summary tables per checkout month, customer and book, merged as loans are loaded")
+    parser.add_argument("--partition-by-month", action="store_true",
+                        help="Split the cleaned loans by 'book checkout' month, rewriting only the months in each file")
+    parser.add_argument("--pipeline-depth", type=int, default=0,
+                        help="Overlap reading, cleaning and SQL loading, queueing up to this many chunks between them")
+    parser.add_argument("--resumable", action="store_true",
+                        help="Checkpoint chunked runs after every chunk so a rerun resumes where an interrupted one stopped")
+    parser.add_argument("--profile", default=None, metavar="CSV_FILE",
+                        help="Run cProfile while cleaning this file and save the stats to Cleaned_Data/<name>.prof")
+    parser.add_argument("--force", action="store_true",
+                        help="Clean every file even if it is unchanged since the last run")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_FILE,
+                        help="JSON manifest of previously cleaned files")
+    return parser
+
+def process_options(args):
+    """
+    The process_files options given by the arguments, shared by one-shot and --watch runs.
+    """
+    from csv_ingest import load_schema
+    from cleaning_rules import load_rules
+    return dict(manifest_file=args.manifest, join_customers=args.join_customers, pool_size=args.pool_size,
+                max_overflow=args.max_overflow, metrics_batch_size=args.metrics_batch_size,
+                chunksize=args.chunksize, dedup_memory_mb=args.dedup_memory_mb,
+                load_method=args.load_method, batch_size=args.batch_size,
+                load_mode=args.load_mode, upsert_keys=args.upsert_keys,
+                date_format=args.date_format, output_formats=args.output_formats,
+                compression=args.compression, row_group_size=args.row_group_size,
+                csv_engine=args.csv_engine, schema=load_schema(args.schema) if args.schema else None,
+                compact=args.compact_dtypes, rules=load_rules(args.rules) if args.rules else None,
+                pipeline_depth=args.pipeline_depth, data_profile=args.data_profile,
+                partition_by_month=args.partition_by_month, memory_map=args.memory_map,
+                range_workers=args.range_workers, range_mb=args.range_mb, resumable=args.resumable,
+                aggregate_loans=args.aggregate_loans)
+
+def main(argv=None):
+    """
+    Parse the arguments and clean the CSV files in the current directory.
+
+    pandas, numpy and SQLAlchemy are only imported (through clean_data) once
+    there are files to clean, so --help, argument errors and runs without CSV
+    files start in a fraction of the time.
+    """
+    parser = build_parser()
+
+    # Parse the command-line arguments
+    args = parser.parse_args(argv)
+
+    # Create the connection string to the database
+    if args.sqlite:
+        connection_string = f'sqlite:///{args.sqlite}'
+    elif args.server_name and args.database_name:
+        connection_string = f'mssql+pyodbc://{args.server_name}/{args.database_name}?trusted_connection=yes&driver=ODBC+Driver+17+for+SQL+Server'
+    else:
+        parser.error("server_name and database_name are required unless --sqlite is given")
+    if args.sqlite == ':memory:' and args.workers > 1:
+        # Each worker process would load into its own in-memory database, discarded when the worker exits
+        parser.error("--workers needs a database the worker processes share: use an --sqlite file, not :memory:")
+
+    if args.watch:
+        from clean_data import watch_files
+        try:
+            watch_files(connection_string, args.inputs, workers=args.workers, poll_seconds=args.poll_seconds,
+                        settle_seconds=args.settle_seconds, queue_size=args.queue_size,
+                        **process_options(args))
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        return
+
+    # Get the list of CSV files, plain or compressed, matching the inputs (the current directory by default)
+    csv_files = find_csv_files(args.inputs)
+
+    # Check if any CSV files are found
+    if not csv_files:
+        print("No CSV files found" + (f" matching {' '.join(args.inputs)}." if args.inputs else " in the current directory."))
+        return
+    try:
+        check_unique_base_names(csv_files)
+    except ValueError as error:
+        parser.error(str(error))
+
+    # The heavy imports, now that there is work to do
+    from clean_data import process_files
+
+    # Process each CSV file and track metrics (the SQLAlchemy engine is created per process)
+    results = process_files(csv_files, connection_string, workers=args.workers, force=args.force,
+                            profile_file=args.profile, **process_options(args))
+
+    failed = [input_file for input_file, metrics in results.items() if metrics is None]
+    if failed:
+        print(f"{len(failed)} of {len(csv_files)} files failed: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
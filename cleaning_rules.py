@@ -0,0 +1,298 @@
+import fnmatch
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Columns parsed as dates, and the formats tried (in order of preference) when none is given.
+# Day-first comes before month-first because the library exports use dd/mm/yyyy.
+DATE_COLUMNS = ['book checkout', 'book returned']
+CANDIDATE_DATE_FORMATS = ['%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d', '%d.%m.%Y',
+                          '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%y']
+
+NULL_POLICIES = ('drop_any', 'drop_required', 'keep')
+COLUMN_TYPES = ('string', 'date', 'numeric', 'integer', 'category')
+COLUMN_OPTIONS = {'type', 'format', 'strip_quotes', 'trim', 'lowercase', 'drop_invalid',
+                  'min', 'max', 'allowed', 'pattern'}
+
+# The rules cleanse_data has always applied: the two date columns, plus the example
+# string_column and numeric_column from the original scripts
+DEFAULT_RULES = {
+    'null_policy': 'drop_any',
+    'columns': {
+        'book checkout': {'type': 'date', 'strip_quotes': True},
+        'book returned': {'type': 'date', 'strip_quotes': True},
+        'string_column': {'lowercase': True},
+        'numeric_column': {'type': 'numeric'},
+    },
+}
+
+
+def detect_date_format(values, sample_size=1000):
+    """
+    Pick the candidate format that parses the most of a sample of date strings.
+    Returns None if no candidate parses any of them.
+    """
+    sample = pd.Series(values).dropna().drop_duplicates().head(sample_size)
+    best_format, best_count = None, 0
+    for date_format in CANDIDATE_DATE_FORMATS:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format
+
+def _parse_dates(uniques, col, date_formats):
+    """
+    Parse distinct date strings with the format in date_formats[col], detecting
+    (and storing) it first if there is none yet.
+    """
+    date_format = date_formats.get(col)
+    if date_format is None:
+        date_format = detect_date_format(uniques)
+        if date_format is not None:
+            date_formats[col] = date_format  # Reuse for the rest of the file
+
+    if date_format is not None:
+        return pd.Series(pd.to_datetime(uniques, format=date_format, errors='coerce'))
+    return pd.Series(pd.to_datetime(uniques, dayfirst=True, errors='coerce'))
+
+def parse_date_column(series, col, date_formats):
+    """
+    Parse a column of date strings and return (parsed series, number coerced to NaT).
+
+    Each distinct string is stripped of quotes and parsed once, and the results are
+    mapped back onto the rows, so repeated dates cost nothing extra. The format comes
+    from date_formats[col], or is detected from the values and stored there.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, 0
+
+    # Parse each distinct value once, then broadcast back by position
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.replace('"', '', regex=False).str.strip()
+
+    parsed = _broadcast(_parse_dates(uniques, col, date_formats), codes, series)
+    coerced = int(parsed.isna().sum() - (codes == -1).sum())
+    return parsed, coerced
+
+def _broadcast(values, codes, like):
+    """
+    Map per-distinct-value results back onto the rows of like; code -1 (missing) gives a missing value.
+    """
+    if pd.api.types.is_extension_array_dtype(values.dtype):
+        taken = values.array.take(codes, allow_fill=True)
+    else:
+        taken = pd.api.extensions.take(values.to_numpy(), codes, allow_fill=True)
+    return pd.Series(taken, index=like.index, name=like.name)
+
+
+def load_rules(rules_file):
+    """
+    Load a rules config from JSON, or from YAML (.yml/.yaml) when PyYAML is installed.
+    """
+    with open(rules_file) as f:
+        if rules_file.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML rules need PyYAML: pip install pyyaml (or write the rules as JSON)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def rules_for_file(config, input_file):
+    """
+    Return the rules that apply to input_file.
+
+    A config is either one set of rules, or a dict with 'files' (file name glob ->
+    rules, first match wins) and an optional 'default' for files matching none of
+    them. Without a config, or without a match, DEFAULT_RULES apply.
+    """
+    if not config:
+        return DEFAULT_RULES
+    if 'files' not in config and 'default' not in config:
+        return config
+    file_name = os.path.basename(input_file)
+    for pattern, rules in config.get('files', {}).items():
+        if fnmatch.fnmatch(file_name, pattern):
+            return rules
+    return config.get('default', DEFAULT_RULES)
+
+
+class ColumnRule:
+    """
+    The steps declared for one column, checked when the rules are compiled.
+    """
+
+    def __init__(self, name, spec):
+        unknown = set(spec) - COLUMN_OPTIONS
+        if unknown:
+            raise ValueError(f"Unknown option(s) for column '{name}': {', '.join(sorted(unknown))}")
+        self.name = name
+        self.type = spec.get('type')
+        if self.type is not None and self.type not in COLUMN_TYPES:
+            raise ValueError(f"Unknown type for column '{name}': {self.type}")
+        self.format = spec.get('format')
+        self.strip_quotes = spec.get('strip_quotes', False)
+        self.trim = spec.get('trim', self.strip_quotes)  # Quotes usually come with stray spaces
+        self.lowercase = spec.get('lowercase', False)
+        self.drop_invalid = spec.get('drop_invalid', False)
+        self.min = spec.get('min')
+        self.max = spec.get('max')
+        self.allowed = spec.get('allowed')
+        self.pattern = spec.get('pattern')
+        if self.type == 'date':
+            self.min = pd.Timestamp(self.min) if self.min is not None else None
+            self.max = pd.Timestamp(self.max) if self.max is not None else None
+
+    @property
+    def edits_text(self):
+        return self.strip_quotes or self.trim or self.lowercase
+
+    @property
+    def modifies(self):
+        # The steps counted in rows_modified, as the hard-coded steps were
+        return self.type in ('date', 'numeric', 'integer') or self.lowercase
+
+
+class CleaningPlan:
+    """
+    A set of cleaning rules compiled for one file.
+
+    Rules look like:
+        {"null_policy": "drop_required", "required": ["id"], "fill": {"books": "unknown"},
+         "columns": {"book checkout": {"type": "date", "format": "%d/%m/%Y", "strip_quotes": true},
+                     "customer id": {"type": "integer", "min": 1}}}
+
+    Each column's steps (quote stripping, trimming, lowercasing, type conversion and
+    validation) run together on its distinct values only, and the results are
+    mapped back onto the rows in one pass. Rows failing any validation are dropped
+    with a single filter at the end. Date formats detected on the first chunk are
+    kept on the plan, so one plan should be used for all chunks of a file.
+    """
+
+    def __init__(self, rules=None, date_format=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.null_policy = rules.get('null_policy', 'drop_any')
+        if self.null_policy not in NULL_POLICIES:
+            raise ValueError(f"Unknown null policy: {self.null_policy}")
+        self.required = [_column_name(col) for col in rules.get('required', [])]
+        self.fill = {_column_name(col): value for col, value in rules.get('fill', {}).items()}
+        self.columns = [ColumnRule(_column_name(col), spec) for col, spec in rules.get('columns', {}).items()]
+
+        # Formats given per column win over date_format (the --date-format option); the rest are detected
+        self.date_formats = {}
+        for rule in self.columns:
+            if rule.type == 'date' and (rule.format or date_format):
+                self.date_formats[rule.name] = rule.format or date_format
+
+    def drop_nulls(self, df):
+        """
+        Fill the configured defaults, then drop rows with nulls as the null policy says.
+        """
+        fill = {col: value for col, value in self.fill.items() if col in df.columns}
+        if fill:
+            df = df.fillna(fill)
+        if self.null_policy == 'drop_any':
+            return df.dropna()
+        if self.null_policy == 'drop_required':
+            return df.dropna(subset=[col for col in self.required if col in df.columns])
+        return df
+
+    def transform(self, df, metrics=None):
+        """
+        Apply the column rules to df and drop the rows that fail validation.
+        Adds rows_modified, dates_coerced and the dropped rows (rows_removed) to metrics.
+        """
+        df, invalid, modified, coerced = self.transform_rows(df)
+        if invalid.any():
+            df = df[~invalid]
+        if metrics is not None:
+            metrics['rows_modified'] += int(modified.sum())
+            metrics['dates_coerced'] += int(coerced.sum())
+            metrics['rows_removed'] += int(invalid.sum())
+        return df
+
+    def transform_rows(self, df):
+        """
+        Apply the column rules to df without dropping anything. Returns (df, invalid,
+        modified, coerced): the per-row arrays say which rows fail validation and how
+        many of each row's values count towards rows_modified and dates_coerced, so
+        the counts can still be settled after some of the rows are dropped.
+        """
+        invalid = np.zeros(len(df), dtype=bool)
+        modified = np.zeros(len(df), dtype=np.int64)
+        coerced = np.zeros(len(df), dtype=np.int64)
+        df = df.copy()
+
+        for rule in self.columns:
+            if rule.name not in df.columns:
+                continue
+            column, bad_rows, coerced_rows = self._apply(rule, df[rule.name])
+            df[rule.name] = column
+            invalid |= bad_rows
+            if rule.type == 'date':
+                coerced += coerced_rows
+            if rule.modifies:
+                modified += column.notna().to_numpy()
+        return df, invalid, modified, coerced
+
+    def _apply(self, rule, series):
+        """
+        Run one column's steps on its distinct values and return (new column,
+        per-row invalid mask, per-row mask of values coerced to missing).
+        """
+        if rule.type == 'date' and pd.api.types.is_datetime64_any_dtype(series) and not rule.edits_text:
+            values, codes = series, None  # Already parsed (e.g. by a schema); only validate
+        else:
+            codes, uniques = pd.factorize(series)
+            values = pd.Series(uniques)
+
+        if codes is not None:
+            if rule.edits_text or rule.type in ('string', 'date'):
+                values = values.astype(object).astype(str)
+            if rule.strip_quotes:
+                values = values.str.replace('"', '', regex=False)
+            if rule.trim:
+                values = values.str.strip()
+            if rule.lowercase:
+                values = values.str.lower()
+            values = self._convert(rule, values)
+
+        bad = np.zeros(len(values), dtype=bool)
+        coerced_values = values.isna().to_numpy()
+        if rule.drop_invalid:
+            bad |= coerced_values
+        if rule.min is not None:
+            bad |= (values < rule.min).fillna(False).to_numpy(dtype=bool)
+        if rule.max is not None:
+            bad |= (values > rule.max).fillna(False).to_numpy(dtype=bool)
+        if rule.allowed is not None:
+            bad |= ~values.isin(rule.allowed).to_numpy() & ~coerced_values
+        if rule.pattern is not None:
+            bad |= ~values.astype(str).str.fullmatch(rule.pattern).to_numpy(dtype=bool) & ~coerced_values
+
+        if codes is None:
+            return values, bad, np.zeros(len(values), dtype=bool)
+        # Index by code; the appended entry is picked by code -1 (a missing value)
+        bad_rows = np.append(bad, False)[codes]
+        coerced = np.append(coerced_values, False)[codes]
+        column = _broadcast(values, codes, series)
+        if rule.type == 'category':
+            column = column.astype('category')
+        return column, bad_rows, coerced
+
+    def _convert(self, rule, values):
+        if rule.type == 'date':
+            return _parse_dates(values, rule.name, self.date_formats)
+        if rule.type == 'numeric':
+            return pd.to_numeric(values, errors='coerce')
+        if rule.type == 'integer':
+            numbers = pd.to_numeric(values, errors='coerce')
+            whole = numbers.where(numbers == np.floor(numbers))  # 2.5 is not an integer
+            return whole.astype('Int64')
+        return values
+
+
+def _column_name(name):
+    # Rules refer to columns as they look after the headers are normalised
+    return name.strip().lower()
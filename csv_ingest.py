@@ -0,0 +1,180 @@
+import io
+import json
+import lzma
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import pandas as pd
+from input_files import input_compression, open_decompressed
+
+
+def load_schema(schema_file):
+    """
+    Load a JSON schema mapping column names (as in the CSV header) to pandas dtypes,
+    e.g. {"Id": "Int32", "Days allowed to borrow": "category"}.
+    """
+    with open(schema_file) as f:
+        return json.load(f)
+
+def read_csv_chunks(input_file, chunksize=None, csv_engine='c', schema=None, memory_map=True, skip_rows=0,
+                    hasher=None):
+    """
+    Yield the CSV as DataFrames: the whole file once, or chunks of about chunksize rows.
+
+    csv_engine='c' uses pandas' own parser. csv_engine='pyarrow' parses with
+    pyarrow's multithreaded reader; in chunked mode it streams record batches sized
+    to roughly chunksize rows (pyarrow splits by bytes, not rows). schema, if given,
+    fixes the dtypes instead of letting each chunk infer them. Compressed files
+    (.gz, .bz2, .xz, .zst) are decompressed as they stream, with no temporary
+    file; plain files are memory-mapped unless memory_map is False. The first
+    skip_rows rows after the header are skipped (e.g. those a resumed run has
+    already cleaned). The file's bytes are passed on to hasher (a ContentHasher),
+    if given, as they are read.
+    """
+    compression = input_compression(input_file)
+    if csv_engine == 'pyarrow':
+        yield from _read_with_pyarrow(input_file, chunksize, schema, compression, memory_map, skip_rows, hasher)
+        return
+
+    options = {'dtype': schema} if schema else {}
+    options['compression'] = compression
+    options['memory_map'] = memory_map and compression is None
+    if skip_rows:
+        options['skiprows'] = range(1, skip_rows + 1)  # Row 0 is the header
+    with hasher.open(options.pop('memory_map')) if hasher is not None else nullcontext(input_file) as source:
+        if chunksize:
+            yield from pd.read_csv(source, chunksize=chunksize, **options)
+        else:
+            yield pd.read_csv(source, **options)
+
+def _read_with_pyarrow(input_file, chunksize, schema, compression=None, memory_map=True, skip_rows=0, hasher=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        raise ImportError("The pyarrow CSV engine needs pyarrow: pip install pyarrow")
+
+    read_options = pacsv.ReadOptions(use_threads=True, skip_rows_after_names=skip_rows)
+    if chunksize:
+        read_options.block_size = _block_size_for_rows(input_file, chunksize)
+    convert_options = _arrow_convert_options(pacsv, schema)
+
+    with _arrow_input(pa, input_file, compression, memory_map, hasher) as source:
+        if chunksize:
+            with pacsv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+                for batch in reader:
+                    yield _apply_schema(batch.to_pandas(), schema)
+        else:
+            table = pacsv.read_csv(source, read_options=read_options, convert_options=convert_options)
+            yield _apply_schema(table.to_pandas(), schema)
+
+def read_csv_bytes(data, csv_engine='c', schema=None):
+    """
+    Parse CSV held in memory (a header line followed by rows, e.g. one byte range
+    of a file) into a DataFrame, with the same engines and schema as read_csv_chunks.
+    """
+    if csv_engine == 'pyarrow':
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            raise ImportError("The pyarrow CSV engine needs pyarrow: pip install pyarrow")
+        table = pacsv.read_csv(pa.BufferReader(data), convert_options=_arrow_convert_options(pacsv, schema))
+        return _apply_schema(table.to_pandas(), schema)
+    return pd.read_csv(io.BytesIO(data), **({'dtype': schema} if schema else {}))
+
+def _arrow_convert_options(pacsv, schema):
+    # Treat "NaN" and empty fields as missing in text columns too, as pandas does
+    return pacsv.ConvertOptions(strings_can_be_null=True,
+                                column_types=_arrow_column_types(schema) if schema else None)
+
+def _arrow_input(pa, input_file, compression, memory_map, hasher=None):
+    """
+    Open input_file for pyarrow: a memory map for plain files, or a stream decompressed
+    by Arrow's own codecs (Python's for xz, which Arrow does not build by default).
+    With a hasher the file is read through it instead.
+    """
+    if hasher is not None:
+        raw = hasher.open(memory_map and compression is None)
+        if compression == 'xz':
+            return _decompressed_xz(raw)
+        if compression is not None:
+            return pa.CompressedInputStream(pa.PythonFile(raw, mode='r'), compression)
+        return pa.PythonFile(raw, mode='r')
+    if compression == 'xz':
+        return open_decompressed(input_file)
+    if compression is not None:
+        return pa.input_stream(input_file, compression=compression)
+    if memory_map:
+        return pa.memory_map(input_file)
+    return pa.OSFile(input_file)
+
+@contextmanager
+def _decompressed_xz(raw):
+    # lzma leaves the file it reads from open, so close both
+    with raw, lzma.open(raw, 'rb') as stream:
+        yield stream
+
+def _block_size_for_rows(input_file, rows, sample_bytes=64 * 1024):
+    """
+    Estimate the pyarrow block size (bytes) that holds about rows lines, from the start of the file.
+    """
+    with open_decompressed(input_file) as f:
+        sample = f.read(sample_bytes)
+    bytes_per_row = len(sample) / max(1, sample.count(b'\n'))
+    return int(min(max(rows * bytes_per_row, 64 * 1024), 2**31 - 1))
+
+def _arrow_column_types(schema):
+    import pyarrow as pa
+    column_types = {}
+    for column, dtype in schema.items():
+        if dtype == 'category':
+            column_types[column] = pa.dictionary(pa.int32(), pa.string())
+        elif dtype in ('str', 'string', 'object'):
+            column_types[column] = pa.string()
+        elif pd.api.types.is_extension_array_dtype(pd.api.types.pandas_dtype(dtype)):
+            # Nullable types like Int32: parse as the matching numpy type, converted after
+            column_types[column] = pa.from_numpy_dtype(np.dtype(dtype.lower()))
+        else:
+            column_types[column] = pa.from_numpy_dtype(np.dtype(dtype))
+    return column_types
+
+def _apply_schema(df, schema):
+    if not schema:
+        return df
+    return df.astype({column: dtype for column, dtype in schema.items() if column in df.columns})
+
+def compact_dtypes(df, max_category_ratio=0.5):
+    """
+    Shrink a freshly read DataFrame: whole-number columns become the smallest
+    integer type that holds them (nullable Int types when they contain missing
+    values), and text columns where distinct values are at most max_category_ratio
+    of the rows become categoricals.
+    """
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if len(values) and (values == np.floor(values)).all():
+                dtype = _smallest_nullable_int(values.min(), values.max())
+                if dtype is not None:
+                    df[col] = series.astype(dtype)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique() <= max_category_ratio * len(series):
+                df[col] = series.astype('category')
+    return df
+
+def _smallest_nullable_int(low, high):
+    for dtype in ('Int8', 'Int16', 'Int32', 'Int64'):
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None  # Too large for any integer type; leave as float
+
+def memory_mb(df):
+    """
+    Memory held by the DataFrame in MB, including the contents of text columns.
+    """
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
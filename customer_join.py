@@ -0,0 +1,76 @@
+import pandas as pd
+
+# Column shared by the Systembook loans and the Customers file
+CUSTOMER_KEY = 'customer id'
+# Default file name pattern of the customers file(s) for --join-customers
+DEFAULT_CUSTOMERS_PATTERN = '*Customers*.csv'
+
+
+class CustomerIndex:
+    """
+    Hash index of cleaned customers on their key, built once and joined onto
+    each loan chunk as it streams past.
+
+    Chunks of the cleaned customers file are collected with add(); the index is
+    built on the first join. Keys are compared as float64, so an ID read as an
+    integer in one file and as a float (or a compacted Int8) in the other still
+    matches. If a key appears more than once the last row wins.
+    """
+
+    def __init__(self, key=CUSTOMER_KEY):
+        self.key = key
+        self._chunks = []
+        self._index = None
+        self._customers = None
+
+    def add(self, df):
+        if self.key in df.columns:
+            self._chunks.append(df)
+            self._index = None
+
+    def __len__(self):
+        self._build()
+        return len(self._index)
+
+    def _build(self):
+        if self._index is not None:
+            return
+        if self._chunks:
+            customers = pd.concat(self._chunks, ignore_index=True)
+        else:
+            customers = pd.DataFrame(columns=[self.key])
+        keys = _float_keys(customers[self.key])
+        keep = (~keys.duplicated(keep='last') & keys.notna()).to_numpy()
+        self._chunks = [customers[keep]]  # A later add() rebuilds from the deduplicated rows
+        self._customers = customers[keep].drop(columns=[self.key]).reset_index(drop=True)
+        self._index = pd.Index(keys[keep].to_numpy())  # Hash table lookups via get_indexer
+
+    def join(self, df):
+        """
+        Return df with the customer columns added and a 'customer_orphan' flag for
+        rows whose key is not in the index. Columns that df already has get a
+        '_customer' suffix. Rows of df are kept as they are, in order.
+        """
+        self._build()
+        positions = self._index.get_indexer(_float_keys(df[self.key]))
+        orphan = positions == -1
+
+        df = df.copy()
+        for col in self._customers.columns:
+            name = col + '_customer' if col in df.columns else col
+            values = self._customers[col]
+            taken = pd.api.extensions.take(values.array, positions, allow_fill=True)
+            df[name] = pd.Series(taken, index=df.index)
+        df['customer_orphan'] = orphan
+        return df
+
+    def __getstate__(self):
+        # Send the built index to worker processes rather than the raw chunks
+        self._build()
+        return self.__dict__
+
+
+def _float_keys(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    return pd.to_numeric(series, errors='coerce').astype('float64')
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Each hash is stored as a single uint64, so the budget translates directly into a row count
+HASH_BYTES = np.dtype(np.uint64).itemsize
+
+
+class RowHashIndex:
+    """
+    Set of 64-bit row hashes used to find duplicates across chunks of a file.
+
+    With a journal_file every hash recorded is also appended to that file, and
+    the first journal_length hashes already in it are loaded back (anything
+    after them is cut off), so a resumed run rebuilds the index of the chunks
+    it had committed.
+
+    Hashes are kept in a sorted numpy array. Once that array grows past
+    memory_budget_bytes it is written to disk as a sorted run and memory-mapped,
+    so lookups stay vectorised binary searches while resident memory stays bounded.
+    Two different rows only collide if their 64-bit hashes are equal, which is
+    not expected to happen below a few billion distinct rows.
+    """
+
+    def __init__(self, memory_budget_bytes=256 * 1024 * 1024, spill_dir=None, journal_file=None, journal_length=0):
+        self.max_memory_hashes = max(1, memory_budget_bytes // HASH_BYTES)
+        self.spill_dir = spill_dir
+        self.hits = 0  # Number of rows reported as duplicates so far
+        self._memory = np.empty(0, dtype=np.uint64)  # Sorted hashes held in RAM
+        self._runs = []  # Sorted hashes spilled to disk, opened as read-only memmaps
+        self._run_dir = None
+        self._journal = None
+        self._journal_length = 0
+        if journal_file is not None:
+            self._open_journal(journal_file, journal_length)
+
+    def __len__(self):
+        return len(self._memory) + sum(len(run) for run in self._runs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def filter_new(self, hashes):
+        """
+        Return a boolean mask that is True for hashes not seen before, and record them.
+        Repeats within hashes itself are reported as duplicates after their first occurrence.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+
+        # Drop repeats inside this batch, keeping the first occurrence
+        unique, first_positions = np.unique(hashes, return_index=True)
+        is_new = np.zeros(len(hashes), dtype=bool)
+        is_new[first_positions] = True
+
+        # Check the unique hashes against the in-memory array and every spilled run
+        seen = _contains(self._memory, unique)
+        for run in self._runs:
+            seen |= _contains(run, unique)
+        is_new[first_positions[seen]] = False
+
+        self._add(unique[~seen])
+        self.hits += int(len(hashes) - is_new.sum())
+        return is_new
+
+    @property
+    def journal_length(self):
+        """
+        Number of hashes written to the journal so far (flushed, so a checkpoint can refer to them).
+        """
+        if self._journal is not None:
+            self._journal.flush()
+        return self._journal_length
+
+    def close(self):
+        """
+        Release the spilled runs and delete their files. The journal, if any, is kept.
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._runs = []
+        self._memory = np.empty(0, dtype=np.uint64)
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+
+    def _open_journal(self, journal_file, journal_length):
+        with open(journal_file, 'ab') as f:
+            f.truncate(journal_length * HASH_BYTES)
+        if journal_length:
+            self._add(np.unique(np.fromfile(journal_file, dtype=np.uint64)))
+        self._journal = open(journal_file, 'ab')
+        self._journal_length = journal_length
+
+    def _add(self, new_hashes):
+        if len(new_hashes) == 0:
+            return
+        if self._journal is not None:
+            new_hashes.tofile(self._journal)
+            self._journal_length += len(new_hashes)
+        # Both inputs are already sorted; a stable sort on uint64 is a radix sort in numpy
+        self._memory = np.sort(np.concatenate([self._memory, new_hashes]), kind='stable')
+        if len(self._memory) > self.max_memory_hashes:
+            self._spill()
+
+    def _spill(self):
+        """
+        Write the in-memory hashes to disk as a sorted run and free the RAM they used.
+        """
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix='row_hash_index_', dir=self.spill_dir)
+        run_file = os.path.join(self._run_dir, f"run_{len(self._runs):05d}.u64")
+        self._memory.tofile(run_file)
+        self._runs.append(np.memmap(run_file, dtype=np.uint64, mode='r'))
+        self._memory = np.empty(0, dtype=np.uint64)
+
+
+def _contains(sorted_hashes, values):
+    """
+    Vectorised membership test of values against a sorted array (or memmap).
+    """
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.searchsorted(sorted_hashes, values)
+    positions[positions == len(sorted_hashes)] = 0
+    return np.asarray(sorted_hashes[positions] == values)
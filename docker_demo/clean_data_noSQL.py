@@ -1,12 +1,40 @@
-import pandas as pd
 import argparse
 import os
-import glob
+import sys
+
+# clean_data.py sits next to this script in the container, and one directory up in the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from input_files import DEFAULT_INPUT_PATTERNS, check_unique_base_names, find_csv_files, input_base_name
+
+# pandas and the cleaning modules are imported inside the functions that use them, so that
+# --help and a container started without CSV files do not pay for loading them
+
+def nosql_default_rules():
+    """
+    The shared default rules, except that rows whose dates cannot be parsed are dropped rather than kept as NaT.
+    """
+    from cleaning_rules import DEFAULT_RULES
+    return {
+        **DEFAULT_RULES,
+        'columns': {col: {**spec, 'drop_invalid': True} if spec.get('type') == 'date' else spec
+                    for col, spec in DEFAULT_RULES['columns'].items()},
+    }
 
 # Function to cleanse data
-def cleanse_data(input_file):
+def cleanse_data(input_file, rules=None):
+    """
+    Cleanse input_file with the given rules config (see cleaning_rules), or
+    nosql_default_rules(), and save it to Cleaned_Data.
+    """
+    import pandas as pd
+    from clean_data import enrich_date_duration
+    from cleaning_rules import CleaningPlan, rules_for_file
+    from data_profile import DataProfile
+
+    plan = CleaningPlan(rules_for_file(rules, input_file) if rules else nosql_default_rules())
+
     # Extract base file name without extension for output file
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    base_name = input_base_name(input_file)
     output_dir = 'Cleaned_Data'  # The directory to save cleaned files
 
     # Ensure the directory exists
@@ -15,7 +43,7 @@ def cleanse_data(input_file):
 
     output_file = os.path.join(output_dir, f"{base_name}_cleaned.csv")  # Save in the Cleaned_Data folder
 
-    # Load the CSV file into a DataFrame
+    # Load the CSV file into a DataFrame (compressed files are decompressed as they are read)
     df = pd.read_csv(input_file)
 
     # Clean column names by stripping leading/trailing spaces and converting to lowercase
@@ -25,17 +53,13 @@ def cleanse_data(input_file):
     print(f"\nColumns in {input_file}:")
     print(df.columns.tolist())
 
-    # Step 1: Check for null values
+    # Step 1: Count the null values per column, for the data profile printed at the end
     print(f"\nProcessing file: {input_file}")
-    print("Null values summary:")
-    print(df.isnull().sum())  # Show the number of null values per column
-
-    # Optionally: Handle null values
-    # Option 1: Drop rows with null values
-    df = df.dropna()
+    profile = DataProfile()
+    profile.count_nulls(df)
 
-    # Option 2: Fill null values with a specific value (e.g., 'N/A' for strings, 0 for numbers)
-    # df = df.fillna({'column_name': 'N/A', 'numeric_column': 0})
+    # Handle null values as the rules' null policy says (by default, drop rows with any null)
+    df = plan.drop_nulls(df)
 
     # Step 2: Check for duplicates
     print("\nDuplicate rows summary:")
@@ -44,88 +68,85 @@ def cleanse_data(input_file):
     # Option: Drop duplicate rows
     df = df.drop_duplicates()
 
-    # Step 3: Ensure consistent data formats
-    # Convert the 'book checkout' column to datetime format if it exists
-    if 'book checkout' in df.columns:
-        print("\nProcessing 'book checkout' column.")
-        df['book checkout'] = df['book checkout'].str.replace('"', "", regex=True)  # Remove any quotes
-        df['book checkout'] = pd.to_datetime(df['book checkout'], errors='coerce')  # Convert to datetime, coerce errors to NaT
-    else:
-        print("Column 'book checkout' not found in the dataset. Skipping datetime conversion.")
-
-    # Convert the 'book returned' column to datetime format if it exists
-    if 'book returned' in df.columns:
-        print("\nProcessing 'book returned' column.")
-        df['book returned'] = pd.to_datetime(df['book returned'], errors='coerce')  # Same for the 'book returned' column
-    else:
-        print("Column 'book returned' not found in the dataset. Skipping datetime conversion.")
-
-    # Drop rows where 'book checkout' or 'book returned' are NaT (invalid dates)
-    if 'book checkout' in df.columns:
-        df = df.dropna(subset=['book checkout'])
-
-    if 'book returned' in df.columns:
-        df = df.dropna(subset=['book returned'])
-
-    # Example 2: Convert string columns to lowercase (if applicable)
-    if 'string_column' in df.columns:
-        df['string_column'] = df['string_column'].str.lower()
-    else:
-        print("Column 'string_column' not found in the dataset. Skipping lowercase conversion.")
-
-    # Example 3: Ensure numeric columns are in the correct format
-    if 'numeric_column' in df.columns:
-        df['numeric_column'] = pd.to_numeric(df['numeric_column'], errors='coerce')
-    else:
-        print("Column 'numeric_column' not found in the dataset. Skipping numeric conversion.")
+    # Step 3: Ensure consistent data formats (dates, lowercase strings, numbers) as declared in the rules.
+    # Rows with invalid values, such as dates that could not be parsed, are dropped.
+    missing = [rule.name for rule in plan.columns if rule.name not in df.columns]
+    if missing:
+        print(f"Columns not found in the dataset, skipping their rules: {missing}")
+    df = plan.transform(df)
 
     # Enriching data by adding the time a book was on loan (duration between checkout and return)
     # Make sure the columns for the date calculations exist
     if 'book checkout' in df.columns and 'book returned' in df.columns:
         df = enrich_date_duration(df, 'book returned', 'book checkout')
-        # Ensure that loan_duration is non-negative
-        df = df[df['loan_duration'] >= 0]  # Filter out negative durations
+        # Drop loans returned before they were checked out
+        df = df[~df['loan_negative']]
     else:
         print("One or both of the date columns ('book checkout', 'book returned') are missing. Skipping enrichment.")
 
+    # Profile the cleaned columns: nulls as read, approximate distinct counts, ranges and medians
+    profile.add(df)
+    print("\nData profile:")
+    profile.print_summary()
+
     # Save the cleaned data to a CSV file (overwrite if the file exists)
     df.to_csv(output_file, index=False, mode='w')  # 'mode=w' explicitly overwrites
 
     print(f"\nData cleaning complete for {input_file}. Cleaned data saved to file: {output_file}")
 
-def enrich_date_duration(df, colA, colB):
-    """
-    Takes the two input date columns and calculates the difference in days between them.
-    The result is added as a new column 'date_delta'.
-    
-    colA should be the later of the two date columns (e.g., 'book returned').
-    """
-    if colA in df.columns and colB in df.columns:
-        # Calculate loan duration in days
-        df['loan_duration'] = (df[colA] - df[colB]).dt.days
-
-        # Ensure loan duration is non-negative, replace negative durations with NaN or 0
-        df['loan_duration'] = df['loan_duration'].apply(lambda x: max(x, 0))  # Replace negative durations with 0
-    return df
-
 # Main function to handle command-line arguments
 def main():
     parser = argparse.ArgumentParser(description="Cleanse CSV data by removing null values, duplicates, and ensuring consistent formats.")
+    parser.add_argument("--rules", default=None,
+                        help="JSON (or YAML, with PyYAML) file of cleaning rules, optionally per file name pattern")
+
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and clean CSV files as they are copied into the mounted directory")
+    parser.add_argument("--poll-seconds", type=float, default=1.0,
+                        help="How often --watch looks for new files")
+    parser.add_argument("--settle-seconds", type=float, default=2.0,
+                        help="How long a file must stay unchanged before --watch treats it as fully written")
 
     # Parse the command-line arguments
     args = parser.parse_args()
+    patterns = [os.path.join("/app", pattern) for pattern in DEFAULT_INPUT_PATTERNS]
 
-    # Get the list of all CSV files in the mounted directory inside the container
-    csv_files = glob.glob("/app/*.csv")
+    if args.rules:
+        from cleaning_rules import load_rules
+        rules = load_rules(args.rules)
+    else:
+        rules = None
+
+    if args.watch:
+        from file_watcher import watch
+        import pandas  # Imported once up front, so the first file does not pay for it
+
+        def clean_batch(batch):
+            files = [entry['path'] for entry in batch]
+            check_unique_base_names(files, find_csv_files(patterns))  # Nor with a file cleaned earlier
+            for entry in batch:
+                cleanse_data(entry['path'], rules=rules)
+
+        try:
+            watch(clean_batch, patterns,
+                  poll_seconds=args.poll_seconds, settle_seconds=args.settle_seconds)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        return
+
+    # Get the list of all CSV files, plain or compressed, in the mounted directory inside the container
+    csv_files = find_csv_files(patterns)
 
     # Check if any CSV files are found
     if not csv_files:
         print("No CSV files found in the current directory.")
         return
 
+    check_unique_base_names(csv_files)
+
     # Process each CSV file in the current directory
     for input_file in csv_files:
-        cleanse_data(input_file)
+        cleanse_data(input_file, rules=rules)
 
     print("Data Cleaning Complete")
 if __name__ == "__main__":
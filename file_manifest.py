@@ -0,0 +1,159 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+
+# Default location of the manifest, next to the cleaned files it describes
+DEFAULT_MANIFEST_FILE = os.path.join('Cleaned_Data', 'manifest.json')
+
+
+def load_manifest(manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    Load the manifest of previously cleaned files, or an empty one if it does not exist yet.
+    """
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    Write the manifest atomically so an interrupted run never leaves a truncated file.
+    """
+    manifest_dir = os.path.dirname(manifest_file)
+    if manifest_dir and not os.path.exists(manifest_dir):
+        os.makedirs(manifest_dir)
+    temp_file = manifest_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_file, manifest_file)
+
+def content_hash(path, block_size=1024 * 1024):
+    """
+    SHA-256 of the file contents, read in blocks so large files are not loaded whole.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ContentHasher:
+    """
+    content_hash of a file built from the bytes read while cleaning it, so the
+    file is not read a second time just to hash it for the manifest.
+
+    The bytes are passed to update() with their offset as they are read, or
+    read through open(). Only those continuing from where the hash has got to
+    are used; hexdigest() reads whatever part of the file was never passed in
+    (all of it if nothing was) and returns the hash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._digest = hashlib.sha256()
+        self._position = 0
+
+    def update(self, offset, data):
+        if offset <= self._position < offset + len(data):
+            self._digest.update(memoryview(data)[self._position - offset:])
+            self._position = offset + len(data)
+
+    def open(self, memory_map=True):
+        """
+        Open the file for reading as bytes, hashing what is read (memory-mapped unless memory_map is False).
+        """
+        return _HashingReader(self, memory_map)
+
+    def hexdigest(self, block_size=1024 * 1024):
+        with open(self.path, 'rb') as f:
+            f.seek(self._position)
+            for block in iter(lambda: f.read(block_size), b''):
+                self.update(self._position, block)
+        return self._digest.hexdigest()
+
+
+class _HashingReader(io.RawIOBase):
+    # A file read from the start, passing every block read on to its ContentHasher
+
+    def __init__(self, hasher, memory_map):
+        self._hasher = hasher
+        self._file = open(hasher.path, 'rb')
+        self._source = self._file
+        if memory_map and os.fstat(self._file.fileno()).st_size:
+            self._source = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._source.read(size if size is not None and size >= 0 else None)
+        self._hasher.update(self._offset, data)
+        self._offset += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self._source is not self._file:
+                self._source.close()
+            self._file.close()
+        super().close()
+
+def file_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def options_digest(options):
+    """
+    SHA-256 of the options a file is cleaned with (a JSON-serialisable dict), to tell whether they changed.
+    """
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+def is_unchanged(manifest, path, options=None):
+    """
+    Return True if path matches its manifest entry and was cleaned with the same
+    options (an options_digest), so its outputs are still what this run would write.
+
+    Size and mtime are compared first, which costs a single stat call. The contents
+    are only hashed when the size matches but the mtime differs (e.g. the file was
+    copied or touched); if the hash still matches the entry's mtime is refreshed.
+    """
+    entry = manifest.get(os.path.abspath(path))
+    if entry is None or entry.get('options') != options:
+        return False
+
+    stat = file_stat(path)
+    if stat['size'] != entry['size']:
+        return False
+    if stat['mtime'] == entry['mtime']:
+        return True
+    if content_hash(path) != entry['content_hash']:
+        return False
+
+    entry['mtime'] = stat['mtime']
+    return True
+
+def record_run(manifest, path, stat, file_hash, metrics, options=None):
+    """
+    Store the file's size, mtime (as seen before cleaning), content hash, the
+    options_digest of the options it was cleaned with and the metrics of the
+    run that just cleaned it.
+    """
+    manifest[os.path.abspath(path)] = {
+        'size': stat['size'],
+        'mtime': stat['mtime'],
+        'content_hash': file_hash,
+        'options': options,
+        'metrics': {key: value.item() if hasattr(value, 'item') else value
+                    for key, value in metrics.items()},
+    }
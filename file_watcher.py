@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from file_manifest import file_stat
+from input_files import DEFAULT_INPUT_PATTERNS, find_csv_files
+
+# How often a blocked step checks whether the watch has been stopped
+_STOP_CHECK_SECONDS = 0.1
+
+
+class DirectoryWatcher:
+    """
+    Finds input files that are new or have changed, once they have finished being written.
+
+    Each poll lists the files matching patterns (as find_csv_files does). A
+    file is ready once its size and mtime have stayed the same for
+    settle_seconds, so a file still being copied in is left until it is
+    complete. It is then reported once, and again only if it changes.
+    """
+
+    def __init__(self, patterns=None, settle_seconds=2.0, clock=time.monotonic):
+        self.patterns = patterns
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._settling = {}  # Path -> (size and mtime, when they were first seen)
+        self._reported = {}  # Path -> size and mtime when it was reported ready
+
+    def poll(self):
+        """
+        Return the files that have become ready since the last poll.
+        """
+        now = self.clock()
+        ready = []
+        found = find_csv_files(self.patterns)
+        for path in found:
+            try:
+                stat = file_stat(path)
+            except OSError:
+                continue  # Removed since it was listed
+            signature = (stat['size'], stat['mtime'])
+            if self._reported.get(path) == signature:
+                continue
+            settling = self._settling.get(path)
+            if settling is None or settling[0] != signature:
+                self._settling[path] = (signature, now)  # New, or still being written
+            elif now - settling[1] >= self.settle_seconds:
+                ready.append(path)
+                self._reported[path] = signature
+                del self._settling[path]
+
+        # Forget files that have gone, so they are picked up again if they come back
+        found = set(found)
+        for known in (self._settling, self._reported):
+            for path in [path for path in known if path not in found]:
+                del known[path]
+        return ready
+
+
+def watch(handle, patterns=None, poll_seconds=1.0, settle_seconds=2.0, queue_size=100, batch_size=1, stop=None):
+    """
+    Call handle(batch) for input files as they land, until stop (a threading.Event) is set.
+
+    A watcher thread polls the patterns every poll_seconds, or as soon as a file
+    changes when watchdog is installed. It puts every file DirectoryWatcher
+    reports ready on a queue of at most queue_size files. When the queue is
+    full the watcher waits, so a burst of files is picked up as the queue
+    drains instead of piling up.
+
+    This thread takes up to batch_size queued files at a time and passes
+    them to handle as dicts. Each dict holds the path, when the file was
+    detected (detected_at), how long it waited in the queue (wait_seconds) and
+    how many files were still queued behind it (queue_depth). An error in
+    handle is reported and the watch carries on with the next files.
+    """
+    stop = stop if stop is not None else threading.Event()
+    wake = threading.Event()
+    work = queue.Queue(maxsize=queue_size)
+    watcher = DirectoryWatcher(patterns, settle_seconds)
+
+    def poll_forever():
+        while not stop.is_set():
+            for path in watcher.poll():
+                entry = {'path': path, 'detected_at': datetime.now(), 'queued': time.monotonic()}
+                while not stop.is_set():
+                    try:
+                        work.put(entry, timeout=_STOP_CHECK_SECONDS)
+                        break
+                    except queue.Full:
+                        pass
+            wake.wait(poll_seconds)
+            wake.clear()
+
+    poller = threading.Thread(target=poll_forever, name='file-watcher', daemon=True)
+    poller.start()
+    observer = _wake_on_changes(patterns, wake)
+    try:
+        while not stop.is_set():
+            try:
+                batch = [work.get(timeout=_STOP_CHECK_SECONDS)]
+            except queue.Empty:
+                continue
+            while len(batch) < batch_size:
+                try:
+                    batch.append(work.get_nowait())
+                except queue.Empty:
+                    break
+            started, depth = time.monotonic(), work.qsize()
+            for entry in batch:
+                entry['wait_seconds'] = started - entry.pop('queued')
+                entry['queue_depth'] = depth
+            try:
+                handle(batch)
+            except Exception as error:
+                print(f"Failed to process {', '.join(entry['path'] for entry in batch)}: {error}")
+    finally:
+        stop.set()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        poller.join()
+
+def _wake_on_changes(patterns, wake):
+    """
+    Set wake whenever something changes below the watched directories, using
+    watchdog's native file system events when it is installed. Returns the
+    observer to stop, or None when polling alone has to do.
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class WakeOnEvent(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    for root in _watch_roots(patterns):
+        observer.schedule(WakeOnEvent(), root, recursive=True)
+    observer.start()
+    return observer
+
+def _watch_roots(patterns):
+    # The directory part of each pattern before its first wildcard, e.g. 'exports' for 'exports/**/*.csv.gz'
+    roots = set()
+    for pattern in patterns or DEFAULT_INPUT_PATTERNS:
+        if os.path.isdir(pattern):
+            roots.add(pattern)
+            continue
+        wildcard = min((pattern.find(char) for char in '*?[' if char in pattern), default=len(pattern))
+        root = os.path.dirname(pattern[:wildcard]) or '.'
+        if os.path.isdir(root):
+            roots.add(root)
+    return sorted(roots)
@@ -0,0 +1,94 @@
+import bz2
+import glob
+import gzip
+import lzma
+import os
+
+# Compressed CSV extensions and the codec each one is read with
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+# Cleaned files are written here, and never picked up as inputs when searching recursively
+OUTPUT_DIR = 'Cleaned_Data'
+# Input patterns used when none are given: plain and compressed CSVs in the current directory
+DEFAULT_INPUT_PATTERNS = ['*.csv'] + [f'*.csv{extension}' for extension in COMPRESSION_EXTENSIONS]
+
+
+def input_compression(path):
+    """
+    The codec of a compressed input file ('gzip', 'zstd', ...), or None for a plain CSV.
+    """
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def uncompressed_name(path):
+    """
+    File name without its directory or compression extension, e.g. 'Systembook.csv' for 'exports/Systembook.csv.gz'.
+    """
+    name = os.path.basename(path)
+    if input_compression(name):
+        name = os.path.splitext(name)[0]
+    return name
+
+def is_csv_file(path):
+    return uncompressed_name(path).lower().endswith('.csv')
+
+def input_base_name(path):
+    """
+    File name without its directory, compression and .csv extensions, e.g. 'Systembook' for 'exports/Systembook.csv.gz'.
+    """
+    return os.path.splitext(uncompressed_name(path))[0]
+
+def check_unique_base_names(paths, others=()):
+    """
+    Raise ValueError if one of paths shares its input_base_name with another of
+    paths or of others (e.g. 'jan/Systembook.csv' and 'feb/Systembook.csv', or
+    'Systembook.csv' and 'Systembook.csv.gz'): their cleaned files and SQL
+    tables are named after it, so one would overwrite the other.
+    """
+    groups = {}
+    for path in dict.fromkeys([*paths, *others]):
+        groups.setdefault(input_base_name(path), []).append(path)
+    checked = {input_base_name(path) for path in paths}
+    duplicates = {base_name: group for base_name, group in groups.items() if len(group) > 1 and base_name in checked}
+    if duplicates:
+        clashes = '; '.join(f"{', '.join(group)} (all cleaned as {base_name})"
+                            for base_name, group in sorted(duplicates.items()))
+        raise ValueError(f"Input files would overwrite each other's cleaned files and SQL tables: {clashes}. "
+                         f"Rename them or clean them into separate directories and databases.")
+
+def find_csv_files(patterns=None):
+    """
+    Expand the input patterns into a sorted list of CSV files, plain or compressed.
+
+    Each pattern is a file, a directory (every CSV below it, recursively) or a
+    glob, where ** matches any number of directories (e.g. 'exports/**/*.csv.gz').
+    Files found by more than one pattern are listed once, and files inside a
+    Cleaned_Data directory (the outputs of earlier runs) are left out.
+    """
+    found = set()
+    for pattern in patterns or DEFAULT_INPUT_PATTERNS:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '**', '*'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        found.update(os.path.normpath(path) for path in matches
+                     if os.path.isfile(path) and is_csv_file(path)
+                     and OUTPUT_DIR not in os.path.normpath(path).split(os.sep)[:-1])
+    return sorted(found)
+
+def open_decompressed(path):
+    """
+    Open an input file for reading as bytes, decompressing it on the fly if it is compressed.
+    """
+    compression = input_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading .zst files needs zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
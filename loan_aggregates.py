@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text, bindparam
+
+# Month ('YYYY-MM') every aggregate is broken down by, as partitioned output is split on
+MONTH_COLUMN = 'checkout_month'
+# Aggregate tables, by the suffix added to the file's base name, and the columns besides the month each is keyed on
+AGGREGATE_TABLES = {'loans_by_month': [], 'loans_by_customer': ['customer id'], 'loans_by_book': ['books']}
+# Additive measures kept per key, so tables can be merged by summing; averages are derived when rows are written
+MEASURES = ['loans', 'returned_loans', 'loan_days', 'late_returns', 'overdue_days']
+# Months read or deleted per statement, well under SQL Server's 2100 parameters
+MONTHS_PER_STATEMENT = 500
+
+
+def summarise_loans(df, months):
+    """
+    Sum the cleaned loans in df per checkout month, per customer and per book.
+
+    months holds the checkout month of each row. Returns a dict of aggregate
+    table suffix -> DataFrame of its keys, the month and the measures: loans,
+    returned_loans (loans with a duration), loan_days, late_returns (returned
+    after the days allowed) and overdue_days. A table whose key column is not in
+    df is left out, as are the loans with no value for its key.
+    """
+    missing = pd.Series(np.nan, index=df.index)
+    duration = df['loan_duration'] if 'loan_duration' in df.columns else missing
+    overdue = df['overdue_days'] if 'overdue_days' in df.columns else missing
+    measures = pd.DataFrame({
+        MONTH_COLUMN: np.asarray(months, dtype=object),
+        'loans': np.ones(len(df), dtype='int64'),
+        'returned_loans': duration.notna().to_numpy(dtype='int64'),
+        'loan_days': duration.fillna(0).to_numpy(dtype='float64'),
+        'late_returns': (overdue > 0).to_numpy(dtype='int64'),
+        'overdue_days': overdue.fillna(0).to_numpy(dtype='float64'),
+    })
+
+    summaries = {}
+    for suffix, keys in AGGREGATE_TABLES.items():
+        if not all(key in df.columns for key in keys):
+            continue
+        keyed = measures.assign(**{key: _key_values(df[key]) for key in keys})
+        summaries[suffix] = keyed.groupby(keys + [MONTH_COLUMN], sort=False).sum().reset_index()
+    return summaries
+
+def _key_values(series):
+    # Keys as the cleaned table stores them (numbers as float64, categoricals as plain values), so they match on merge
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype='float64')
+    return series.to_numpy(dtype=object)
+
+def merge_loan_aggregates(connection, base_name, added, removed=None, cleared=None):
+    """
+    Merge summarise_loans results into the <base_name>_<suffix> tables, inside
+    the caller's transaction (the one loading the same rows).
+
+    The rows of the months in added and removed (e.g. the earlier version of the
+    rows an upsert overwrites) are read, the new loans are added and the removed
+    ones taken off, and those months are written back. Only the months in the
+    data are touched, so the tables are never recomputed from the cleaned loans.
+    cleared says which earlier rows the load replaced: True to empty the tables
+    first, or a list of months to drop first.
+    """
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for suffix, keys in AGGREGATE_TABLES.items():
+        if suffix not in added:
+            continue
+        table_name = f"{base_name}_{suffix}"
+        changes = [added[suffix]]
+        if removed is not None and suffix in removed:
+            changes.append(removed[suffix].assign(**{measure: -removed[suffix][measure] for measure in MEASURES}))
+        changes = pd.concat(changes, ignore_index=True)
+        months = sorted(changes[MONTH_COLUMN].unique())
+
+        exists = inspector.has_table(table_name)
+        previous = []
+        if exists:
+            if cleared is True:
+                connection.execute(text(f"DELETE FROM {quote(table_name)}"))
+            elif cleared:
+                _delete_months(connection, table_name, sorted(cleared))
+            previous = _read_months(connection, table_name, months, keys + [MONTH_COLUMN] + MEASURES)
+            _delete_months(connection, table_name, months)
+
+        merged = pd.concat(previous + [changes], ignore_index=True)
+        merged = merged.groupby(keys + [MONTH_COLUMN], sort=False).sum().reset_index()
+        merged = merged[merged['loans'] > 0]
+        for measure in ('loans', 'returned_loans', 'late_returns'):
+            merged[measure] = merged[measure].astype('int64')
+        merged['avg_loan_days'] = merged['loan_days'] / merged['returned_loans'].where(merged['returned_loans'] > 0)
+        merged.to_sql(table_name, con=connection, if_exists='append', index=False)
+
+        if not exists:
+            index_name = f"ix_{table_name}_{MONTH_COLUMN}"
+            connection.execute(text(f"CREATE INDEX {quote(index_name)} ON {quote(table_name)} ({quote(MONTH_COLUMN)})"))
+
+def _month_batches(months):
+    for start in range(0, len(months), MONTHS_PER_STATEMENT):
+        yield list(months[start:start + MONTHS_PER_STATEMENT])
+
+def _read_months(connection, table_name, months, columns):
+    quote = connection.dialect.identifier_preparer.quote
+    query = text(f"SELECT {', '.join(quote(col) for col in columns)} FROM {quote(table_name)} "
+                 f"WHERE {quote(MONTH_COLUMN)} IN :months").bindparams(bindparam('months', expanding=True))
+    return [pd.read_sql(query, connection, params={'months': batch}) for batch in _month_batches(months)]
+
+def _delete_months(connection, table_name, months):
+    quote = connection.dialect.identifier_preparer.quote
+    delete = text(f"DELETE FROM {quote(table_name)} WHERE {quote(MONTH_COLUMN)} IN :months").bindparams(
+        bindparam('months', expanding=True))
+    for batch in _month_batches(months):
+        connection.execute(delete, {'months': batch})
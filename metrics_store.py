@@ -0,0 +1,183 @@
+import atexit
+import numpy as np
+from sqlalchemy import MetaData, Table, Column, BigInteger, DateTime, Float, Integer, String, inspect, text
+from data_profile import PROFILE_QUANTILES
+
+# The run metrics tables, with the columns described in the README
+metrics_metadata = MetaData()
+METRICS_TABLE = Table('data_cleaning_metrics', metrics_metadata,
+                      Column('file_name', String(255)),
+                      Column('rows_processed', Integer),
+                      Column('rows_removed', Integer),
+                      Column('rows_modified', Integer),
+                      Column('processing_time_seconds', Float),
+                      Column('dates_coerced', Integer),
+                      Column('input_memory_mb', Float),
+                      Column('orphan_loans', Integer),
+                      Column('status', String(20)))
+STAGE_METRICS_TABLE = Table('data_cleaning_stage_metrics', metrics_metadata,
+                            Column('file_name', String(255)),
+                            Column('run_started', DateTime),
+                            Column('stage', String(50)),
+                            Column('wall_time_seconds', Float),
+                            Column('cpu_time_seconds', Float),
+                            Column('rows_in', BigInteger),
+                            Column('rows_out', BigInteger),
+                            Column('peak_rss_mb', Float))
+COLUMN_PROFILE_TABLE = Table('data_cleaning_column_profile', metrics_metadata,
+                             Column('file_name', String(255)),
+                             Column('run_started', DateTime),
+                             Column('column_name', String(255)),
+                             Column('dtype', String(50)),
+                             Column('rows', BigInteger),
+                             Column('null_count', BigInteger),
+                             Column('distinct_approx', BigInteger),
+                             Column('min_value', String(255)),
+                             Column('max_value', String(255)),
+                             *(Column(name, String(255)) for name in PROFILE_QUANTILES))
+QUEUE_METRICS_TABLE = Table('data_cleaning_queue_metrics', metrics_metadata,
+                            Column('file_name', String(255)),
+                            Column('detected_at', DateTime),
+                            Column('started_at', DateTime),
+                            Column('finished_at', DateTime),
+                            Column('wait_seconds', Float),
+                            Column('queue_depth', Integer),
+                            Column('status', String(20)))
+# The tables a MetricsBuffer writes, in the order they are flushed
+METRICS_TABLES = (METRICS_TABLE, STAGE_METRICS_TABLE, COLUMN_PROFILE_TABLE, QUEUE_METRICS_TABLE)
+# Chunks of each checkpointed file whose SQL load has committed (see run_checkpoint)
+CHECKPOINT_TABLE = Table('data_cleaning_checkpoints', metrics_metadata,
+                         Column('file_name', String(255)),
+                         Column('chunks_loaded', Integer))
+
+
+def create_metrics_table(engine):
+    """
+    Create the data_cleaning_metrics, data_cleaning_stage_metrics,
+    data_cleaning_column_profile, data_cleaning_queue_metrics and
+    data_cleaning_checkpoints tables if they do not exist yet, and add the
+    columns missing from existing ones (e.g. a data_cleaning_metrics table
+    created by hand before status, dates_coerced, input_memory_mb and
+    orphan_loans were added). Called once before files are processed so that
+    parallel workers never race to create them.
+    """
+    metrics_metadata.create_all(engine, checkfirst=True)
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        for table in metrics_metadata.sorted_tables:
+            existing = {col['name'].lower() for col in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name.lower() not in existing:
+                    connection.execute(text(f"ALTER TABLE {quote(table.name)} "
+                                            f"ADD {quote(col.name)} {col.type.compile(dialect=engine.dialect)}"))
+                    print(f"Added the missing column {col.name} to {table.name}.")
+
+def _plain(value):
+    # numpy scalars become the Python values the DBAPI drivers expect
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class MetricsBuffer:
+    """
+    Collects rows for the metrics tables and writes them in batches, each flush
+    being a single transaction with one executemany per table.
+
+    The buffer flushes itself once batch_size rows are waiting, when it is used
+    as a context manager and the block exits (even on an error), and at
+    interpreter exit for anything still pending. With engine=None it only
+    collects rows, for a worker process to hand back to the one that writes them.
+    """
+
+    def __init__(self, engine=None, batch_size=500):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pending = {table.name: [] for table in METRICS_TABLES}
+        self._tables_created = False
+        if engine is not None:
+            atexit.register(self.flush)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.pending.values())
+
+    def add_metrics(self, metrics, file_name):
+        """
+        Queue one data_cleaning_metrics row; keys of metrics that are not columns are ignored.
+        """
+        row = {col.name: _plain(metrics.get(col.name)) for col in METRICS_TABLE.columns}
+        row['file_name'] = file_name
+        self.add_rows({METRICS_TABLE.name: [row]})
+
+    def add_stages(self, stage_records, file_name, run_started):
+        """
+        Queue one data_cleaning_stage_metrics row per record of a StageMetrics.
+        """
+        rows = [{col.name: _plain(record.get(col.name)) for col in STAGE_METRICS_TABLE.columns}
+                for record in stage_records]
+        for row in rows:
+            row['file_name'], row['run_started'] = file_name, run_started
+        self.add_rows({STAGE_METRICS_TABLE.name: rows})
+
+    def add_profile(self, column_records, file_name, run_started):
+        """
+        Queue one data_cleaning_column_profile row per column record of a DataProfile.
+        """
+        rows = [{col.name: _plain(record.get(col.name)) for col in COLUMN_PROFILE_TABLE.columns}
+                for record in column_records]
+        for row in rows:
+            row['file_name'], row['run_started'] = file_name, run_started
+        self.add_rows({COLUMN_PROFILE_TABLE.name: rows})
+
+    def add_queue_metrics(self, queue_records):
+        """
+        Queue one data_cleaning_queue_metrics row per file handled in watch mode.
+        """
+        rows = [{col.name: _plain(record.get(col.name)) for col in QUEUE_METRICS_TABLE.columns}
+                for record in queue_records]
+        self.add_rows({QUEUE_METRICS_TABLE.name: rows})
+
+    def add_rows(self, rows_by_table):
+        """
+        Queue rows given as table name -> list of row dicts (e.g. the pending rows of another buffer).
+        """
+        for table_name, rows in rows_by_table.items():
+            self.pending[table_name].extend(rows)
+        if self.engine is not None and len(self) >= self.batch_size:
+            self.flush()
+
+    def take(self):
+        """
+        Return the pending rows and empty the buffer, without writing them.
+        """
+        pending = self.pending
+        self.pending = {table_name: [] for table_name in pending}
+        return pending
+
+    def flush(self):
+        if self.engine is None or not len(self):
+            return
+        if not self._tables_created:
+            create_metrics_table(self.engine)
+            self._tables_created = True
+        pending = self.take()
+        try:
+            with self.engine.begin() as connection:
+                for table in METRICS_TABLES:
+                    if pending[table.name]:
+                        connection.execute(table.insert(), pending[table.name])
+        except Exception:
+            # The transaction was rolled back; keep the rows for the next flush
+            for table_name, rows in pending.items():
+                self.pending[table_name][:0] = rows
+            raise
+
+    def close(self):
+        self.flush()
+        if self.engine is not None:
+            atexit.unregister(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,271 @@
+import os
+import shutil
+import pandas as pd
+
+# File extension written for each supported output format
+OUTPUT_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow output need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def _widen_dtypes(df):
+    """
+    Undo per-chunk dtype compaction before handing a chunk to pyarrow: categoricals
+    become plain values (their categories differ between chunks) and small integer
+    types become 64-bit, so every chunk matches the schema of the first one.
+    """
+    widened = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            widened[col] = dtype.categories.dtype
+        elif pd.api.types.is_integer_dtype(dtype):
+            widened[col] = 'Int64' if pd.api.types.is_extension_array_dtype(dtype) else 'int64'
+    return df.astype(widened) if widened else df
+
+
+class CsvOutputWriter:
+    """
+    Write chunks to a CSV file: the first chunk overwrites the file with a header, later ones append.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._first_chunk = True
+
+    def write(self, df):
+        df.to_csv(self.path, index=False, mode='w' if self._first_chunk else 'a', header=self._first_chunk)
+        self._first_chunk = False
+
+    def committed(self):
+        """
+        Size of the file written so far, as path -> bytes, for a checkpoint.
+        """
+        return {self.path: os.path.getsize(self.path)} if not self._first_chunk else {}
+
+    def resume(self, sizes):
+        """
+        Cut the file back to its size in a checkpoint and append to it from there.
+        """
+        if sizes.get(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(sizes[self.path])
+            self._first_chunk = False
+
+    def close(self):
+        pass
+
+
+class _ArrowBackedWriter:
+    """
+    Shared chunk handling for the pyarrow writers. The schema is taken from the
+    first non-empty chunk and later chunks are cast to it, so a leading chunk in
+    which every row was removed cannot pin the columns to the wrong types. A
+    column whose later values do not fit its type (e.g. empty in the first
+    chunk, so float64, and text after) becomes a string column, and the file
+    written so far is rewritten with it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+        self._schema = None
+        self._empty_chunk = None
+
+    def write(self, df):
+        pa = _import_pyarrow()
+        if self._writer is None and len(df) == 0:
+            self._empty_chunk = df  # Written on close only if no rows ever arrive
+            return
+
+        df = _widen_dtypes(df)
+        try:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            self._promote_to_string(pa, df)
+            table = pa.Table.from_pandas(self._as_strings(df), schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open(pa, self._schema)
+        self._write_table(table)
+
+    def _promote_to_string(self, pa, df):
+        """
+        Turn the columns of the schema that df's values do not fit into strings,
+        and rewrite the file written so far to the new schema.
+        """
+        fields = []
+        for field in self._schema:
+            try:
+                pa.array(df[field.name], type=field.type, from_pandas=True)
+                fields.append(field)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                fields.append(pa.field(field.name, pa.string()))
+        self._schema = pa.schema(fields, metadata=self._schema.metadata)
+
+        self._writer.close()
+        earlier_path = self.path + '.earlier'
+        os.replace(self.path, earlier_path)
+        self._writer = self._open(pa, self._schema)
+        for table in self._read_tables(pa, earlier_path):
+            self._write_table(table.cast(self._schema))
+        os.remove(earlier_path)
+
+    def _as_strings(self, df):
+        # Values of the columns promoted to strings, with missing values kept missing
+        promoted = [field.name for field in self._schema
+                    if field.type == 'string' and not pd.api.types.is_string_dtype(df[field.name].dtype)]
+        return df.astype({col: 'string' for col in promoted}) if promoted else df
+
+    def close(self):
+        if self._writer is None and self._empty_chunk is not None:
+            pa = _import_pyarrow()
+            table = pa.Table.from_pandas(_widen_dtypes(self._empty_chunk), preserve_index=False)
+            self._writer = self._open(pa, table.schema)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _write_table(self, table):
+        self._writer.write_table(table)
+
+
+class ParquetOutputWriter(_ArrowBackedWriter):
+    """
+    Stream chunks into one Parquet file, each chunk written as row groups of at
+    most row_group_size rows, so the datetime columns keep their type.
+    """
+
+    def __init__(self, path, compression='snappy', row_group_size=1_000_000):
+        super().__init__(path)
+        self.compression = None if compression == 'none' else compression
+        self.row_group_size = row_group_size
+
+    def _open(self, pa, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, schema, compression=self.compression)
+
+    def _write_table(self, table):
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+
+    def _read_tables(self, pa, path):
+        import pyarrow.parquet as pq
+        with pq.ParquetFile(path) as parquet_file:
+            for row_group in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(row_group)
+
+
+class ArrowOutputWriter(_ArrowBackedWriter):
+    """
+    Stream chunks into one Arrow IPC (Feather v2) file, one record batch per chunk.
+    """
+
+    def __init__(self, path, compression=None):
+        super().__init__(path)
+        # Arrow IPC only supports lz4 and zstd buffer compression
+        self.compression = compression if compression in ('lz4', 'zstd') else None
+
+    def _open(self, pa, schema):
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self.path, schema, options=options)
+
+    def _read_tables(self, pa, path):
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for batch in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(batch)])
+
+
+def _open_writer(path, output_format, compression='snappy', row_group_size=1_000_000):
+    if output_format == 'csv':
+        return CsvOutputWriter(path)
+    if output_format == 'parquet':
+        return ParquetOutputWriter(path, compression=compression, row_group_size=row_group_size)
+    return ArrowOutputWriter(path, compression=compression)
+
+
+class PartitionedOutputWriter:
+    """
+    Write chunks to one file per value of partition_column, in Hive-style
+    directories (<path>/<column>=<value>/part<ext>) so readers such as
+    pd.read_parquet(path, filters=...) only open the partitions they need. The
+    column is given by the directory name rather than stored in the files.
+
+    A partition's file is overwritten the first time this writer sees its value
+    and appended to after that, so a rerun rewrites only the partitions present
+    in its data and leaves the others as they were. committed() and resume()
+    work as for CsvOutputWriter, over the files of all partitions.
+    """
+
+    def __init__(self, path, output_format, partition_column, compression='snappy', row_group_size=1_000_000):
+        self.path = path
+        self.output_format = output_format
+        self.partition_column = partition_column
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self._writers = {}  # Partition value -> writer of its file
+        if os.path.isfile(path):
+            os.remove(path)  # An unpartitioned file left by an earlier run
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, df):
+        for value, part in df.groupby(self.partition_column, sort=False):
+            writer = self._writers.get(value)
+            if writer is None:
+                directory = os.path.join(self.path, f"{self.partition_column}={value}")
+                os.makedirs(directory, exist_ok=True)
+                writer = self._writers[value] = _open_writer(
+                    os.path.join(directory, 'part' + OUTPUT_EXTENSIONS[self.output_format]), self.output_format,
+                    compression=self.compression, row_group_size=self.row_group_size)
+            writer.write(part.drop(columns=[self.partition_column]))
+
+    def committed(self):
+        sizes = {}
+        for writer in self._writers.values():
+            sizes.update(writer.committed())
+        return sizes
+
+    def resume(self, sizes):
+        """
+        Reopen the partition files in a checkpoint, cut back to their sizes in it.
+        """
+        for path in sizes:
+            directory = os.path.dirname(path)
+            if os.path.dirname(directory) == self.path:
+                value = os.path.basename(directory).split('=', 1)[1]
+                writer = self._writers[value] = _open_writer(path, self.output_format, compression=self.compression,
+                                                             row_group_size=self.row_group_size)
+                writer.resume(sizes)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+def open_output_writers(base_path, output_formats=('csv',), compression='snappy', row_group_size=1_000_000,
+                        partition_column=None):
+    """
+    Return one writer per requested format, writing to base_path plus the format's extension.
+    With partition_column that path is a directory of PartitionedOutputWriter partitions;
+    without it, such a directory left by an earlier run is removed.
+    """
+    if any(output_format != 'csv' for output_format in output_formats):
+        _import_pyarrow()  # Fail before any cleaning starts if pyarrow is missing
+
+    writers = []
+    for output_format in output_formats:
+        path = base_path + OUTPUT_EXTENSIONS[output_format]
+        if partition_column is not None:
+            writers.append(PartitionedOutputWriter(path, output_format, partition_column,
+                                                   compression=compression, row_group_size=row_group_size))
+        else:
+            if os.path.isdir(path):
+                shutil.rmtree(path)  # Partitions left by an earlier run with partition_column
+            writers.append(_open_writer(path, output_format, compression=compression, row_group_size=row_group_size))
+    return writers
@@ -0,0 +1,89 @@
+import queue
+import threading
+
+# Marks the end of the items on a queue
+_END = object()
+# How often a blocked thread checks whether another step has failed
+_POLL_SECONDS = 0.1
+
+
+def run_pipelined(source, transform, sink, depth=2):
+    """
+    Run source -> transform -> sink with the three steps overlapping.
+
+    Items of the iterable source (e.g. CSV chunks) are fetched on a reader
+    thread, passed through transform on the calling thread and handed to sink
+    (e.g. the file writers and SQL load) on a loader thread. At most depth items
+    wait between two steps, so a slow step holds the others back instead of
+    letting chunks pile up in memory. Items reach sink one at a time, in the
+    order source produced them. If any step raises, the others stop and the
+    first error is raised here.
+    """
+    stop = threading.Event()
+    errors = []
+    to_transform = queue.Queue(maxsize=depth)
+    to_sink = queue.Queue(maxsize=depth)
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _END
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def read():
+        iterator = iter(source)
+        try:
+            for item in iterator:
+                if not put(to_transform, item):
+                    break
+        except BaseException as error:
+            fail(error)
+        finally:
+            close = getattr(iterator, 'close', None)  # Release the file held by a generator stopped early
+            if close is not None:
+                close()
+            put(to_transform, _END)
+
+    def load():
+        try:
+            while True:
+                item = get(to_sink)
+                if item is _END:
+                    return
+                sink(item)
+        except BaseException as error:
+            fail(error)
+
+    threads = [threading.Thread(target=read, name='pipeline-read', daemon=True),
+               threading.Thread(target=load, name='pipeline-load', daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = get(to_transform)
+            if item is _END or not put(to_sink, transform(item)):
+                break
+    except BaseException as error:
+        fail(error)
+    finally:
+        put(to_sink, _END)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
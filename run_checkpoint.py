@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import pickle
+from sqlalchemy import select, delete
+from file_manifest import file_stat, options_digest
+from input_files import input_base_name
+from metrics_store import CHECKPOINT_TABLE
+
+# Where the checkpoints of unfinished runs are kept, next to the cleaned files
+CHECKPOINT_DIR = os.path.join('Cleaned_Data', 'checkpoints')
+
+
+class RunCheckpoint:
+    """
+    Progress of one file's cleaning run, saved after every chunk that has been
+    written and loaded, so a run that dies part way resumes from its last
+    committed chunk instead of starting the file over.
+
+    The state (rows or bytes of the input consumed, partial metrics, detected
+    date formats, sizes of the output files, SQL partitions replaced so far) is
+    a JSON file written atomically. The row hashes used for deduplication are
+    journalled next to it by the RowHashIndex, and a DataProfile is pickled
+    alongside. A checkpoint only applies to the same input file (size and
+    mtime) cleaned with the same options, compared by their options_digest so
+    values JSON cannot hold (e.g. dates in the cleaning rules) still match.
+
+    The local files are saved just after the chunk's SQL transaction commits,
+    so the transaction also records the number of chunks loaded in the
+    data_cleaning_checkpoints table. A run that died between the two then
+    knows its next chunk is already in SQL and does not load it twice.
+    """
+
+    def __init__(self, input_file, options, checkpoint_dir=CHECKPOINT_DIR):
+        self.input_file = input_file
+        self.file_name = os.path.abspath(input_file)
+        self.options = options_digest(options)
+        # The path's digest keeps apart files of the same name in different directories
+        digest = hashlib.sha1(self.file_name.encode()).hexdigest()[:12]
+        base = os.path.join(checkpoint_dir, f"{input_base_name(input_file)}_{digest}")
+        self.state_file = base + '.json'
+        self.hashes_file = base + '.hashes'
+        self.profile_file = base + '.profile'
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def load(self):
+        """
+        Return the saved state, or None if there is none or it was saved for a
+        different version of the file or different options.
+        """
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file) as f:
+            state = json.load(f)
+        if state['file'] != file_stat(self.input_file) or state['options'] != self.options:
+            print(f"Ignoring the checkpoint of {self.input_file}: the file or the options have changed.")
+            return None
+        return state
+
+    def load_profile(self):
+        with open(self.profile_file, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, state, profile=None):
+        """
+        Write the state (and the pickled profile, if given) atomically.
+        """
+        if profile is not None:
+            _write_atomically(self.profile_file, profile)
+        state = {**state, 'file': file_stat(self.input_file), 'options': self.options}
+        _write_atomically(self.state_file, json.dumps(state, indent=2, sort_keys=True).encode())
+
+    def loaded_chunks(self, connection):
+        """
+        Number of chunks whose SQL load has committed, as recorded by mark_loaded.
+        """
+        query = select(CHECKPOINT_TABLE.c.chunks_loaded).where(CHECKPOINT_TABLE.c.file_name == self.file_name)
+        return connection.execute(query).scalar() or 0
+
+    def mark_loaded(self, connection, chunks_loaded):
+        """
+        Record that chunks_loaded chunks are in SQL, inside the transaction that loaded the last of them.
+        """
+        connection.execute(delete(CHECKPOINT_TABLE).where(CHECKPOINT_TABLE.c.file_name == self.file_name))
+        connection.execute(CHECKPOINT_TABLE.insert(), {'file_name': self.file_name, 'chunks_loaded': chunks_loaded})
+
+    def clear(self, engine):
+        """
+        Forget the checkpoint, once the run has finished or when it starts over.
+        """
+        for path in (self.state_file, self.hashes_file, self.profile_file):
+            if os.path.exists(path):
+                os.remove(path)
+        with engine.begin() as connection:
+            connection.execute(delete(CHECKPOINT_TABLE).where(CHECKPOINT_TABLE.c.file_name == self.file_name))
+
+
+def _write_atomically(path, data):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
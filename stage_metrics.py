@@ -0,0 +1,116 @@
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # Unix only; fallback for the peak RSS outside Linux
+except ImportError:
+    resource = None
+
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak-RSS counter (Linux only) so the next reading covers one stage.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB, from /proc on Linux or getrusage elsewhere.
+    Returns None where neither is available.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Kilobytes on Linux
+    return None
+
+
+class StageMetrics:
+    """
+    Accumulates wall time, CPU time, rows in/out and peak RSS for each stage of a
+    cleaning run. A stage that runs once per chunk is summed over the chunks, with
+    the peak RSS being the highest seen in any of them.
+
+    cpu_clock measures the CPU time; pass time.thread_time when stages run on
+    different threads at once, so each stage counts only its own thread's CPU.
+    """
+
+    def __init__(self, cpu_clock=time.process_time):
+        self.stages = {}  # Stage name -> record, in the order the stages first ran
+        self.cpu_clock = cpu_clock
+
+    @contextmanager
+    def stage(self, name, rows_in=0):
+        """
+        Time the body of a with block as one run of stage name. The yielded dict's
+        'rows_out' (initially rows_in) can be set to the number of rows the stage kept,
+        and 'rows_in' when it is only known inside the block.
+        """
+        record = self.stages.setdefault(name, {
+            'stage': name,
+            'wall_time_seconds': 0.0,
+            'cpu_time_seconds': 0.0,
+            'rows_in': 0,
+            'rows_out': 0,
+            'peak_rss_mb': 0.0,
+        })
+        counts = {'rows_in': rows_in, 'rows_out': rows_in}
+        reset_peak_rss()
+        wall_start, cpu_start = time.perf_counter(), self.cpu_clock()
+        try:
+            yield counts
+        finally:
+            record['wall_time_seconds'] += time.perf_counter() - wall_start
+            record['cpu_time_seconds'] += self.cpu_clock() - cpu_start
+            record['rows_in'] += int(counts['rows_in'])
+            record['rows_out'] += int(counts['rows_out'])
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], peak_rss_mb() or 0.0)
+
+    def timed_iter(self, name, iterable):
+        """
+        Yield the items of iterable, timing each fetch (e.g. reading a CSV chunk) as stage name.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as counts:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                counts['rows_in'] = counts['rows_out'] = len(item)
+            yield item
+
+    def merge(self, records):
+        """
+        Add the records of another StageMetrics (e.g. one kept by a worker process) to these stages.
+        """
+        for other in records:
+            record = self.stages.setdefault(other['stage'], {
+                'stage': other['stage'],
+                'wall_time_seconds': 0.0,
+                'cpu_time_seconds': 0.0,
+                'rows_in': 0,
+                'rows_out': 0,
+                'peak_rss_mb': 0.0,
+            })
+            for key in ('wall_time_seconds', 'cpu_time_seconds', 'rows_in', 'rows_out'):
+                record[key] += other[key]
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], other['peak_rss_mb'])
+
+    def records(self):
+        return list(self.stages.values())
+
+    def print_summary(self):
+        print(f"{'Stage':<12} {'Wall (s)':>10} {'CPU (s)':>10} {'Rows in':>12} {'Rows out':>12} {'Peak RSS (MB)':>14}")
+        for record in self.stages.values():
+            print(f"{record['stage']:<12} {record['wall_time_seconds']:>10.3f} {record['cpu_time_seconds']:>10.3f} "
+                  f"{record['rows_in']:>12,} {record['rows_out']:>12,} {record['peak_rss_mb']:>14.1f}")
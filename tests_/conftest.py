@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the scripts in the repository root (clean_data.py, calculator_app.py, ...) importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,35 @@
+import json
+import os
+import pandas as pd
+from benchmark_clean_data import generate_library_csv, run_benchmark
+
+def test_generated_systembook_has_requested_defects(tmp_path):
+    path = generate_library_csv(str(tmp_path / 'book.csv'), 20000, null_rate=0.05, duplicate_rate=0.05,
+                                bad_date_rate=0.05, chunksize=3000)
+    df = pd.read_csv(path)
+
+    assert len(df) == 20000
+    assert df.columns.tolist() == ['Id', 'Books', 'Book checkout', 'Book Returned', 'Days allowed to borrow', 'Customer ID']
+    assert df['Book checkout'].iloc[0].startswith('"')  # Quoted like the real exports
+    assert 0.03 < df['Customer ID'].isna().mean() < 0.07
+    assert 0.03 < df.dropna().duplicated().mean() < 0.07
+    assert 0.03 < (df['Book checkout'] == '"32/13/2023"').mean() < 0.07
+
+def test_run_benchmark_saves_every_stage(tmp_path):
+    results = run_benchmark([2000], results_dir=str(tmp_path))
+
+    stages = [record['stage'] for record in results['runs'][0]['stages']]
+    assert stages == ['read', 'null_drop', 'dedup', 'date_parse', 'enrich', 'csv_write', 'sql_load', 'end_to_end']
+
+    saved = [name for name in os.listdir(tmp_path) if name.endswith('.json')]
+    assert len(saved) == 1
+    with open(tmp_path / saved[0]) as f:
+        assert json.load(f)['runs'][0]['rows'] == 2000
+
+def test_input_reads_compare_plain_and_compressed(tmp_path):
+    results = run_benchmark([2000], results_dir=None, chunksize=500, input_reads=True)
+
+    reads = {record['stage']: record for record in results['runs'][0]['input_reads']}
+    assert {'read_buffered', 'read_mmap', 'read_gz'} <= set(reads)
+    assert all(record['rows_in'] == 2000 for record in reads.values())
+    assert reads['read_gz']['file_size_mb'] < reads['read_buffered']['file_size_mb']
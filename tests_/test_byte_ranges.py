@@ -0,0 +1,70 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from byte_ranges import split_byte_ranges, read_byte_range, put_handoff, take_handoff, discard_handoff
+from clean_data import cleanse_data
+from file_manifest import ContentHasher, content_hash
+
+def write_loans(path, rows=200):
+    lines = ['Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID']
+    for i in range(rows):
+        checkout = '"""13/04/2023"""' if i % 9 else 'not a date'
+        books = f'"Book {i % 60}\nsecond line"' if i % 11 == 0 else f'Book {i % 60}'
+        customer = '' if i % 17 == 0 else i % 60 % 7
+        lines.append(f'{i % 60},{books},{checkout},"""25/04/2023""",2 weeks,{customer}')
+    path.write_text('\n'.join(lines) + '\n')
+
+def test_ranges_split_on_row_boundaries(tmp_path):
+    path = tmp_path / 'loans.csv'
+    write_loans(path)
+    header = path.read_bytes().split(b'\n', 1)[0] + b'\n'
+
+    ranges = list(split_byte_ranges(str(path), range_bytes=300))
+
+    assert len(ranges) > 5
+    assert ranges[0][0] == len(header) and ranges[-1][1] == path.stat().st_size
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    # Every range parses on its own, and together they give the rows of the whole file
+    parts = [pd.read_csv(io.BytesIO(header + read_byte_range(str(path), start, end))) for start, end in ranges]
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), pd.read_csv(path))
+
+def test_split_scan_feeds_the_content_hash(tmp_path):
+    path = tmp_path / 'loans.csv'
+    write_loans(path)
+
+    hasher = ContentHasher(str(path))
+    list(split_byte_ranges(str(path), range_bytes=300, hasher=hasher))
+
+    assert hasher.hexdigest() == content_hash(str(path))
+
+def test_handoff_round_trip():
+    df = pd.DataFrame({'id': np.arange(1000), 'name': [f'row {i}' for i in range(1000)],
+                       'date': pd.date_range('2023-01-01', periods=1000, freq='h')})
+    handle = put_handoff({'df': df, 'hashes': np.arange(1000, dtype=np.uint64)})
+
+    kept = take_handoff(handle, lambda result: result['df'][result['hashes'] % 2 == 0])
+
+    pd.testing.assert_frame_equal(kept, df[df['id'] % 2 == 0])
+    assert not os.path.exists(handle['path'])  # Removed once read, on every platform
+    discarded = put_handoff({'df': df})
+    discard_handoff(discarded)
+    assert not os.path.exists(discarded['path'])
+
+def test_split_cleanse_matches_sequential(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_loans(tmp_path / 'loans.csv', rows=400)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    rules = {'columns': {'book checkout': {'type': 'date', 'strip_quotes': True, 'drop_invalid': True},
+                         'book returned': {'type': 'date', 'strip_quotes': True}}}
+
+    sequential = cleanse_data('loans.csv', engine, chunksize=50, rules=rules, data_profile=True)
+    sequential_rows = pd.read_sql_table('loans_cleaned', engine)
+    split = cleanse_data('loans.csv', engine, rules=rules, data_profile=True, range_workers=2, range_mb=0.001)
+    split_rows = pd.read_sql_table('loans_cleaned', engine)
+
+    for key in ('rows_processed', 'rows_removed', 'rows_modified', 'dates_coerced'):
+        assert split[key] == sequential[key]
+    assert sequential['rows_removed'] > 0 and sequential['dates_coerced'] > 0
+    pd.testing.assert_frame_equal(split_rows, sequential_rows)
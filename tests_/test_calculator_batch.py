@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from calculator_app import Calculator, calculate_file, compare_with_scalar, read_operand_chunks
+
+def test_batch_masks_division_by_zero():
+    results, zero_divisions = Calculator.compute_batch([8, 3, -4, 0], [2, 0, 8, 0])
+
+    assert zero_divisions == 2
+    np.testing.assert_array_equal(results['sum'], [10, 3, 4, 0])
+    np.testing.assert_array_equal(results['product'], [16, 0, -32, 0])
+    np.testing.assert_array_equal(results['quotient'], [4, np.nan, -0.5, np.nan])
+
+def test_files_are_read_in_chunks(tmp_path):
+    pairs = np.column_stack([np.arange(10.0), np.arange(10.0) % 3])
+    pairs.astype('<f8').tofile(tmp_path / 'pairs.bin')
+    np.save(tmp_path / 'pairs.npy', pairs)
+    pd.DataFrame(pairs.astype(int), columns=['a', 'b']).to_csv(tmp_path / 'pairs.csv', index=False)
+
+    for name in ('pairs.bin', 'pairs.npy', 'pairs.csv'):
+        chunks = list(read_operand_chunks(str(tmp_path / name), chunk_rows=4))
+        assert [len(a) for a, b in chunks] == [4, 4, 2]
+        np.testing.assert_array_equal(np.concatenate([b for a, b in chunks]), pairs[:, 1])
+
+    (tmp_path / 'odd.bin').write_bytes(np.arange(3.0).tobytes())
+    with pytest.raises(ValueError, match='whole'):
+        list(read_operand_chunks(str(tmp_path / 'odd.bin')))
+
+def test_calculate_file_writes_numeric_results(tmp_path):
+    pd.DataFrame({'a': [8, 5, 9], 'b': [2, 0, 3]}).to_csv(tmp_path / 'pairs.csv', index=False)
+
+    summary = calculate_file(str(tmp_path / 'pairs.csv'), chunk_rows=2, output=str(tmp_path / 'results.csv'))
+
+    assert summary['rows'] == 3 and summary['zero_divisions'] == 1
+    results = pd.read_csv(tmp_path / 'results.csv')
+    assert list(results.columns) == ['sum', 'difference', 'product', 'quotient']
+    assert results['quotient'].dtype == 'float64'
+    np.testing.assert_array_equal(results['quotient'], [4, np.nan, 3])
+
+def test_batch_matches_scalar_path():
+    rng = np.random.default_rng(0)
+    a, b = rng.integers(-50, 50, 2000), rng.integers(-3, 3, 2000)
+
+    comparison = compare_with_scalar(a, b)
+
+    assert comparison['rows'] == 2000 and comparison['mismatches'] == 0
+    assert comparison['batch_rows_per_second'] > 0 and comparison['scalar_rows_per_second'] > 0
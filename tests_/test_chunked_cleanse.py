@@ -0,0 +1,45 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+
+# Fixture writing a Systembook-shaped CSV with nulls and duplicates spread across chunks
+@pytest.fixture
+def library_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cleanse_data writes to ./Cleaned_Data
+    rows = [
+        'Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID',
+        '1,Dune,"""13/04/2023""",25/04/2023,2 weeks,5',
+        '2,IT,"""14/04/2023""",13/04/2023,2 weeks,6',
+        ',,,,,',
+        '1,Dune,"""13/04/2023""",25/04/2023,2 weeks,5',  # duplicate of row 1, lands in a later chunk
+        '3,Emma,"""16/04/2023""",NaN,2 weeks,7',
+        '2,IT,"""14/04/2023""",13/04/2023,2 weeks,6',  # duplicate of row 2
+        '4,Misery,"""15/04/2023""",20/04/2023,2 weeks,7',
+    ]
+    path = tmp_path / 'loans.csv'
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+def test_chunked_totals_match_whole_file(library_csv, engine):
+    whole = cleanse_data(library_csv, engine)
+    whole_rows = pd.read_csv('Cleaned_Data/loans_cleaned.csv')
+
+    chunked = cleanse_data(library_csv, engine, chunksize=2)
+    chunked_rows = pd.read_csv('Cleaned_Data/loans_cleaned.csv')
+
+    for key in ('rows_processed', 'rows_removed', 'rows_modified'):
+        assert chunked[key] == whole[key], f"{key} differs between chunked and whole-file runs"
+    assert chunked['rows_processed'] == 7
+    assert chunked['rows_removed'] == 4
+    assert chunked_rows['id'].tolist() == whole_rows['id'].tolist() == [1, 2, 4]
+
+def test_chunked_sql_table_contains_every_chunk(library_csv, engine):
+    cleanse_data(library_csv, engine, chunksize=2)
+
+    table = pd.read_sql_table('loans_cleaned', engine)
+    assert sorted(table['id'].tolist()) == [1, 2, 4]
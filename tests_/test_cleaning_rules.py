@@ -0,0 +1,82 @@
+import json
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from cleaning_rules import CleaningPlan, DEFAULT_RULES, load_rules, rules_for_file
+from clean_data import cleanse_data
+
+def new_metrics():
+    return {'rows_removed': 0, 'rows_modified': 0, 'dates_coerced': 0}
+
+def test_column_steps_run_together_and_invalid_rows_are_dropped():
+    df = pd.DataFrame({
+        'book checkout': ['"01/10/2023"', '"13/10/2023"', '"32/10/2023"', '"01/10/2023"'],
+        'books': [' Dune ', 'IT', 'Dune', 'Misery '],
+        'customer id': ['1', '0', '3', '4'],
+    })
+    plan = CleaningPlan({'columns': {
+        'Book checkout': {'type': 'date', 'strip_quotes': True},
+        'books': {'trim': True, 'lowercase': True, 'allowed': ['dune', 'it', 'misery']},
+        'customer id': {'type': 'integer', 'min': 1},
+    }})
+    metrics = new_metrics()
+
+    cleaned = plan.transform(df, metrics)
+
+    assert cleaned.index.tolist() == [0, 2, 3]  # Customer 0 fails the minimum
+    assert cleaned['books'].tolist() == ['dune', 'dune', 'misery']
+    assert cleaned['book checkout'].iloc[0] == pd.Timestamp('2023-10-01')
+    assert pd.isna(cleaned['book checkout'].iloc[1])
+    assert str(cleaned['customer id'].dtype) == 'Int64'
+    assert plan.date_formats == {'book checkout': '%d/%m/%Y'}
+    assert metrics == {'rows_removed': 1, 'rows_modified': 4 + 4 + 3, 'dates_coerced': 1}
+
+def test_drop_invalid_removes_unparseable_dates():
+    df = pd.DataFrame({'book returned': ['02/04/2023', 'not a date']})
+    plan = CleaningPlan({'columns': {'book returned': {'type': 'date', 'drop_invalid': True}}})
+
+    cleaned = plan.transform(df)
+
+    assert cleaned['book returned'].tolist() == [pd.Timestamp('2023-04-02')]
+
+def test_null_policies():
+    df = pd.DataFrame({'id': [1, 2, None], 'books': ['Dune', None, 'IT']})
+
+    assert len(CleaningPlan({'null_policy': 'drop_any'}).drop_nulls(df)) == 1
+    assert len(CleaningPlan({'null_policy': 'drop_required', 'required': ['Id']}).drop_nulls(df)) == 2
+    assert len(CleaningPlan({'null_policy': 'keep'}).drop_nulls(df)) == 3
+    filled = CleaningPlan({'fill': {'books': 'unknown'}}).drop_nulls(df)
+    assert filled['books'].tolist() == ['Dune', 'unknown']
+
+def test_unknown_options_are_rejected():
+    with pytest.raises(ValueError, match='lowercse'):
+        CleaningPlan({'columns': {'books': {'lowercse': True}}})
+    with pytest.raises(ValueError, match='Unknown null policy'):
+        CleaningPlan({'null_policy': 'drop_some'})
+
+def test_rules_are_picked_by_file_pattern(tmp_path):
+    config = {'files': {'*Customers*': {'null_policy': 'keep'}}, 'default': {'null_policy': 'drop_required'}}
+    rules_file = tmp_path / 'rules.json'
+    rules_file.write_text(json.dumps(config))
+
+    config = load_rules(str(rules_file))
+
+    assert rules_for_file(config, '/data/03_Library SystemCustomers.csv') == {'null_policy': 'keep'}
+    assert rules_for_file(config, '03_Library Systembook.csv') == {'null_policy': 'drop_required'}
+    assert rules_for_file(None, 'any.csv') is DEFAULT_RULES
+
+def test_cleanse_data_applies_rules(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_file = tmp_path / 'loans.csv'
+    input_file.write_text('Id,Books,Customer ID\n1, Dune ,1\n2,IT,\n3,Misery,-4\n')
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    rules = {'files': {'loans*': {
+        'null_policy': 'drop_required', 'required': ['id'],
+        'columns': {'books': {'trim': True, 'lowercase': True}, 'customer id': {'type': 'integer', 'min': 0}},
+    }}}
+
+    metrics = cleanse_data(str(input_file), engine, rules=rules)
+
+    loaded = pd.read_sql('SELECT * FROM loans_cleaned', engine)
+    assert loaded['books'].tolist() == ['dune', 'it']
+    assert metrics['rows_removed'] == 1
@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+import gzip
+import os
+from csv_ingest import read_csv_chunks, compact_dtypes, memory_mb
+from file_manifest import ContentHasher, content_hash
+
+@pytest.fixture
+def library_csv(tmp_path):
+    rows = ['Id,Books,Book checkout,Days allowed to borrow,Customer ID']
+    rows += [f'{i},Book {i % 3},"""0{i % 9 + 1}/04/2023""",2 weeks,{i % 5 + 1}' for i in range(1, 41)]
+    rows += ['41,NaN,"""01/06/2023""",2 weeks,NaN', ',,,,']
+    path = tmp_path / 'loans.csv'
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+def test_compact_dtypes_shrinks_ids_and_categorises_text(library_csv):
+    df = pd.read_csv(library_csv)
+
+    compacted = compact_dtypes(df)
+
+    assert str(compacted['Id'].dtype) == 'Int8'  # Float because of the empty row, but whole numbers
+    assert str(compacted['Customer ID'].dtype) == 'Int8'
+    assert isinstance(compacted['Days allowed to borrow'].dtype, pd.CategoricalDtype)
+    assert compacted['Customer ID'].isna().sum() == 2
+    assert memory_mb(compacted) < memory_mb(df)
+
+def test_schema_fixes_dtypes(library_csv):
+    df = next(read_csv_chunks(library_csv, schema={'Id': 'Int32', 'Days allowed to borrow': 'category'}))
+
+    assert str(df['Id'].dtype) == 'Int32'
+    assert isinstance(df['Days allowed to borrow'].dtype, pd.CategoricalDtype)
+
+def test_pyarrow_engine_matches_c_engine(library_csv):
+    pytest.importorskip('pyarrow')
+
+    c_rows = pd.concat(read_csv_chunks(library_csv, chunksize=10))
+    arrow_rows = pd.concat(read_csv_chunks(library_csv, chunksize=10, csv_engine='pyarrow'))
+
+    assert len(arrow_rows) == len(c_rows) == 42
+    assert arrow_rows['Books'].isna().sum() == c_rows['Books'].isna().sum() == 2  # "NaN" and the empty row
+    assert arrow_rows['Book checkout'].iloc[0] == c_rows['Book checkout'].iloc[0] == '"02/04/2023"'
+
+@pytest.mark.parametrize('csv_engine', ['c', 'pyarrow'])
+@pytest.mark.parametrize('compressed', [False, True])
+def test_hasher_is_given_the_bytes_read(library_csv, csv_engine, compressed):
+    if csv_engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    path = library_csv
+    if compressed:
+        path += '.gz'
+        with open(library_csv, 'rb') as source, gzip.open(path, 'wb') as target:
+            target.write(source.read())
+    expected = content_hash(path)
+
+    hasher = ContentHasher(path)
+    assert sum(len(chunk) for chunk in read_csv_chunks(path, chunksize=10, csv_engine=csv_engine,
+                                                       hasher=hasher)) == 42
+    # Whatever is on disk now, the hash is of the bytes already read
+    size = os.path.getsize(path)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    assert hasher.hexdigest() == expected
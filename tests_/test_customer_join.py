@@ -0,0 +1,55 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from customer_join import CustomerIndex
+from clean_data import process_files
+
+def test_join_adds_customer_columns_and_flags_orphans():
+    index = CustomerIndex()
+    index.add(pd.DataFrame({'customer id': [1.0, 2.0], 'customer name': ['jane doe', 'john smith']}))
+    index.add(pd.DataFrame({'customer id': pd.array([2, 3], dtype='Int8'), 'customer name': ['jon smith', 'dan reeves']}))
+    loans = pd.DataFrame({'id': [10, 11, 12], 'customer id': [3, 9, 2]}, index=[5, 6, 7])
+
+    joined = index.join(loans)
+
+    assert len(index) == 3
+    assert joined.index.tolist() == [5, 6, 7]
+    assert joined['customer name'].tolist()[::2] == ['dan reeves', 'jon smith']  # The last row for a key wins
+    assert pd.isna(joined['customer name'].iloc[1])
+    assert joined['customer_orphan'].tolist() == [False, True, False]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_process_files_joins_loans_to_customers(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Library Customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n2,John Smith\n')
+    (tmp_path / 'loans.csv').write_text('Id,Books,Customer ID\n1,Dune,1\n2,IT,2\n3,Misery,7\n')
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+    files = ['loans.csv', 'Library Customers.csv']  # Bigger file first, customers still cleaned first
+
+    results = process_files(files, connection_string, workers=workers, join_customers='*Customers*.csv')
+
+    assert results['loans.csv']['orphan_loans'] == 1
+    loans = pd.read_sql('SELECT * FROM loans_cleaned ORDER BY id', create_engine(connection_string))
+    assert loans['customer name'].tolist()[:2] == ['Jane Doe', 'John Smith']
+    assert loans['customer_orphan'].tolist() == [0, 0, 1]
+
+def test_unchanged_customers_are_read_from_cleaned_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n')
+    (tmp_path / 'loans.csv').write_text('Id,Customer ID\n1,1\n')
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+    process_files(['Customers.csv', 'loans.csv'], connection_string, join_customers='Customers.csv')
+
+    # Only the loans changed: the customers are skipped but the join still finds them
+    (tmp_path / 'loans.csv').write_text('Id,Customer ID\n1,1\n2,1\n')
+    results = process_files(['Customers.csv', 'loans.csv'], connection_string, join_customers='Customers.csv')
+
+    assert results['Customers.csv']['status'] == 'skipped'
+    assert results['loans.csv']['orphan_loans'] == 0
+    loans = pd.read_csv('Cleaned_Data/loans_cleaned.csv')
+    assert loans['customer name'].tolist() == ['Jane Doe', 'Jane Doe']
+
+    # Changing the customers re-joins the unchanged loans
+    (tmp_path / 'Customers.csv').write_text('Customer ID,Customer Name\n2,John Smith\n')
+    results = process_files(['Customers.csv', 'loans.csv'], connection_string, join_customers='Customers.csv')
+    assert results['loans.csv']['orphan_loans'] == 2
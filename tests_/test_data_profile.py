@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+from data_profile import DataProfile, HyperLogLog, ReservoirSample
+
+def test_hyperloglog_estimate_is_close():
+    sketch = HyperLogLog()
+    for start in range(0, 200000, 50000):
+        values = np.arange(start, start + 50000, dtype='float64')
+        sketch.add(np.concatenate([values, values[:1000]]))  # Repeats do not count
+
+    assert abs(sketch.estimate() - 200000) / 200000 < 0.05
+    assert HyperLogLog().estimate() == 0
+
+def test_reservoir_quantiles_are_close():
+    sample = ReservoirSample(size=5000)
+    for start in range(0, 1000000, 100000):
+        sample.add(np.arange(start, start + 100000))
+
+    assert sample.seen == 1000000
+    median = sample.quantiles([0.5])[0]
+    assert abs(median - 500000) < 30000
+
+def test_profile_counts_input_nulls_and_describes_cleaned_values():
+    profile = DataProfile()
+    for chunk in (pd.DataFrame({'id': [1, 2, None], 'when': ['2023-04-01', None, '2023-04-03']}),
+                  pd.DataFrame({'id': [4, 4, 6], 'when': ['2023-04-04', '2023-04-05', '2023-04-06']})):
+        profile.count_nulls(chunk)
+        profile.add(chunk.dropna().assign(when=lambda df: pd.to_datetime(df['when'])))
+
+    records = {record['column_name']: record for record in profile.records()}
+    assert (records['id']['rows'], records['id']['null_count']) == (6, 1)
+    assert records['id']['distinct_approx'] == 3
+    assert (records['id']['min_value'], records['id']['max_value']) == ('1.0', '6.0')
+    assert records['when']['min_value'] == '2023-04-01 00:00:00'
+    assert records['when']['p50'].startswith('2023-04-04')
+
+def test_cleanse_data_stores_the_profile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n2,\n3,Dan Reeves\n')
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    cleanse_data('customers.csv', engine, chunksize=2, data_profile=True)
+
+    profile = pd.read_sql_table('data_cleaning_column_profile', engine).set_index('column_name')
+    assert profile.loc['customer name', 'null_count'] == 1
+    assert profile.loc['customer id', 'distinct_approx'] == 2
+    assert profile.loc['customer id', 'max_value'] == '3.0'
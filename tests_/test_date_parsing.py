@@ -0,0 +1,32 @@
+import pandas as pd
+from clean_data import detect_date_format, parse_date_column
+
+def test_detects_day_first_format():
+    values = pd.Series(['02/04/2023', '20/02/2023', '15/04/2023'])
+    assert detect_date_format(values) == '%d/%m/%Y'
+
+def test_detects_iso_format():
+    assert detect_date_format(pd.Series(['2023-10-01', '2023-10-05'])) == '%Y-%m-%d'
+
+def test_parse_strips_quotes_and_counts_coerced_values():
+    series = pd.Series(['"""20/02/2023"""', '"""02/04/2023"""', '"""32/05/2023"""', '"""02/04/2023"""'])
+    date_formats = {}
+
+    parsed, coerced = parse_date_column(series, 'book checkout', date_formats)
+
+    assert date_formats == {'book checkout': '%d/%m/%Y'}
+    assert parsed.tolist()[:2] == [pd.Timestamp('2023-02-20'), pd.Timestamp('2023-04-02')]
+    assert pd.isna(parsed.iloc[2])
+    assert parsed.iloc[3] == parsed.iloc[1]
+    assert coerced == 1
+
+def test_given_format_is_used_and_missing_values_are_not_counted():
+    series = pd.Series(['04/02/2023', None, '04/13/2023'], index=[10, 11, 12])
+
+    parsed, coerced = parse_date_column(series, 'book returned', {'book returned': '%m/%d/%Y'})
+
+    assert parsed.index.tolist() == [10, 11, 12]
+    assert parsed.iloc[0] == pd.Timestamp('2023-04-02')
+    assert parsed.iloc[2] == pd.Timestamp('2023-04-13')
+    assert pd.isna(parsed.iloc[1])
+    assert coerced == 0
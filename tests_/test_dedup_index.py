@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from dedup_index import RowHashIndex
+
+def test_filter_new_marks_repeats_within_and_across_batches():
+    index = RowHashIndex()
+
+    first = index.filter_new(np.array([5, 3, 5, 9], dtype=np.uint64))
+    second = index.filter_new(np.array([9, 1, 3, 1], dtype=np.uint64))
+
+    assert first.tolist() == [True, True, False, True]
+    assert second.tolist() == [False, True, False, False]
+    assert index.hits == 4
+    assert len(index) == 4
+
+def test_spilled_runs_stay_exact(tmp_path):
+    # A 32-byte budget holds 4 hashes, so most of these batches end up on disk
+    index = RowHashIndex(memory_budget_bytes=32, spill_dir=str(tmp_path))
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 2**63, size=200, dtype=np.uint64)
+    batches = np.array_split(np.concatenate([values, values[::3]]), 25)
+
+    kept = np.concatenate([batch[index.filter_new(batch)] for batch in batches])
+
+    assert index._runs, "Expected the index to spill sorted runs to disk"
+    assert sorted(kept.tolist()) == sorted(values.tolist())
+    assert index.hits == len(values[::3])
+
+    index.close()
+    assert os.listdir(tmp_path) == [], "Spilled runs should be deleted on close"
+
+def test_journal_rebuilds_the_index_up_to_its_committed_length(tmp_path):
+    journal = str(tmp_path / 'hashes.u64')
+    index = RowHashIndex(journal_file=journal)
+    index.filter_new(np.array([5, 3, 5], dtype=np.uint64))
+    committed = index.journal_length
+    index.filter_new(np.array([8], dtype=np.uint64))  # Recorded after the checkpoint
+    index.close()
+
+    restored = RowHashIndex(journal_file=journal, journal_length=committed)
+
+    assert restored.filter_new(np.array([3, 5, 8], dtype=np.uint64)).tolist() == [False, False, True]
+    assert restored.journal_length == committed + 1
+    restored.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import watch_files
+from file_watcher import DirectoryWatcher, watch
+
+def test_file_is_ready_once_it_stops_changing(tmp_path):
+    now = [0.0]
+    watcher = DirectoryWatcher([str(tmp_path)], settle_seconds=2, clock=lambda: now[0])
+    path = tmp_path / 'loans.csv'
+    path.write_text('Id,Books\n1,Dune\n')
+
+    assert watcher.poll() == []  # Just seen
+    now[0] = 1.0
+    with open(path, 'a') as f:
+        f.write('2,Emma\n')  # Still being written
+    assert watcher.poll() == []
+    now[0] = 2.5
+    assert watcher.poll() == []  # Unchanged for only 1.5s
+    now[0] = 3.0
+    assert watcher.poll() == [str(path)]
+    now[0] = 10.0
+    assert watcher.poll() == []  # Reported once until it changes
+
+def test_full_queue_holds_the_watcher_back(tmp_path):
+    for i in range(6):
+        (tmp_path / f'file{i}.csv').write_text('Id\n1\n')
+    stop = threading.Event()
+    batches = []
+
+    def handle(batch):
+        batches.append(batch)
+        if sum(len(batch) for batch in batches) == 6:
+            stop.set()
+        time.sleep(0.05)
+
+    watch(handle, [str(tmp_path)], poll_seconds=0.01, settle_seconds=0, queue_size=2, batch_size=2, stop=stop)
+
+    assert sorted(entry['path'] for batch in batches for entry in batch) == \
+        sorted(str(tmp_path / f'file{i}.csv') for i in range(6))
+    assert max(entry['queue_depth'] for batch in batches for entry in batch) <= 2
+
+def test_watch_files_cleans_files_as_they_land(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+    stop = threading.Event()
+    daemon = threading.Thread(target=watch_files, args=(connection_string, [str(inbox)]),
+                              kwargs={'poll_seconds': 0.05, 'settle_seconds': 0.1, 'stop': stop})
+    daemon.start()
+    try:
+        (inbox / 'loans.csv').write_text('Id,Books\n1,Dune\n1,Dune\n2,Emma\n')
+        deadline = time.monotonic() + 20
+        while not (tmp_path / 'Cleaned_Data' / 'loans_cleaned.csv').exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        daemon.join()
+
+    engine = create_engine(connection_string)
+    assert len(pd.read_sql_table('loans_cleaned', engine)) == 2
+    queue_metrics = pd.read_sql_table('data_cleaning_queue_metrics', engine)
+    assert queue_metrics['file_name'].tolist() == [str(inbox / 'loans.csv')]
+    assert queue_metrics['status'].tolist() == ['cleaned']
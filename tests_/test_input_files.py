@@ -0,0 +1,69 @@
+import bz2
+import gzip
+import os
+import pytest
+import pandas as pd
+from csv_ingest import read_csv_chunks
+from input_files import check_unique_base_names, find_csv_files, input_base_name, input_compression
+
+CSV = 'Customer ID,Customer Name\n1,Jane Doe\n2,John Smith\n3,Dan Reeves\n'
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('exports/2023/04')
+    os.makedirs('Cleaned_Data')
+    with open('plain.csv', 'w') as f:
+        f.write(CSV)
+    with gzip.open('exports/2023/04/customers.csv.gz', 'wt') as f:
+        f.write(CSV)
+    with bz2.open('exports/loans.csv.bz2', 'wt') as f:
+        f.write(CSV)
+    with open('exports/notes.txt', 'w') as f:
+        f.write('not a csv')
+    with open('Cleaned_Data/plain_cleaned.csv', 'w') as f:
+        f.write(CSV)
+    return tmp_path
+
+def test_find_csv_files_expands_directories_and_globs(exports):
+    assert find_csv_files() == ['plain.csv']
+    assert find_csv_files(['exports']) == [os.path.join('exports', '2023', '04', 'customers.csv.gz'),
+                                           os.path.join('exports', 'loans.csv.bz2')]
+    assert find_csv_files(['**/*.csv.gz', 'plain.csv']) == [os.path.join('exports', '2023', '04', 'customers.csv.gz'),
+                                                             'plain.csv']
+    assert find_csv_files(['.']) == sorted([os.path.join('exports', '2023', '04', 'customers.csv.gz'),
+                                            os.path.join('exports', 'loans.csv.bz2'), 'plain.csv'])
+
+def test_inputs_sharing_a_base_name_are_rejected():
+    check_unique_base_names(['jan/Systembook.csv', 'jan/Customers.csv'])
+    with pytest.raises(ValueError, match='Systembook'):
+        check_unique_base_names(['jan/Systembook.csv', 'feb/Systembook.csv'])
+    with pytest.raises(ValueError, match='Systembook'):
+        check_unique_base_names(['Systembook.csv.gz'], others=['Systembook.csv', 'Customers.csv'])
+    check_unique_base_names(['Customers.csv'], others=['Systembook.csv', 'Systembook.csv.gz'])
+
+def test_compressed_names():
+    assert input_base_name('exports/Systembook.csv.gz') == 'Systembook'
+    assert input_compression('exports/Systembook.csv.zst') == 'zstd'
+    assert input_compression('Systembook.csv') is None
+
+@pytest.mark.parametrize('csv_engine', ['c', 'pyarrow'])
+@pytest.mark.parametrize('path', ['plain.csv', 'exports/2023/04/customers.csv.gz', 'exports/loans.csv.bz2'])
+def test_compressed_and_mapped_reads_match(exports, path, csv_engine):
+    if csv_engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+
+    chunks = list(read_csv_chunks(path, chunksize=2, csv_engine=csv_engine))
+
+    assert pd.concat(chunks)['Customer ID'].tolist() == [1, 2, 3]
+
+def test_cleanse_data_names_outputs_after_the_uncompressed_file(exports):
+    from sqlalchemy import create_engine
+    from clean_data import cleanse_data
+    engine = create_engine(f"sqlite:///{exports / 'test.db'}")
+
+    metrics = cleanse_data('exports/2023/04/customers.csv.gz', engine, chunksize=2)
+
+    assert metrics['rows_processed'] == 3
+    assert pd.read_csv('Cleaned_Data/customers_cleaned.csv')['customer id'].tolist() == [1, 2, 3]
+    assert pd.read_sql_table('customers_cleaned', engine)['customer id'].tolist() == [1, 2, 3]
@@ -0,0 +1,110 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+from cleaning_rules import DEFAULT_RULES
+
+HEADER = 'Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID'
+LOANS = ['1,Dune,13/04/2023,25/04/2023,2 weeks,5',
+         '2,IT,02/05/2023,30/05/2023,2 weeks,6',
+         '3,Dune,20/04/2023,28/04/2023,1 week,5',
+         '4,Emma,20/04/2023,,2 weeks,7',
+         '5,IT,09/05/2023,19/05/2023,2 weeks,']
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cleanse_data writes to ./Cleaned_Data
+    return create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+def write_loans(path, rows):
+    path.write_text('\n'.join([HEADER] + rows) + '\n')
+
+def recomputed(engine, keys):
+    # The aggregates as a full scan of the cleaned table would give them
+    loans = pd.read_sql_table('loans_cleaned', engine)
+    loans['checkout_month'] = loans['book checkout'].dt.strftime('%Y-%m').fillna('unknown')
+    loans['returned_loans'] = loans['loan_duration'].notna()
+    loans['late_returns'] = loans['overdue_days'] > 0
+    grouped = loans.groupby(keys + ['checkout_month']).agg(
+        loans=('id', 'size'), returned_loans=('returned_loans', 'sum'), loan_days=('loan_duration', 'sum'),
+        late_returns=('late_returns', 'sum'), overdue_days=('overdue_days', 'sum'))
+    return grouped.astype('float64').sort_index()
+
+def stored(engine, table, keys):
+    rows = pd.read_sql_table(table, engine).set_index(keys + ['checkout_month'])
+    return rows.drop(columns='avg_loan_days').astype('float64').sort_index()
+
+def assert_aggregates_current(engine):
+    for table, keys in (('loans_loans_by_month', []), ('loans_loans_by_customer', ['customer id']),
+                        ('loans_loans_by_book', ['books'])):
+        pd.testing.assert_frame_equal(stored(engine, table, keys), recomputed(engine, keys), check_names=False)
+
+def test_aggregates_built_while_cleaning(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', LOANS)
+
+    # Keep the loans not yet returned and those without a customer
+    rules = {**DEFAULT_RULES, 'null_policy': 'drop_required', 'required': ['id']}
+    cleanse_data('loans.csv', engine, chunksize=2, rules=rules, aggregate_loans=True)
+
+    assert_aggregates_current(engine)
+    by_month = pd.read_sql_table('loans_loans_by_month', engine).set_index('checkout_month')
+    assert by_month.loc['2023-04', 'loans'] == 3 and by_month.loc['2023-04', 'returned_loans'] == 2
+    assert by_month.loc['2023-04', 'avg_loan_days'] == 10.0
+    assert by_month.loc['2023-05', 'late_returns'] == 1  # Returned after 28 days of a 2 week loan
+    by_customer = pd.read_sql_table('loans_loans_by_customer', engine)
+    assert by_customer['loans'].sum() == 4  # Loan 5 has no customer
+
+    # A plain rerun replaces the table, and the aggregates with it
+    cleanse_data('loans.csv', engine, aggregate_loans=True)
+    assert_aggregates_current(engine)
+
+def test_partitioned_rerun_merges_only_its_months(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', LOANS)
+    cleanse_data('loans.csv', engine, partition_by_month=True, aggregate_loans=True)
+
+    write_loans(tmp_path / 'loans.csv', ['6,Misery,03/05/2023,10/05/2023,2 weeks,7',
+                                         '7,Dune,09/05/2023,29/05/2023,2 weeks,5'])
+    cleanse_data('loans.csv', engine, chunksize=1, partition_by_month=True, aggregate_loans=True)
+
+    assert_aggregates_current(engine)
+    by_book = pd.read_sql_table('loans_loans_by_book', engine)
+    assert 'it' not in by_book['books'].tolist()  # Only borrowed in the May loans that were replaced
+
+def test_upsert_takes_off_the_rows_it_overwrites(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', LOANS)
+    rules = {**DEFAULT_RULES, 'null_policy': 'drop_required', 'required': ['id']}  # Keep loan 4, not yet returned
+    cleanse_data('loans.csv', engine, load_mode='upsert', rules=rules, aggregate_loans=True)
+
+    # Loan 4 is returned late (its return date goes from NULL to a date) and loan 1 moves to another customer
+    write_loans(tmp_path / 'loans.csv', ['4,Emma,20/04/2023,29/05/2023,2 weeks,7',
+                                         '1,Dune,13/04/2023,25/04/2023,2 weeks,6',
+                                         '8,Emma,01/06/2023,03/06/2023,2 weeks,7'])
+    cleanse_data('loans.csv', engine, load_mode='upsert', rules=rules, aggregate_loans=True)
+
+    assert_aggregates_current(engine)
+    by_customer = pd.read_sql_table('loans_loans_by_customer', engine).set_index(['customer id', 'checkout_month'])
+    assert by_customer.loc[(5.0, '2023-04'), 'loans'] == 1
+    by_month = pd.read_sql_table('loans_loans_by_month', engine).set_index('checkout_month')
+    assert by_month.loc['2023-04', 'returned_loans'] == 3 and by_month.loc['2023-04', 'late_returns'] == 2
+
+def test_aggregates_turned_on_for_a_loaded_table_count_its_rows(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', LOANS)
+    rules = {**DEFAULT_RULES, 'null_policy': 'drop_required', 'required': ['id']}
+    cleanse_data('loans.csv', engine, load_mode='upsert', rules=rules)
+
+    cleanse_data('loans.csv', engine, load_mode='upsert', rules=rules, aggregate_loans=True)
+
+    assert_aggregates_current(engine)
+    by_month = pd.read_sql_table('loans_loans_by_month', engine)
+    assert by_month['loans'].sum() == 5
+
+def test_aggregates_turned_on_for_a_partitioned_table_keep_its_other_months(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', LOANS)
+    cleanse_data('loans.csv', engine, partition_by_month=True)
+
+    write_loans(tmp_path / 'loans.csv', ['6,Misery,03/05/2023,10/05/2023,2 weeks,7'])
+    cleanse_data('loans.csv', engine, partition_by_month=True, aggregate_loans=True)
+
+    assert_aggregates_current(engine)
+    by_month = pd.read_sql_table('loans_loans_by_month', engine).set_index('checkout_month')
+    assert by_month.loc['2023-04', 'loans'] > 0 and by_month.loc['2023-05', 'loans'] == 1
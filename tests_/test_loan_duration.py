@@ -67,6 +67,28 @@ class TestLoanDuration(unittest.TestCase):
         # Ensure that the loan_duration is >= 0 after cleaning
         self.assertTrue((enriched_df['loan_duration'] >= 0).all(), "Loan duration should be non-negative after cleaning.")
 
+    def test_negative_interval_is_flagged(self):
+        data = {
+            'book checkout': pd.to_datetime(['2023-10-10', '2023-10-01']),
+            'book returned': pd.to_datetime(['2023-10-05', '2023-10-03'])
+        }
+        enriched_df = enrich_date_duration(pd.DataFrame(data), 'book returned', 'book checkout')
+
+        self.assertEqual(enriched_df['loan_negative'].tolist(), [True, False])
+        self.assertEqual(enriched_df['loan_duration'].tolist(), [0, 2])
+
+    def test_overdue_days_from_days_allowed(self):
+        data = {
+            'book checkout': pd.to_datetime(['2023-10-01', '2023-10-01', '2023-10-01', '2023-10-01']),
+            'book returned': pd.to_datetime(['2023-10-20', '2023-10-10', '2023-10-20', '2023-10-20']),
+            'days allowed to borrow': ['2 weeks', '2 weeks', '10 days', 'until further notice']
+        }
+        enriched_df = enrich_date_duration(pd.DataFrame(data), 'book returned', 'book checkout')
+
+        self.assertEqual(enriched_df['allowed_days'].tolist()[:3], [14.0, 14.0, 10.0])
+        self.assertEqual(enriched_df['overdue_days'].tolist()[:3], [5.0, 0.0, 9.0])
+        self.assertTrue(pd.isna(enriched_df['overdue_days'].iloc[3]), "Unknown periods should not be treated as overdue")
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from clean_data import create_sql_engine, process_files
+from metrics_store import MetricsBuffer, create_metrics_table
+
+def test_buffer_writes_once_batch_is_full_and_on_exit():
+    engine = create_sql_engine('sqlite://')
+    with MetricsBuffer(engine, batch_size=3) as buffer:
+        buffer.add_metrics({'rows_processed': np.int64(4), 'status': 'cleaned', 'extra': 1}, 'a.csv')
+        buffer.add_stages([{'stage': 'read', 'rows_in': 4, 'rows_out': 4}], 'a.csv', datetime(2024, 1, 1))
+        assert len(buffer) == 2  # Nothing written yet
+        buffer.add_metrics({'rows_processed': 2, 'status': 'skipped'}, 'b.csv')
+        assert len(buffer) == 0
+        buffer.add_metrics({'rows_processed': 1, 'status': 'cleaned'}, 'c.csv')
+
+    metrics = pd.read_sql_table('data_cleaning_metrics', engine)
+    assert metrics['file_name'].tolist() == ['a.csv', 'b.csv', 'c.csv']
+    assert metrics['rows_processed'].tolist() == [4, 2, 1]
+    assert pd.read_sql_table('data_cleaning_stage_metrics', engine)['stage'].tolist() == ['read']
+
+def test_worker_rows_are_collected_by_the_parent():
+    worker = MetricsBuffer()
+    worker.add_metrics({'rows_processed': 1}, 'a.csv')
+    engine = create_sql_engine('sqlite://')
+    with MetricsBuffer(engine) as parent:
+        parent.add_rows(worker.take())
+
+    assert len(worker) == 0
+    assert pd.read_sql_table('data_cleaning_metrics', engine)['file_name'].tolist() == ['a.csv']
+
+def test_process_files_flushes_metrics_in_batches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    csv_files = []
+    for i in range(5):
+        (tmp_path / f'customers_{i}.csv').write_text(f'Customer ID,Customer Name\n{i},Jane Doe\n')
+        csv_files.append(f'customers_{i}.csv')
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+
+    process_files(csv_files, connection_string, metrics_batch_size=4, pool_size=2)
+
+    metrics = pd.read_sql_table('data_cleaning_metrics', create_engine(connection_string))
+    assert sorted(metrics['file_name']) == csv_files
+
+def test_columns_missing_from_a_table_created_by_hand_are_added():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        # The table as the README first told deployments to create it
+        connection.execute(text("CREATE TABLE data_cleaning_metrics (file_name VARCHAR(255), rows_processed INT, "
+                                "rows_removed INT, rows_modified INT, processing_time_seconds FLOAT)"))
+        connection.execute(text("INSERT INTO data_cleaning_metrics VALUES ('old.csv', 1, 0, 0, 0.5)"))
+
+    create_metrics_table(engine)
+    with MetricsBuffer(engine) as buffer:
+        buffer.add_metrics({'rows_processed': 3, 'orphan_loans': 1, 'status': 'cleaned'}, 'new.csv')
+
+    metrics = pd.read_sql_table('data_cleaning_metrics', engine)
+    assert metrics['file_name'].tolist() == ['old.csv', 'new.csv']
+    assert metrics['orphan_loans'].tolist()[1] == 1 and metrics['status'].tolist()[1] == 'cleaned'
@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+from output_writers import open_output_writers
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+@pytest.fixture
+def chunks():
+    return [
+        pd.DataFrame({'id': pd.Series([], dtype='float64'), 'book checkout': pd.Series([], dtype='datetime64[ns]')}),
+        pd.DataFrame({'id': [1.0, 2.0], 'book checkout': pd.to_datetime(['2023-02-20', '2023-03-24'])}),
+        pd.DataFrame({'id': [3.0], 'book checkout': pd.to_datetime(['2023-04-02'])}),
+    ]
+
+def test_parquet_streams_chunks_as_row_groups(tmp_path, chunks):
+    writer, = open_output_writers(str(tmp_path / 'loans'), ['parquet'], compression='zstd', row_group_size=1)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+    parquet_file = pq.ParquetFile(tmp_path / 'loans.parquet')
+    assert parquet_file.metadata.num_row_groups == 3
+    df = pd.read_parquet(tmp_path / 'loans.parquet')
+    assert df['id'].tolist() == [1.0, 2.0, 3.0]
+    assert pd.api.types.is_datetime64_any_dtype(df['book checkout'])
+
+def test_arrow_ipc_round_trips(tmp_path, chunks):
+    writer, = open_output_writers(str(tmp_path / 'loans'), ['arrow'], compression='lz4')
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+    table = pa.ipc.open_file(str(tmp_path / 'loans.arrow')).read_all()
+    assert table.column('id').to_pylist() == [1.0, 2.0, 3.0]
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_column_empty_in_the_first_chunk_becomes_text(tmp_path, output_format):
+    writer, = open_output_writers(str(tmp_path / 'loans'), [output_format], row_group_size=1)
+    writer.write(pd.DataFrame({'id': [1, 2], 'notes': [float('nan'), float('nan')]}))  # Read as float64
+    writer.write(pd.DataFrame({'id': [3], 'notes': ['late']}))
+    writer.write(pd.DataFrame({'id': [4], 'notes': [float('nan')]}))
+    writer.close()
+
+    path = tmp_path / f'loans.{output_format}'
+    table = pq.read_table(path) if output_format == 'parquet' else pa.ipc.open_file(str(path)).read_all()
+    assert table.column('id').to_pylist() == [1, 2, 3, 4]
+    assert table.column('notes').to_pylist() == [None, None, 'late', None]
+    assert not (tmp_path / f'loans.{output_format}.earlier').exists()
+
+def test_cleanse_data_writes_every_requested_format(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n2,John Smith\n,\n')
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    cleanse_data('customers.csv', engine, chunksize=2, output_formats=['csv', 'parquet', 'arrow'])
+
+    csv_rows = pd.read_csv('Cleaned_Data/customers_cleaned.csv')
+    parquet_rows = pd.read_parquet('Cleaned_Data/customers_cleaned.parquet')
+    arrow_rows = pd.read_feather('Cleaned_Data/customers_cleaned.arrow')
+    assert len(csv_rows) == len(parquet_rows) == len(arrow_rows) == 2
@@ -0,0 +1,74 @@
+import os
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, inspect as sa_inspect
+from clean_data import cleanse_data
+
+HEADER = 'Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID'
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cleanse_data writes to ./Cleaned_Data
+    return create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+def write_loans(path, rows):
+    path.write_text('\n'.join([HEADER] + rows) + '\n')
+
+def test_output_is_split_by_checkout_month(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', ['1,Dune,13/04/2023,25/04/2023,2 weeks,5',
+                                         '2,IT,02/05/2023,13/05/2023,2 weeks,6',
+                                         '3,Emma,20/04/2023,28/04/2023,2 weeks,7'])
+
+    cleanse_data('loans.csv', engine, chunksize=2, partition_by_month=True)
+
+    root = os.path.join('Cleaned_Data', 'loans_cleaned.csv')
+    assert sorted(os.listdir(root)) == ['checkout_month=2023-04', 'checkout_month=2023-05']
+    april = pd.read_csv(os.path.join(root, 'checkout_month=2023-04', 'part.csv'))
+    assert april['id'].tolist() == [1, 3]
+    assert 'checkout_month' not in april.columns  # Given by the directory name
+
+    table = pd.read_sql_table('loans_cleaned', engine)
+    assert table.sort_values('id')['checkout_month'].tolist() == ['2023-04', '2023-05', '2023-04']
+    assert 'ix_loans_cleaned_checkout_month' in [index['name'] for index in sa_inspect(engine).get_indexes('loans_cleaned')]
+
+def test_rerun_replaces_only_its_months(tmp_path, engine):
+    write_loans(tmp_path / 'loans.csv', ['1,Dune,13/04/2023,25/04/2023,2 weeks,5',
+                                         '2,IT,02/05/2023,13/05/2023,2 weeks,6'])
+    cleanse_data('loans.csv', engine, partition_by_month=True)
+
+    # The May loans are revised; April is not in the new file and must be kept
+    write_loans(tmp_path / 'loans.csv', ['4,Misery,03/05/2023,10/05/2023,2 weeks,7',
+                                         '5,Catch 22,09/05/2023,19/05/2023,2 weeks,8'])
+    cleanse_data('loans.csv', engine, chunksize=1, partition_by_month=True)
+
+    table = pd.read_sql_table('loans_cleaned', engine)
+    assert sorted(table['id'].tolist()) == [1, 4, 5]
+    may = pd.read_csv(os.path.join('Cleaned_Data', 'loans_cleaned.csv', 'checkout_month=2023-05', 'part.csv'))
+    assert may['id'].tolist() == [4, 5]
+    assert os.path.exists(os.path.join('Cleaned_Data', 'loans_cleaned.csv', 'checkout_month=2023-04', 'part.csv'))
+
+def test_parquet_partitions_can_be_pruned(tmp_path, engine):
+    pytest.importorskip('pyarrow')
+    write_loans(tmp_path / 'loans.csv', ['1,Dune,13/04/2023,25/04/2023,2 weeks,5',
+                                         '2,IT,02/05/2023,13/05/2023,2 weeks,6'])
+
+    cleanse_data('loans.csv', engine, output_formats=('parquet',), partition_by_month=True)
+
+    may = pd.read_parquet(os.path.join('Cleaned_Data', 'loans_cleaned.parquet'),
+                          filters=[('checkout_month', '=', '2023-05')])
+    assert may['id'].tolist() == [2]
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_unpartitioned_rerun_replaces_the_partition_directory(tmp_path, engine, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    write_loans(tmp_path / 'loans.csv', ['1,Dune,13/04/2023,25/04/2023,2 weeks,5',
+                                         '2,IT,02/05/2023,13/05/2023,2 weeks,6'])
+    cleanse_data('loans.csv', engine, output_formats=(output_format,), partition_by_month=True)
+
+    cleanse_data('loans.csv', engine, output_formats=(output_format,))
+
+    path = os.path.join('Cleaned_Data', f'loans_cleaned.{output_format}')
+    assert os.path.isfile(path)
+    cleaned = pd.read_csv(path) if output_format == 'csv' else pd.read_parquet(path)
+    assert cleaned['id'].tolist() == [1, 2]
@@ -0,0 +1,54 @@
+import time
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+from pipelined_io import run_pipelined
+
+def test_items_reach_sink_in_order():
+    loaded = []
+    run_pipelined(range(20), lambda item: item * 2, loaded.append, depth=2)
+
+    assert loaded == [item * 2 for item in range(20)]
+
+def test_error_in_sink_stops_the_reader():
+    read = []
+
+    def source():
+        for item in range(1000):
+            read.append(item)
+            yield item
+
+    def sink(item):
+        if item == 3:
+            raise ValueError("load failed")
+
+    with pytest.raises(ValueError, match="load failed"):
+        run_pipelined(source(), lambda item: item, sink, depth=2)
+    assert len(read) < 1000  # Backpressure kept the reader from running ahead
+
+def test_stages_overlap():
+    def slow(item):
+        time.sleep(0.05)
+        return item
+
+    start = time.perf_counter()
+    run_pipelined((slow(item) for item in range(6)), slow, slow, depth=1)
+    assert time.perf_counter() - start < 6 * 3 * 0.05
+
+def test_pipelined_cleanse_matches_sequential(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = ['Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID']
+    rows += [f'{i % 40},Book {i % 40},13/04/2023,25/04/2023,2 weeks,{i % 40 % 7}' for i in range(100)]
+    (tmp_path / 'loans.csv').write_text('\n'.join(rows) + '\n')
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    sequential = cleanse_data('loans.csv', engine, chunksize=15)
+    sequential_rows = pd.read_sql_table('loans_cleaned', engine)
+    pipelined = cleanse_data('loans.csv', engine, chunksize=15, pipeline_depth=2)
+    pipelined_rows = pd.read_sql_table('loans_cleaned', engine)
+
+    for key in ('rows_processed', 'rows_removed', 'rows_modified'):
+        assert pipelined[key] == sequential[key]
+    assert pipelined_rows['id'].tolist() == sequential_rows['id'].tolist()
+    assert len(pipelined_rows) == 40
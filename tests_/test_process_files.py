@@ -0,0 +1,73 @@
+import os
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import process_files
+
+# Fixture writing two valid CSVs and one that cannot be parsed
+@pytest.fixture
+def csv_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cleanse_data writes to ./Cleaned_Data
+    (tmp_path / 'customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n2,John Smith\n,\n')
+    (tmp_path / 'more_customers.csv').write_text('Customer ID,Customer Name\n3,Dan Reeves\n3,Dan Reeves\n')
+    (tmp_path / 'empty.csv').write_text('')  # pandas raises EmptyDataError for this one
+    return ['customers.csv', 'more_customers.csv', 'empty.csv']
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failed_file_does_not_stop_the_others(csv_files, tmp_path, workers):
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+
+    results = process_files(csv_files, connection_string, workers=workers)
+
+    assert results['empty.csv'] is None
+    assert results['customers.csv']['rows_removed'] == 1
+    assert results['more_customers.csv']['rows_removed'] == 1
+
+    # Each successful file still writes its own row of metrics
+    metrics = pd.read_sql_table('data_cleaning_metrics', create_engine(connection_string))
+    assert sorted(metrics['file_name']) == ['customers.csv', 'more_customers.csv']
+
+def test_unchanged_files_are_skipped_until_changed_or_forced(csv_files, tmp_path):
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+    valid_files = csv_files[:2]
+
+    first = process_files(valid_files, connection_string)
+    second = process_files(valid_files, connection_string)
+    assert all(metrics['status'] == 'cleaned' for metrics in first.values())
+    assert all(metrics['status'] == 'skipped' for metrics in second.values())
+
+    # Touching a file without changing its contents still skips it
+    os.utime('customers.csv', (0, 0))
+    assert process_files(['customers.csv'], connection_string)['customers.csv']['status'] == 'skipped'
+
+    # Changing the contents, or passing force, cleans it again
+    with open('customers.csv', 'a') as f:
+        f.write('4,Emory Ted\n')
+    assert process_files(['customers.csv'], connection_string)['customers.csv']['status'] == 'cleaned'
+    assert process_files(['customers.csv'], connection_string, force=True)['customers.csv']['status'] == 'cleaned'
+
+    metrics = pd.read_sql_table('data_cleaning_metrics', create_engine(connection_string))
+    assert metrics['status'].tolist().count('skipped') == 3
+
+def test_unchanged_file_is_cleaned_again_with_new_output_options(csv_files, tmp_path):
+    connection_string = f"sqlite:///{tmp_path / 'test.db'}"
+    process_files(['customers.csv'], connection_string)
+
+    # Defaults given explicitly are the same options
+    assert process_files(['customers.csv'], connection_string,
+                         load_mode='replace')['customers.csv']['status'] == 'skipped'
+    assert process_files(['customers.csv'], connection_string,
+                         load_mode='upsert')['customers.csv']['status'] == 'cleaned'
+    assert process_files(['customers.csv'], connection_string,
+                         load_mode='upsert', pipeline_depth=2)['customers.csv']['status'] == 'skipped'
+
+def test_files_sharing_a_base_name_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for month in ('jan', 'feb'):
+        (tmp_path / month).mkdir()
+        (tmp_path / month / 'customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n')
+
+    with pytest.raises(ValueError, match='customers'):
+        process_files([os.path.join('jan', 'customers.csv'), os.path.join('feb', 'customers.csv')],
+                      f"sqlite:///{tmp_path / 'test.db'}")
+    assert not (tmp_path / 'Cleaned_Data' / 'customers_cleaned.csv').exists()
@@ -0,0 +1,112 @@
+import pytest
+import pandas as pd
+from datetime import date
+from sqlalchemy import create_engine
+import clean_data
+import run_checkpoint
+from clean_data import cleanse_data
+from cleaning_rules import DEFAULT_RULES
+from run_checkpoint import RunCheckpoint
+
+@pytest.fixture
+def loans_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = ['Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID']
+    rows += [f'{i % 70},Book {i % 70},"""{i % 28 + 1:02d}/0{i % 3 + 4}/2023""",30/06/2023,2 weeks,{i % 70 % 9}'
+             for i in range(120)]
+    (tmp_path / 'loans.csv').write_text('\n'.join(rows) + '\n')
+    return 'loans.csv'
+
+def fail_on_call(monkeypatch, module, name, call):
+    original = getattr(module, name)
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == call:
+            raise RuntimeError("process died")
+        return original(*args, **kwargs)
+    monkeypatch.setattr(module, name, failing)
+
+@pytest.mark.parametrize('options', [{'chunksize': 15}, {'range_workers': 2, 'range_mb': 0.0004},
+                                     {'chunksize': 15, 'partition_by_month': True}])
+def test_rerun_resumes_after_the_last_committed_chunk(loans_csv, tmp_path, monkeypatch, options):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    expected = cleanse_data(loans_csv, engine, **options)
+    expected_rows = pd.read_sql_table('loans_cleaned', engine)
+
+    with monkeypatch.context() as patch:
+        fail_on_call(patch, clean_data, 'clean_chunk', 4)
+        fail_on_call(patch, clean_data, 'take_handoff', 4)
+        with pytest.raises(RuntimeError):
+            cleanse_data(loans_csv, engine, resumable=True, **options)
+
+    read = []
+    with monkeypatch.context() as patch:
+        original = clean_data.read_csv_chunks
+        patch.setattr(clean_data, 'read_csv_chunks',
+                      lambda *args, **kwargs: read.append(kwargs['skip_rows']) or original(*args, **kwargs))
+        resumed = cleanse_data(loans_csv, engine, resumable=True, **options)
+
+    assert 'range_workers' in options or read == [45]  # Three chunks were committed before the failure
+    for key in ('rows_processed', 'rows_removed', 'rows_modified', 'dates_coerced'):
+        assert resumed[key] == expected[key]
+    resumed_rows = pd.read_sql_table('loans_cleaned', engine)
+    sort = ['id', 'book checkout']
+    pd.testing.assert_frame_equal(resumed_rows.sort_values(sort, ignore_index=True),
+                                  expected_rows.sort_values(sort, ignore_index=True))
+    if 'partition_by_month' not in options:
+        assert len(pd.read_csv('Cleaned_Data/loans_cleaned.csv')) == len(expected_rows)
+    assert not list((tmp_path / 'Cleaned_Data' / 'checkpoints').glob('loans_*.json'))
+
+def test_chunk_committed_after_the_checkpoint_is_not_loaded_twice(loans_csv, tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    cleanse_data(loans_csv, engine, chunksize=15)
+    expected_rows = pd.read_sql_table('loans_cleaned', engine)
+
+    with monkeypatch.context() as patch:
+        # Dies once the third chunk is in SQL but before its checkpoint is saved
+        fail_on_call(patch, run_checkpoint.RunCheckpoint, 'save', 3)
+        with pytest.raises(RuntimeError):
+            cleanse_data(loans_csv, engine, chunksize=15, resumable=True)
+    cleanse_data(loans_csv, engine, chunksize=15, resumable=True)
+
+    assert len(pd.read_sql_table('loans_cleaned', engine)) == len(expected_rows)
+    assert len(pd.read_csv('Cleaned_Data/loans_cleaned.csv')) == len(expected_rows)
+
+def test_rules_holding_dates_can_be_checkpointed(loans_csv, tmp_path, monkeypatch, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    # A YAML rules file gives min: 2023-04-01 as a date
+    columns = {**DEFAULT_RULES['columns'],
+               'book checkout': {**DEFAULT_RULES['columns']['book checkout'], 'min': date(2023, 4, 1)}}
+    rules = {**DEFAULT_RULES, 'columns': columns}
+    expected = cleanse_data(loans_csv, engine, chunksize=15, rules=rules)
+
+    with monkeypatch.context() as patch:
+        fail_on_call(patch, clean_data, 'clean_chunk', 4)
+        with pytest.raises(RuntimeError):
+            cleanse_data(loans_csv, engine, chunksize=15, rules=rules, resumable=True)
+    capsys.readouterr()
+    resumed = cleanse_data(loans_csv, engine, chunksize=15, rules=rules, resumable=True)
+
+    assert 'Resuming loans.csv after 3 chunks' in capsys.readouterr().out
+    assert resumed['rows_processed'] == expected['rows_processed']
+
+def test_changed_file_starts_over(loans_csv, tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with monkeypatch.context() as patch:
+        fail_on_call(patch, clean_data, 'clean_chunk', 3)
+        with pytest.raises(RuntimeError):
+            cleanse_data(loans_csv, engine, chunksize=15, resumable=True)
+    with open(loans_csv, 'a') as f:
+        f.write('500,New book,"""01/05/2023""",30/06/2023,2 weeks,3\n')
+
+    metrics = cleanse_data(loans_csv, engine, chunksize=15, resumable=True)
+
+    assert metrics['rows_processed'] == 121
+
+def test_checkpoints_of_files_with_the_same_name_are_kept_apart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    january, february = RunCheckpoint('jan/loans.csv', {}), RunCheckpoint('feb/loans.csv', {})
+
+    assert january.state_file != february.state_file and january.hashes_file != february.hashes_file
@@ -0,0 +1,83 @@
+import pytest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, inspect as sa_inspect
+from clean_data import insert_data_to_sql, upsert_data_to_sql
+
+# Fixture with the column types cleanse_data produces, including NaN and NaT
+@pytest.fixture
+def cleaned_df():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, 5],
+        'books': ['Dune', 'IT', 'Emma', 'Misery', 'Catch 22'],
+        'book checkout': pd.to_datetime(['2023-04-02', '2023-04-10', None, '2023-04-15', '2023-04-20']),
+        'customer id': [5.0, 6.0, np.nan, 7.0, 7.0],
+    })
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+@pytest.mark.parametrize('load_method', ['executemany', 'multi', 'to_sql'])
+def test_load_methods_write_the_same_rows(cleaned_df, engine, load_method):
+    rows_per_second = insert_data_to_sql(cleaned_df.copy(), 'loans', engine, load_method=load_method, batch_size=2)
+
+    table = pd.read_sql_table('loans_cleaned', engine)
+    assert rows_per_second >= 0
+    assert table['id'].tolist() == [1, 2, 3, 4, 5]
+    assert table['books'].tolist() == cleaned_df['books'].tolist()
+    assert table['book checkout'].isna().tolist() == [False, False, True, False, False]
+    assert table['customer id'].isna().sum() == 1
+
+def test_multi_row_inserts_stay_within_1000_rows(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement)
+                 if statement.startswith('INSERT') else None)
+
+    # One column fits 2000 rows under the parameter limit, but a VALUES list holds at most 1000
+    insert_data_to_sql(pd.DataFrame({'id': range(2500)}), 'ids', engine, load_method='multi')
+
+    assert len(statements) == 3
+    assert len(pd.read_sql_table('ids_cleaned', engine)) == 2500
+
+def test_append_adds_to_existing_table(cleaned_df, engine):
+    insert_data_to_sql(cleaned_df.iloc[:2].copy(), 'loans', engine)
+    insert_data_to_sql(cleaned_df.iloc[2:].copy(), 'loans', engine, if_exists='append')
+
+    assert len(pd.read_sql_table('loans_cleaned', engine)) == 5
+
+def test_unknown_load_method_is_rejected(cleaned_df, engine):
+    with pytest.raises(ValueError):
+        insert_data_to_sql(cleaned_df.copy(), 'loans', engine, load_method='bcp')
+
+def test_upsert_inserts_new_and_updates_changed_rows_only(cleaned_df, engine):
+    first = upsert_data_to_sql(cleaned_df.iloc[:3].copy(), 'loans', engine)
+    assert first == {'rows_inserted': 3, 'rows_updated': 0}
+
+    # Row 2 changes, row 3 is unchanged (including its NaT/NaN), rows 4 and 5 are new
+    delta = cleaned_df.copy()
+    delta.loc[1, 'books'] = 'It (2nd edition)'
+    second = upsert_data_to_sql(delta, 'loans', engine)
+    assert second == {'rows_inserted': 2, 'rows_updated': 1}
+
+    table = pd.read_sql_table('loans_cleaned', engine).sort_values('id')
+    assert table['id'].tolist() == [1, 2, 3, 4, 5]
+    assert table['books'].tolist()[1] == 'It (2nd edition)'
+    assert not sa_inspect(engine).has_table('loans_cleaned_staging')
+
+def test_upsert_falls_back_to_next_key(engine):
+    customers = pd.DataFrame({'customer id': [1.0, 2.0], 'customer name': ['Jane Doe', 'John Smith']})
+    upsert_data_to_sql(customers, 'customers', engine)
+    result = upsert_data_to_sql(customers.assign(**{'customer name': ['Jane Doe', 'Jon Smith']}), 'customers', engine)
+
+    assert result == {'rows_inserted': 0, 'rows_updated': 1}
+
+def test_upsert_updates_values_to_and_from_null(engine):
+    upsert_data_to_sql(pd.DataFrame({'id': [1, 2], 'returned': [np.nan, 5.0]}), 'loans', engine)
+
+    result = upsert_data_to_sql(pd.DataFrame({'id': [1, 2], 'returned': [7.0, np.nan]}), 'loans', engine)
+
+    assert result == {'rows_inserted': 0, 'rows_updated': 2}
+    table = pd.read_sql_table('loans_cleaned', engine).sort_values('id')
+    assert table['returned'].tolist()[0] == 7.0 and np.isnan(table['returned'].tolist()[1])
@@ -0,0 +1,36 @@
+import pandas as pd
+from sqlalchemy import create_engine
+from clean_data import cleanse_data
+from stage_metrics import StageMetrics
+
+def test_stage_totals_accumulate_over_runs():
+    stages = StageMetrics()
+    for chunk in ([1, 2, 3], [4, 5]):
+        with stages.stage('dedup', len(chunk)) as counts:
+            counts['rows_out'] = len(chunk) - 1
+
+    record = stages.records()[0]
+    assert (record['stage'], record['rows_in'], record['rows_out']) == ('dedup', 5, 3)
+    assert record['wall_time_seconds'] >= 0 and record['cpu_time_seconds'] >= 0
+
+def test_timed_iter_counts_rows_read():
+    stages = StageMetrics()
+    chunks = list(stages.timed_iter('read', [pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [3]})]))
+
+    assert len(chunks) == 2
+    assert stages.stages['read']['rows_out'] == 3
+
+def test_cleanse_data_writes_stage_rows_and_processing_time(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'customers.csv').write_text('Customer ID,Customer Name\n1,Jane Doe\n1,Jane Doe\n,\n')
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    cleanse_data('customers.csv', engine, chunksize=2)
+
+    stages = pd.read_sql_table('data_cleaning_stage_metrics', engine)
+    assert stages['stage'].tolist() == ['read', 'null_drop', 'dedup', 'transform', 'enrich', 'output_write', 'sql_load']
+    assert stages.set_index('stage').loc['read', 'rows_out'] == 3
+    assert stages.set_index('stage').loc['dedup', 'rows_out'] == 1
+
+    metrics = pd.read_sql_table('data_cleaning_metrics', engine)
+    assert metrics['processing_time_seconds'].iloc[0] > 0
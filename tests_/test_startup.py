@@ -0,0 +1,17 @@
+import pytest
+from benchmark_clean_data import STARTUP_BUDGET_SECONDS, benchmark_startup
+from clean_data_cli import main
+
+@pytest.mark.parametrize('args', [('--help',), ('server', 'database')])
+def test_cli_starts_without_heavy_imports(tmp_path, args):
+    record = benchmark_startup(args, repeats=3, cwd=str(tmp_path))  # tmp_path has no CSV files
+
+    assert record['returncode'] == 0
+    assert record['heavy_modules'] == []
+    assert record['seconds'] < STARTUP_BUDGET_SECONDS
+
+def test_workers_are_rejected_with_an_in_memory_database(capsys):
+    with pytest.raises(SystemExit):
+        main(['--sqlite', ':memory:', '--workers', '2'])
+
+    assert 'use an --sqlite file' in capsys.readouterr().err